@@ -0,0 +1,126 @@
+"""Benchmarks opening connections and running queries on the database.
+
+Runs the same small queries with the connection kept open, then with the
+connection closed after every query, which is what the database layer used
+to do. Then inserts rows one query at a time, in a single execBatch
+transaction and queued on the background writer. The latter also shows how
+long the caller is kept waiting. Finally, alternates between two statements
+with and without the prepared statement cache.
+
+Usage: python -m benchmarks.bench_database [--queries N] [--rows N]
+"""
+import argparse
+import tempfile
+import time
+from pathlib import Path
+from unittest import mock
+
+from spielpendium import database
+from spielpendium.database.scripts import SQLScripts
+
+__author__ = 'Eduardo Ruiz'
+
+
+def _time_queries(num_queries: int, reconnect: bool) -> float:
+    database.reset_statistics()
+    start = time.perf_counter()
+
+    for ii in range(num_queries):
+        database.query('SELECT ?', [ii])
+        if reconnect:
+            database.disconnect()
+
+    elapsed = time.perf_counter() - start
+    stats = database.statistics()
+    print(f'{"reconnecting" if reconnect else "persistent":>12}: '
+          f'{num_queries / elapsed:9.1f} queries/s, '
+          f'{stats["opens"]} opens ({stats["opens_per_second"]:.1f}/s)')
+
+    return elapsed
+
+
+def _time_inserts(num_rows: int):
+    database.query('CREATE TABLE Bench (id INTEGER PRIMARY KEY, '
+                   'name TEXT NOT NULL)')
+    rows = [(ii, f'game {ii}') for ii in range(num_rows)]
+
+    start = time.perf_counter()
+    for row in rows:
+        database.query('INSERT INTO Bench (id, name) VALUES (?, ?)', row)
+    one_by_one = time.perf_counter() - start
+
+    database.query('DELETE FROM Bench')
+
+    start = time.perf_counter()
+    database.execute_many('INSERT INTO Bench (id, name) VALUES (?, ?)', rows)
+    batched = time.perf_counter() - start
+
+    database.query('DELETE FROM Bench')
+    database.reset_statistics()
+
+    start = time.perf_counter()
+    for row in rows:
+        database.queue_query('INSERT INTO Bench (id, name) VALUES (?, ?)',
+                             row)
+    waited = time.perf_counter() - start
+    database.flush_writes()
+    queued = time.perf_counter() - start
+    transactions = database.statistics()['write_batches']
+
+    print(f'{"one by one":>12}: {num_rows} rows in {one_by_one:7.3f} s')
+    print(f'{"batched":>12}: {num_rows} rows in {batched:7.3f} s')
+    print(f'{"queued":>12}: {num_rows} rows in {queued:7.3f} s, '
+          f'{transactions} transactions, caller waited {waited:7.3f} s')
+
+
+def _time_statements(num_queries: int):
+    manager = database.database._connections
+    default_size = manager.statement_cache_size
+
+    for label, size in (('uncached', 1), ('cached', default_size)):
+        manager.statement_cache_size = size
+        database.reset_statistics()
+
+        start = time.perf_counter()
+        for ii in range(num_queries // 2):
+            database.query(SQLScripts.user_exists, [f'user {ii}'])
+            database.query(SQLScripts.get_user_xml, [f'user {ii}'])
+        elapsed = time.perf_counter() - start
+
+        stats = database.statistics()
+        print(f'{label:>12}: {num_queries / elapsed:9.1f} queries/s, '
+              f'{stats["statement_hits"]} statement cache hits')
+
+    manager.statement_cache_size = default_size
+
+
+def run(num_queries: int, num_rows: int):
+    """ Times the queries and inserts both ways and prints the results.
+
+    :param num_queries: The number of queries run each way.
+    :param num_rows: The number of rows inserted each way.
+    """
+    with tempfile.TemporaryDirectory() as tmp_dir, \
+            mock.patch('spielpendium.database.database.DB_DIR',
+                       Path(tmp_dir)), \
+            mock.patch('spielpendium.database.database.DB_FILE',
+                       Path(tmp_dir) / 'bench.sqlite'):
+        database.create()
+
+        reconnecting = _time_queries(num_queries, reconnect=True)
+        persistent = _time_queries(num_queries, reconnect=False)
+        print(f'{"speed-up":>12}: {reconnecting / persistent:9.1f}x')
+
+        _time_inserts(num_rows)
+        _time_statements(num_queries)
+
+        database.close_all()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--queries', type=int, default=2000)
+    parser.add_argument('--rows', type=int, default=10_000)
+    arguments = parser.parse_args()
+
+    run(arguments.queries, arguments.rows)
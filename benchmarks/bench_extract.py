@@ -0,0 +1,81 @@
+"""Benchmarks turning a get_game_info response into Games rows.
+
+Compares the xmltodict + game_to_row path with the direct extractor, in one
+process and in the parsing process pool, on a synthetic response made of
+copies of the boardgame fixtures.
+
+Usage: python -m benchmarks.bench_extract [--games N] [--repeats R]
+"""
+import argparse
+import re
+import timeit
+
+import xmltodict
+
+from spielpendium.data import parallel_parse
+from spielpendium.data.games_interface import game_to_row
+from spielpendium.data.row_extractor import rows_from_xml
+from spielpendium.network.stand_in_server import FIXTURES_DIR
+
+__author__ = 'Eduardo Ruiz'
+
+
+def make_response(num_games: int) -> bytes:
+    """ Builds a response with the given number of games.
+
+    :param num_games: The number of <boardgame> elements in the response.
+    :return: The XML of the response.
+    """
+    fixtures = [path.read_text(encoding='utf-8') for path
+                in sorted((FIXTURES_DIR / 'boardgame').glob('*.xml'))]
+
+    games = [re.sub(r'objectid="\d+"', f'objectid="{ii}"',
+                    fixtures[ii % len(fixtures)], count=1)
+             for ii in range(num_games)]
+
+    return f'<boardgames>{"".join(games)}</boardgames>'.encode()
+
+
+def dict_rows(xml: bytes):
+    games = xmltodict.parse(xml)['boardgames']['boardgame']
+    if isinstance(games, dict):
+        games = [games]
+    return [game_to_row(game, None) for game in games]
+
+
+def direct_rows(xml: bytes):
+    return rows_from_xml([xml])
+
+
+def parallel_rows(xml: bytes):
+    return parallel_parse.parse_game_rows(xml)
+
+
+def run(num_games: int, repeats: int):
+    """ Times both paths and prints the results.
+
+    :param num_games: The number of games in the response.
+    :param repeats: How many times each path is timed. The best is kept.
+    """
+    xml = make_response(num_games)
+    print(f'{num_games} games, {len(xml)} bytes')
+
+    timings = {}
+    for name, func in (('xmltodict + game_to_row', dict_rows),
+                       ('boardgame_to_row', direct_rows),
+                       ('parse_game_rows', parallel_rows)):
+        timings[name] = min(timeit.repeat(lambda: func(xml), number=1,
+                                          repeat=repeats))
+        print(f'{name:>24}: {timings[name] * 1000:8.2f} ms '
+              f'({num_games / timings[name]:10.1f} games/s)')
+
+    parallel_parse.shutdown_executor()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--games', type=int, default=1000)
+    parser.add_argument('--repeats', type=int, default=5)
+    arguments = parser.parse_args()
+
+    run(arguments.games, arguments.repeats)
@@ -0,0 +1,77 @@
+"""Benchmarks importing a BGG collection against the stand-in server.
+
+The stand-in server replays the recorded fixtures with a fixed latency and
+bandwidth, so the numbers are repeatable and need no internet connection.
+
+Usage: python -m benchmarks.bench_import [--latency S] [--bandwidth B/s]
+"""
+import argparse
+import os
+import tempfile
+import time
+from pathlib import Path
+from unittest import mock
+
+from PyQt5 import QtGui
+
+from spielpendium import database
+from spielpendium.data import import_user_data
+from spielpendium.network import (set_bgg_url, response_cache, search_cache,
+                                  single_flight)
+from spielpendium.network.stand_in_server import StandInServer
+
+__author__ = 'Eduardo Ruiz'
+
+_USERNAME = 'phoenix713'
+
+
+def run(latency: float, bandwidth: float, repeats: int):
+    """ Imports the stand-in collection cold, then warm, and prints timings.
+
+    :param latency: Seconds of latency added to every response.
+    :param bandwidth: Bytes per second of every response.
+    :param repeats: How many warm imports to time.
+    """
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    app = QtGui.QGuiApplication([])
+
+    with tempfile.TemporaryDirectory() as tmp_dir, \
+            mock.patch('spielpendium.database.database.DB_DIR',
+                       Path(tmp_dir)), \
+            mock.patch('spielpendium.database.database.DB_FILE',
+                       Path(tmp_dir) / 'bench.sqlite'), \
+            mock.patch('spielpendium.network.bgg_api_interface.'
+                       '_TIME_BETWEEN_CHECKS', latency), \
+            StandInServer(latency=latency, bandwidth=bandwidth) as server:
+        set_bgg_url(server.url)
+        database.create()
+
+        for label, force_update in [('cold', True)] + \
+                [('warm', True)] * repeats:
+            for stats_source in (server, response_cache, search_cache,
+                                 single_flight):
+                stats_source.reset_statistics()
+
+            start = time.perf_counter()
+            rows = import_user_data(_USERNAME, force_update=force_update)
+            elapsed = time.perf_counter() - start
+
+            server_stats = server.statistics()
+            print(f'{label:>5}: {len(rows)} games in {elapsed:7.3f} s '
+                  f'({len(rows) / elapsed:8.1f} games/s), '
+                  f'{server_stats["requests"]} requests, '
+                  f'{server_stats["bytes_sent"]} bytes, '
+                  f'cache hit rate '
+                  f'{response_cache.statistics()["hit_rate"]:.0%}')
+
+    del app
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--latency', type=float, default=0.05)
+    parser.add_argument('--bandwidth', type=float, default=1_000_000)
+    parser.add_argument('--repeats', type=int, default=3)
+    arguments = parser.parse_args()
+
+    run(arguments.latency, arguments.bandwidth, arguments.repeats)
@@ -0,0 +1,82 @@
+"""Benchmarks importing several collections against the stand-in server.
+
+The collections are imported one after another with import_user_data, then
+all at once with import_users_data. Every run starts from an empty cache so
+both pay for every download they make.
+
+Usage: python -m benchmarks.bench_multi_user [--latency S] [--bandwidth B/s]
+"""
+import argparse
+import os
+import tempfile
+import time
+from pathlib import Path
+from unittest import mock
+
+from PyQt5 import QtGui
+
+from spielpendium import database
+from spielpendium.data import import_user_data, import_users_data
+from spielpendium.network import set_bgg_url
+from spielpendium.network.stand_in_server import StandInServer
+
+__author__ = 'Eduardo Ruiz'
+
+_USERNAMES = ('phoenix713', 'catanfan', 'cooplover')
+
+
+def run(latency: float, bandwidth: float):
+    """ Imports the stand-in collections both ways and prints timings.
+
+    :param latency: Seconds of latency added to every response.
+    :param bandwidth: Bytes per second of every response.
+    """
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    app = QtGui.QGuiApplication([])
+
+    with tempfile.TemporaryDirectory() as tmp_dir, \
+            mock.patch('spielpendium.database.database.DB_DIR',
+                       Path(tmp_dir)), \
+            mock.patch('spielpendium.database.database.DB_FILE',
+                       Path(tmp_dir) / 'bench.sqlite'), \
+            mock.patch('spielpendium.network.bgg_api_interface.'
+                       '_TIME_BETWEEN_CHECKS', latency), \
+            StandInServer(latency=latency, bandwidth=bandwidth) as server:
+        set_bgg_url(server.url)
+
+        database.create()
+        server.reset_statistics()
+        start = time.perf_counter()
+        for username in _USERNAMES:
+            import_user_data(username)
+        sequential = time.perf_counter() - start
+        print(f'one by one: {sequential:7.3f} s, '
+              f'{server.statistics()["requests"]} requests')
+
+        # A new database, so that nothing is cached from the first run
+        database.flush_writes()
+        database.close_all()
+        with mock.patch('spielpendium.database.database.DB_FILE',
+                        Path(tmp_dir) / 'bench_at_once.sqlite'):
+            database.create()
+            server.reset_statistics()
+            result = import_users_data(_USERNAMES)
+            database.flush_writes()
+            database.close_all()
+        print(f'    at once: {result.elapsed:7.3f} s, '
+              f'{server.statistics()["requests"]} requests, '
+              f'{len(result.merged)} unique games out of {result.requested}')
+
+        print(f'      saved: {sequential - result.elapsed:7.3f} s '
+              f'({1 - result.elapsed / sequential:.0%})')
+
+    del app
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--latency', type=float, default=0.05)
+    parser.add_argument('--bandwidth', type=float, default=1_000_000)
+    arguments = parser.parse_args()
+
+    run(arguments.latency, arguments.bandwidth)
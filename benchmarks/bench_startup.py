@@ -0,0 +1,62 @@
+"""Benchmarks importing the Spielpendium packages.
+
+Imports each package in a fresh interpreter with python -X importtime and
+prints how long the import took, counting everything it imported, and which
+of the heavy dependencies were loaded with it. These should only be loaded
+once something from the package is used.
+
+Usage: python -m benchmarks.bench_startup [--repeats N]
+"""
+import argparse
+import subprocess
+import sys
+from typing import List, Tuple
+
+__author__ = 'Eduardo Ruiz'
+
+PACKAGES = ('spielpendium.log', 'spielpendium.database',
+            'spielpendium.network', 'spielpendium.data')
+HEAVY_MODULES = ('PyQt5.QtCore', 'PyQt5.QtGui', 'PyQt5.QtSql', 'pandas',
+                 'xmltodict', 'multiprocessing', 'urllib.request')
+
+
+def import_time(module: str) -> Tuple[float, List[str]]:
+    """ Imports a module in a fresh interpreter.
+
+    :param module: The name of the module.
+    :return: The time the import took, in seconds, including the modules it
+             imported. And the heavy modules that were loaded with it.
+    """
+    code = (f'import sys, {module}\n'
+            f'print(*[name for name in {HEAVY_MODULES!r} '
+            f'if name in sys.modules])')
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code],
+                            capture_output=True, text=True, check=True)
+
+    # Lines of "import time: self [us] | cumulative | imported package"
+    for line in result.stderr.splitlines():
+        columns = line.split('|')
+        if len(columns) == 3 and columns[2].strip() == module:
+            return int(columns[1]) / 1e6, result.stdout.split()
+
+    raise ValueError(f'{module} was not in the output of -X importtime.')
+
+
+def run(repeats: int):
+    """ Times the imports and prints the results.
+
+    :param repeats: The number of times each package is imported. The
+           fastest time is shown.
+    """
+    for package in PACKAGES:
+        times, heavy = zip(*[import_time(package) for _ in range(repeats)])
+        print(f'{package:>22}: {min(times) * 1000:7.1f} ms'
+              f'{", loads " + ", ".join(heavy[0]) if heavy[0] else ""}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeats', type=int, default=5)
+    arguments = parser.parse_args()
+
+    run(arguments.repeats)
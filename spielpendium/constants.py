@@ -1,15 +1,45 @@
+import os
 from pathlib import Path
 
 __author__ = 'Eduardo Ruiz'
 
 IMAGE_SIZE = 64
 
+# The sizes the images of games are kept at, besides the original. Views pick
+# the smallest one that fits the size they draw at.
+THUMBNAIL_SIZES = (64, 128, 256)
+# Whether to keep the images as they were downloaded, for the largest views
+KEEP_ORIGINAL_IMAGES = True
+
 ROOT_DIR = Path(__file__).parents[1].absolute()
 
 PROGRAM_NAME = ROOT_DIR.name
 
-LOG_DIR = ROOT_DIR / 'log'
+# The log can be moved, e.g. by the tests
+LOG_DIR = Path(os.environ.get('SPIELPENDIUM_LOG_DIR', ROOT_DIR / 'log'))
 DB_DIR = ROOT_DIR / 'db'
 
 LOG_FILE = LOG_DIR / f'{PROGRAM_NAME}.log'
 DB_FILE = DB_DIR / f'{PROGRAM_NAME}.sqlite'
+
+# The level of the log. DEBUG logs every call of the decorated functions.
+LOG_LEVEL = os.environ.get('SPIELPENDIUM_LOG_LEVEL', 'INFO').upper()
+# The log is rotated once it reaches this size, keeping a few old ones
+LOG_MAX_BYTES = 5 * 1024 ** 2
+LOG_BACKUP_COUNT = 3
+# Where to write a trace of the decorated functions and the counters, if
+# anywhere. Read with chrome://tracing or Perfetto ('chrome'), or as a summary
+# of each function ('json').
+TRACE_FILE = os.environ.get('SPIELPENDIUM_TRACE') or None
+TRACE_FORMAT = os.environ.get('SPIELPENDIUM_TRACE_FORMAT', 'chrome').lower()
+
+# SQLite settings applied to every database connection. WAL lets readers
+# carry on while a write is being committed, and with it a NORMAL
+# synchronous level is still safe against corruption.
+DB_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'cache_size': -20_000,  # In KiB when negative
+    'mmap_size': 256 * 1024 ** 2,
+    'temp_store': 'MEMORY',
+}
@@ -1,2 +1,16 @@
-from .games import Games
-from .games_interface import import_user_data
+from spielpendium.lazy_import import lazy_attributes
+
+# The modules are only imported when one of their names is first used, so
+# that pandas and Qt aren't loaded with the package
+__all__ = ['Games', 'import_user_data', 'import_users_data', 'sync_user_data',
+           'SyncResult', 'MultiUserImport', 'iter_import_user_data',
+           'ImportProgress']
+
+__getattr__, __dir__ = lazy_attributes(__name__, {
+    'Games': 'games',
+    **dict.fromkeys(['import_user_data', 'import_users_data',
+                     'sync_user_data', 'SyncResult', 'MultiUserImport'],
+                    'games_interface'),
+    'iter_import_user_data': 'import_pipeline',
+    'ImportProgress': 'import_pipeline',
+})
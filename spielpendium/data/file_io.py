@@ -6,16 +6,17 @@ import datetime
 import os
 import zipfile
 import json
-from io import BytesIO
-from typing import Dict, Union, Tuple
+from typing import Dict, Optional, Union, Tuple
 
 import pandas as pd
 from PyQt5 import QtGui, QtCore
 
 from spielpendium import log
 from spielpendium.constants import IMAGE_SIZE
+from spielpendium.data.player_poll import PlayerPoll
+from spielpendium.thumbnails import Thumbnails
 
-__splz_version_tuple__ = (0, 0, 1)
+__splz_version_tuple__ = (0, 0, 3)
 __splz_version__ = '.'.join([f'{x}' for x in __splz_version_tuple__])
 
 __author__ = 'Eduardo Ruiz'
@@ -29,7 +30,8 @@ def save_splz(data: pd.DataFrame, metadata: Dict, filename: str) -> bool:
 
     The SPLZ file format is a JSON formatted text file containing the game
     data, another containing metadata, and a folder containing associated
-    game images in a zipped folder.
+    game images in a zipped folder. Each game has a folder of its own with
+    its image at every thumbnail size (e.g. "64.png") and the original.
 
     :param data: The data to save, as a Pandas Dataframe.
     :param metadata: The metadata associated with the DataFrame.
@@ -44,13 +46,26 @@ def save_splz(data: pd.DataFrame, metadata: Dict, filename: str) -> bool:
     # saved in the JSON data file.
     images_list = data['Image']
     images_list.index = data['BGG Id']
-    images: Dict[Union[int, str], QtGui.QImage] = images_list.to_dict()
+    images: Dict[Union[int, str], Thumbnails] = {
+        bgg_id: Thumbnails.of(image)
+        for bgg_id, image in images_list.to_dict().items()
+    }
 
-    # Replace the images in the DataFrame with the relative image path
-    # in the .splz file.
+    # Replace the images in the DataFrame with the relative path of their
+    # folder in the .splz file. Games without an image have no folder.
     data_copy = data.copy()
 
-    data_copy['Image'] = 'images/' + data['BGG Id'].astype(str) + '.png'
+    data_copy['Image'] = [
+        None if images[bgg_id].is_null() else f'images/{bgg_id}/'
+        for bgg_id in data['BGG Id']
+    ]
+
+    # The player count polls are saved as plain lists of votes
+    if 'Player Poll' in data_copy:
+        data_copy['Player Poll'] = [
+            poll.to_list() if isinstance(poll, PlayerPoll) else None
+            for poll in data_copy['Player Poll']
+        ]
 
     data_dict = data_copy.to_dict(orient='index')
 
@@ -78,20 +93,11 @@ def save_splz(data: pd.DataFrame, metadata: Dict, filename: str) -> bool:
             file.writestr('data.json', json_data)
 
             # Loop through the "images" dict and add them into the file.
-            # The images are stored in the "images" sub folder and are named
-            # with the associated BGG ID (which is unique).
-            for bgg_id, image in images.items():
-                buffer = QtCore.QBuffer()
-                buffer.open(QtCore.QBuffer.ReadWrite)
-                image.save(buffer, "PNG")
-                # noinspection PyTypeChecker
-                image_bytes = BytesIO(buffer.data())
-                file.writestr(
-                    data_copy.loc[data_copy['BGG Id'] == bgg_id]['Image']
-                    .values[0],
-                    image_bytes.getvalue()
-                )
-                buffer.close()
+            # The images are stored in the "images" sub folder, in a folder
+            # named with the associated BGG ID (which is unique).
+            for bgg_id, thumbnails in images.items():
+                for size, image_bytes in thumbnails.encoded().items():
+                    file.writestr(_level_path(bgg_id, size), image_bytes)
 
         log.logger.info(f'SPLZ file successfully saved at {filename}.')
 
@@ -142,24 +148,28 @@ def load_splz(filepath: str) -> Tuple[pd.DataFrame, Dict]:
             json_data = json_file['data']
             data: pd.DataFrame = pd.DataFrame(json_data).T
 
+            # Files from before version 0.0.2 have no player count polls
+            if 'Player Poll' in data:
+                data['Player Poll'] = [PlayerPoll.from_list(poll)
+                                       for poll in data['Player Poll']]
+            else:
+                data['Player Poll'] = [PlayerPoll() for _ in data.index]
+
             # Read in the metadata
             metadata = json_file['metadata']
             metadata.pop('version')
             metadata.pop('creation_date')
 
             # Loop through the images and add them to the DataFrame
-            for index, path in zip(data.index, data['Image']):
-                image = QtGui.QPixmap()
-                if not image.loadFromData(file.read(path)):
-                    # If the image cannot be found, raise an error.
-                    raise FileNotFoundError(
-                        f'The image {os.path.split(path)[1]} '
-                        f'was not found in {filename}.'
-                    )
-                data.loc[index, 'Image'] = image.scaled(
-                    IMAGE_SIZE,
-                    IMAGE_SIZE,
-                    QtCore.Qt.KeepAspectRatio
+            names = file.namelist()
+            paths = list(data['Image'])
+            data['Image'] = [_read_thumbnails(file, names, path)
+                             for path in paths]
+            if any(thumbnails.is_null() and isinstance(path, str)
+                   for path, thumbnails in zip(paths, data['Image'])):
+                # If an image cannot be found, raise an error.
+                raise FileNotFoundError(
+                    f'An image was not found in {filename}.'
                 )
         log.logger.info(f'File at {filepath} successfully loaded.')
 
@@ -173,6 +183,32 @@ def load_splz(filepath: str) -> Tuple[pd.DataFrame, Dict]:
     return data, metadata
 
 
+def _level_path(bgg_id: Union[int, str], size: int) -> str:
+    name = f'{size}.png' if size else 'original'
+    return f'images/{bgg_id}/{name}'
+
+
+def _read_thumbnails(file: zipfile.ZipFile, names,
+                     path: Optional[str]) -> Thumbnails:
+    # Games saved without an image
+    if not isinstance(path, str):
+        return Thumbnails()
+
+    # Files from before version 0.0.3 have a single image per game, the
+    # thumbnails are made from it.
+    if not path.endswith('/'):
+        return Thumbnails.from_data(file.read(path))
+
+    levels = {}
+    for name in names:
+        if name.startswith(path):
+            level = name[len(path):]
+            levels[0 if level == 'original' else int(level.split('.')[0])] = \
+                file.read(name)
+
+    return Thumbnails(levels)
+
+
 if __name__ == '__main__':
     test_im = (QtGui.QImage('../../images/image.jpg')
                .scaled(IMAGE_SIZE, IMAGE_SIZE, QtCore.Qt.KeepAspectRatio))
@@ -6,23 +6,52 @@ save and load splz functions and allows data to be read in from the database.
 """
 
 from __future__ import annotations
-from typing import Union, List, Any, Dict, Tuple
+from typing import Union, List, Any, Dict, Tuple, Callable, Optional
 
-from PyQt5 import QtCore
+from PyQt5 import QtCore, QtGui
 import pandas as pd
 
 from spielpendium.constants import IMAGE_SIZE
 from spielpendium.data.file_io import load_splz, save_splz
-from spielpendium.data.games_interface import import_user_data
+from spielpendium.data.games_db import read_games, write_games
+from spielpendium.data.games_interface import (import_user_data,
+                                               sync_user_data, SyncResult)
+from spielpendium.data.import_pipeline import (iter_import_user_data,
+                                               ImportProgress)
+from spielpendium.data.player_poll import PlayerPoll, PlayerPollIndex
+from spielpendium.thumbnails import Thumbnails
 
 __author__ = 'Eduardo Ruiz'
 
 __all__ = ['Games']
 
 
+def _as_thumbnails(image: Any, cache: Dict[int, Thumbnails] = None) -> Any:
+    """Converts a plain image to thumbnails as it's added to the model, so
+    the views never have to scale it. Anything else is kept as it is.
+
+    Rows often share the same image, so with a cache each one is only
+    converted once."""
+    if not isinstance(image, (QtGui.QImage, QtGui.QPixmap)):
+        return image
+    if cache is None:
+        return Thumbnails.of(image)
+    if image.cacheKey() not in cache:
+        cache[image.cacheKey()] = Thumbnails.of(image)
+    return cache[image.cacheKey()]
+
+
+def _as_poll(poll: Any) -> PlayerPoll:
+    """Games without a player count poll get an empty one, as they do when
+    they're loaded from a file."""
+    return poll if isinstance(poll, PlayerPoll) else PlayerPoll()
+
+
 class Games(QtCore.QAbstractTableModel):
     """The internal data storage class for Spielpendium."""
     _NUM_HIDDEN_COLS = 1
+    # Columns at the end of HEADER that are never shown
+    _NUM_TRAILING_HIDDEN_COLS = 1
     _ID_COL = 0
     _IMAGE_COL = 1
 
@@ -47,6 +76,7 @@ class Games(QtCore.QAbstractTableModel):
         'BGG Rank',
         'Complexity',
         'Related Games',
+        'Player Poll',
     ]
 
     def __init__(self, parent: QtCore.QObject = None):
@@ -59,6 +89,14 @@ class Games(QtCore.QAbstractTableModel):
         self._games = pd.DataFrame(columns=self.HEADER)
         self._images = []
         self._metadata = {}
+        self._poll_index = None
+        self._icon_size = IMAGE_SIZE
+        self._device_pixel_ratio = 1.0
+
+        # Any change to the games makes the poll index stale
+        for signal in (self.dataChanged, self.rowsInserted, self.rowsRemoved,
+                       self.modelReset):
+            signal.connect(self._invalidate_poll_index)
 
     def __repr__(self):
         """The representation of Games in the terminal."""
@@ -136,24 +174,8 @@ class Games(QtCore.QAbstractTableModel):
 
             # Check to see if the images are equal
             if is_equal:
-                # Convert QImages to bytes
-                # This makes a buffer in memory and saves the images as PNG
-                # files into the memory buffer. Then it compares the raw bytes
-                # of the PNG "file".
-                self_ba = QtCore.QByteArray()
-                self_buff = QtCore.QBuffer(self_ba)
-                self_buff.open(QtCore.QIODevice.WriteOnly)
-                image_col_self.iloc[row].save(self_buff, "PNG")
-                self_im_bytes = self_buff.data()
-
-                other_ba = QtCore.QByteArray()
-                other_buff = QtCore.QBuffer(other_ba)
-                other_buff.open(QtCore.QIODevice.WriteOnly)
-                image_col_other.iloc[row].save(other_buff, "PNG")
-                other_im_bytes = other_buff.data()
-
-                # Check that the bytes equal
-                is_equal = self_im_bytes == other_im_bytes
+                is_equal = Thumbnails.of(image_col_self.iloc[row]) \
+                    == Thumbnails.of(image_col_other.iloc[row])
 
             if not is_equal:
                 break
@@ -180,7 +202,8 @@ class Games(QtCore.QAbstractTableModel):
         :param parent: A QModelIndex.
         :return: The number of columns in the model.
         """
-        return len(self._games.columns) - self._NUM_HIDDEN_COLS
+        return (len(self._games.columns) - self._NUM_HIDDEN_COLS
+                - self._NUM_TRAILING_HIDDEN_COLS)
 
     def headerData(self, section: int, orientation: QtCore.Qt.Orientation,
                    role: int = None) -> Union[List, QtCore.QVariant]:
@@ -229,13 +252,33 @@ class Games(QtCore.QAbstractTableModel):
             return 'BGG ID: ' + str(self._games.iloc[row, self._ID_COL])
         if role == QtCore.Qt.DecorationRole \
                 and column == self._IMAGE_COL - self._NUM_HIDDEN_COLS:
-            return self._games.iloc[row, self._IMAGE_COL].scaled(
-                IMAGE_SIZE,
-                IMAGE_SIZE,
-                QtCore.Qt.KeepAspectRatio
-            )
+            image = self._games.iloc[row, self._IMAGE_COL]
+            if isinstance(image, Thumbnails):
+                return image.pixmap(self._icon_size, self._device_pixel_ratio)
         return None
 
+    def set_icon_size(self, size: int, device_pixel_ratio: float = 1.0):
+        """ Sets the size the images are drawn at by the views.
+
+        The images are handed out at the thumbnail size that best fits, so
+        views don't have to scale them when painting.
+
+        :param size: The size of the icons, in logical pixels.
+        :param device_pixel_ratio: The device pixel ratio of the screen.
+        """
+        if (size, device_pixel_ratio) \
+                == (self._icon_size, self._device_pixel_ratio):
+            return
+
+        self._icon_size = size
+        self._device_pixel_ratio = device_pixel_ratio
+
+        column = self._IMAGE_COL - self._NUM_HIDDEN_COLS
+        if self.rowCount() > 0:
+            self.dataChanged.emit(self.index(0, column),
+                                  self.index(self.rowCount() - 1, column),
+                                  [QtCore.Qt.DecorationRole])
+
     def index(self, row: int, column: int,
               parent: QtCore.QModelIndex = QtCore.QModelIndex()) \
             -> QtCore.QModelIndex:
@@ -263,7 +306,9 @@ class Games(QtCore.QAbstractTableModel):
 
         self.beginInsertRows(parent, row, row + count - 1)
         for _ in range(count):
-            self._games.loc[len(self._games)] = [None] * self.columnCount()
+            values = [None] * len(self.HEADER)
+            values[self.HEADER.index('Player Poll')] = PlayerPoll()
+            self._games.loc[len(self._games)] = values
         self.endInsertRows()
 
         return True
@@ -320,6 +365,14 @@ class Games(QtCore.QAbstractTableModel):
             return False
 
         values = pd.DataFrame(values)
+        if 'Image' in values:
+            images = {}
+            values['Image'] = values['Image'].map(
+                lambda image: _as_thumbnails(image, images)
+            )
+        values['Player Poll'] = (values['Player Poll'].map(_as_poll)
+                                 if 'Player Poll' in values else
+                                 [PlayerPoll() for _ in values.index])
 
         self.beginInsertRows(QtCore.QModelIndex(),
                              len(self._games),
@@ -328,6 +381,114 @@ class Games(QtCore.QAbstractTableModel):
         self.endInsertRows()
         return True
 
+    def remove_games(self, game_ids: List[Union[int, str]]) -> bool:
+        """Remove the rows of the given games from the model.
+
+        :param game_ids: The BGG ids of the games to remove.
+        :return: True if any row was removed, False otherwise.
+        """
+        mask = self._games['BGG Id'].astype(str).isin(
+            [str(game_id) for game_id in game_ids]
+        )
+        if not mask.any():
+            return False
+
+        self.beginResetModel()
+        self._games = self._games[~mask].reset_index(drop=True)
+        self.endResetModel()
+
+        return True
+
+    def update_games(self, values: List[Dict]) -> bool:
+        """Replace the rows of games already in the model with new data.
+
+        :param values: The new rows. They are matched to the existing rows by
+            their 'BGG Id'.
+        :return: True if every row was found and updated, False otherwise.
+        """
+        positions = {str(game_id): row for row, game_id
+                     in enumerate(self._games['BGG Id'])}
+
+        all_found = True
+        for value in values:
+            row = positions.get(str(value['BGG Id']))
+            if row is None:
+                all_found = False
+                continue
+
+            for key, item in value.items():
+                if key == 'Image':
+                    item = _as_thumbnails(item)
+                self._games.at[row, key] = item
+
+            self.dataChanged.emit(self.index(row, 0),
+                                  self.index(row, self.columnCount() - 1))
+
+        return all_found
+
+    def sync(self, username: str,
+             filters: Dict[str, Union[int, bool]] = None) -> SyncResult:
+        """Bring the model up to date with a user's BGG collection,
+        downloading only the games that were added or changed.
+
+        :param username: The BGG username whose collection is synced.
+        :param filters: Additional filters for the game collection.
+        :return: The ids of the added, removed and updated games.
+        """
+        result = sync_user_data(username, self._games['BGG Id'], filters)
+
+        updated = set(result.updated)
+        self.remove_games(result.removed)
+        self.update_games([row for row in result.data
+                           if str(row['BGG Id']) in updated])
+
+        added = [row for row in result.data
+                 if str(row['BGG Id']) not in updated]
+        if added:
+            self.append(added)
+
+        return result
+
+    def import_progressively(
+            self, username: str, force_update: bool = False,
+            filters: Dict[str, Union[int, bool]] = None,
+            progress: Optional[Callable[[ImportProgress], None]] = None
+    ) -> int:
+        """Import a user's BGG collection, appending the games to the model
+        in batches as soon as they are downloaded.
+
+        :param username: The BGG username whose collection is imported.
+        :param force_update: Whether to force an update from the API.
+        :param filters: Additional filters for the game collection.
+        :param progress: Called with the progress of each import stage.
+        :return: The number of games added.
+        """
+        added = 0
+        for rows in iter_import_user_data(username, force_update, filters,
+                                          progress=progress):
+            self.append(rows)
+            added += len(rows)
+            QtCore.QCoreApplication.processEvents()
+
+        return added
+
+    def poll_index(self) -> PlayerPollIndex:
+        """Returns an index of the player count polls of all the games, for
+        queries like "which games are best at 4 players".
+
+        The index is built the first time it's needed and kept until the
+        games change.
+
+        :return: The index, with the games in model order.
+        """
+        if self._poll_index is None:
+            self._poll_index = PlayerPollIndex(self._games['BGG Id'],
+                                               self._games['Player Poll'])
+        return self._poll_index
+
+    def _invalidate_poll_index(self, *_):
+        self._poll_index = None
+
     def metadata(self) -> Dict:
         """Returns all the metadata of the Games object.
 
@@ -364,19 +525,38 @@ class Games(QtCore.QAbstractTableModel):
         """
         return save_splz(self._games, self._metadata, filename)
 
-    def read_db(self) -> bool:
-        """Reads information from the database.
+    def read_db(self, game_ids: List[Union[int, str]] = None) -> bool:
+        """Reads information from the database, replacing the games in the
+        model.
 
+        :param game_ids: The BGG ids of the games to read. All the games in
+            the database are read if None.
         :return: True if the read is successful, False otherwise.
         """
-        pass
+        try:
+            new_games = read_games(game_ids)
+        except IOError:
+            return False
+
+        self.beginResetModel()
+        self._games = new_games.reindex(columns=self.HEADER)
+        self.endResetModel()
+
+        return True
 
     def write_db(self) -> bool:
         """Write information to the database.
 
+        Games that are already in the database are updated.
+
         :return: True of the writing is successful, False otherwise.
         """
-        pass
+        try:
+            write_games(self._games)
+        except IOError:
+            return False
+
+        return True
 
     def export(self, filename: str) -> bool:
         """Exports the information in the Games object to a pdf.
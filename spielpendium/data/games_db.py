@@ -0,0 +1,386 @@
+"""Storage of Games rows in the normalized database schema.
+
+The scalar fields of a game go to the Games table. Authors and artists go to
+People (through Authors and Artists), categories to Categories and
+publishers to Publishers. All of them are linked to the game by join tables
+that keep the order they were listed in. Versions, related games and names
+without a primary one are stored as JSON.
+
+Writing uses a handful of bulk statements for the whole collection. The
+authors, artists, categories and publishers of every game are also kept
+together in Game_Summaries, as JSON lists, so reading is a single query that
+goes through the games in order. Names, descriptions, designers and
+categories are also indexed for full-text search. Triggers keep the index and
+the summaries in sync with any write to the tables, write_games rebuilds them
+once for all the games it writes instead.
+"""
+import contextlib
+import json
+import math
+import zlib
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+import pandas as pd
+from PyQt5 import QtGui
+
+from spielpendium import database, log
+from spielpendium.data.player_poll import PlayerPoll
+from spielpendium.database.scripts import SQLScripts
+from spielpendium.thumbnails import Thumbnails
+
+__author__ = 'Eduardo Ruiz'
+
+__all__ = ['write_games', 'read_games', 'search_games', 'find_games_by_name',
+           'find_games_by_category', 'find_games_by_players']
+
+_NO_AUTHORS = 'No Authors Listed'
+_NO_ARTISTS = 'No Artists Listed'
+_SEPARATOR = ', '
+
+# Columns read by get_games, in order
+_GAME_COLUMNS = ('BGG Id', 'Name', 'sub_name', 'Version', 'Image',
+                 'Description', 'Release Year', 'Minimum Players',
+                 'Maximum Players', 'Recommended Players', 'Age',
+                 'Minimum Play Time', 'Maximum Play Time', 'BGG Rating',
+                 'BGG Rank', 'Complexity', 'Related Games', 'Player Poll',
+                 'authors', 'artists', 'categories', 'publishers')
+
+# Columns that BGG sends as text, but that are stored as numbers
+_NUMERIC_COLUMNS = ('Release Year', 'Minimum Players', 'Maximum Players',
+                    'Recommended Players', 'Age', 'Minimum Play Time',
+                    'Maximum Play Time', 'BGG Rating', 'BGG Rank',
+                    'Complexity')
+
+
+def _is_missing(value: Any) -> bool:
+    return value is None or (isinstance(value, float) and math.isnan(value))
+
+
+def _split(text: Any, missing: str = None) -> List[str]:
+    if _is_missing(text) or text == '' or text == missing:
+        return []
+    return str(text).split(_SEPARATOR)
+
+
+def _publishers(value: Any) -> List[Tuple[int, str]]:
+    """Returns the (id, name) of each publisher in the raw xmltodict
+    structure of the row.
+
+    Publishers given only by name (e.g. typed in, or from an old file) get a
+    negative id made from the name, so they never clash with the ids of
+    BGG and the same name is always the same publisher."""
+    if _is_missing(value):
+        return []
+    if not isinstance(value, list):
+        value = [value]
+
+    publishers = []
+    for publisher in value:
+        if isinstance(publisher, dict) and '@objectid' in publisher:
+            publishers.append((int(publisher['@objectid']),
+                               publisher.get('#text', '')))
+        else:
+            name = (publisher.get('#text', '')
+                    if isinstance(publisher, dict) else str(publisher))
+            publishers.append((_local_id(name), name))
+    return publishers
+
+
+def _local_id(name: str) -> int:
+    return -(zlib.crc32(name.encode()) + 1)
+
+
+def _publisher(publisher_id: int, name: str) -> Union[dict, str]:
+    """The inverse of _publishers for one publisher."""
+    if publisher_id < 0:
+        return name
+    return {'@objectid': str(publisher_id), '#text': name}
+
+
+def _json(value: Any) -> Optional[str]:
+    return None if _is_missing(value) else json.dumps(value)
+
+
+def _image_bytes(image: Any, cache: Dict[Tuple, bytes]) -> Optional[bytes]:
+    if isinstance(image, Thumbnails):
+        key = ('thumbnails', id(image))
+    elif isinstance(image, (QtGui.QPixmap, QtGui.QImage)):
+        key = ('image', image.cacheKey())
+    else:
+        return None
+
+    # Rows often share the same image, so each one is only encoded once
+    if key not in cache:
+        thumbnails = Thumbnails.of(image)
+        cache[key] = None if thumbnails.is_null() else thumbnails.to_bytes()
+
+    return cache[key]
+
+
+def _value(row: Dict, key: str) -> Any:
+    value = row.get(key)
+    return None if _is_missing(value) else value
+
+
+@log.log(log.logger)
+def write_games(games: pd.DataFrame) -> int:
+    """ Writes (or updates) games in the database.
+
+    Games already in the database are matched by BGG id and replaced, along
+    with their authors, artists, categories and publishers.
+
+    :param games: The games, with the columns of a Games object.
+    :raises IOError: If the games can't be written. Nothing is written in
+            that case.
+    :return: The number of games written.
+    """
+    rows = games.to_dict(orient='records')
+    if not rows:
+        return 0
+
+    game_ids = [int(row['BGG Id']) for row in rows]
+    authors = {game_id: _split(row.get('Author'), _NO_AUTHORS)
+               for game_id, row in zip(game_ids, rows)}
+    artists = {game_id: _split(row.get('Artist'), _NO_ARTISTS)
+               for game_id, row in zip(game_ids, rows)}
+    categories = {game_id: _split(row.get('Category'))
+                  for game_id, row in zip(game_ids, rows)}
+    publishers = {game_id: _publishers(row.get('Publisher'))
+                  for game_id, row in zip(game_ids, rows)}
+
+    people = sorted({name for names in (*authors.values(), *artists.values())
+                     for name in names})
+    category_names = sorted({name for names in categories.values()
+                             for name in names})
+
+    images = {}
+    game_rows = []
+    for game_id, row in zip(game_ids, rows):
+        name = _value(row, 'Name')
+        # Without a primary name, BGG gives all of them
+        all_names = None
+        if isinstance(name, list):
+            name, all_names = (name[0] if name else ''), json.dumps(name)
+
+        poll = row.get('Player Poll')
+        game_rows.append((
+            game_id, name, all_names, _json(row.get('Version')),
+            _image_bytes(row.get('Image'), images),
+            _value(row, 'Description'),
+            publishers[game_id][0][0] if publishers[game_id] else None,
+            *[_value(row, column) for column in _NUMERIC_COLUMNS],
+            _json(row.get('Related Games')),
+            poll.to_bytes() if isinstance(poll, PlayerPoll) else None,
+        ))
+
+    with database.transaction(), _without_index_triggers():
+        # The lookup tables first, so their ids are known
+        database.execute_many(SQLScripts.save_person,
+                              [(name,) for name in people])
+        database.execute_many(SQLScripts.save_category,
+                              [(name,) for name in category_names])
+        database.execute_many(SQLScripts.save_publisher, {
+            publisher for game_publishers in publishers.values()
+            for publisher in game_publishers
+        })
+
+        person_ids = _name_ids(SQLScripts.get_people, people)
+        category_ids = _name_ids(SQLScripts.get_categories, category_names)
+
+        database.execute_many(SQLScripts.save_author, {
+            (person_ids[name], person_ids[name])
+            for names in authors.values() for name in names
+        })
+        database.execute_many(SQLScripts.save_artist, {
+            (person_ids[name], person_ids[name])
+            for names in artists.values() for name in names
+        })
+
+        # The search index and the summaries of these games are dropped, and
+        # rebuilt once for all of them at the end
+        ids_json = json.dumps(game_ids)
+        database.query(SQLScripts.clear_game_search, [ids_json])
+        database.query(SQLScripts.clear_game_summaries, [ids_json])
+
+        # One statement per table for all the games
+        for command in SQLScripts.clear_game_relations:
+            database.query(command, [ids_json])
+
+        database.bulk_write([
+            (SQLScripts.save_game_author,
+             _links(authors, lambda name: person_ids[name])),
+            (SQLScripts.save_game_artist,
+             _links(artists, lambda name: person_ids[name])),
+            (SQLScripts.save_game_category,
+             _links(categories, lambda name: category_ids[name])),
+            (SQLScripts.save_game_publisher,
+             _links(publishers, lambda publisher: publisher[0])),
+        ])
+
+        database.execute_many(SQLScripts.save_game, game_rows)
+        database.query(SQLScripts.index_games, [ids_json])
+        database.query(SQLScripts.refresh_game_summaries, [ids_json])
+
+    log.logger.info(f'Wrote {len(rows)} games to the database.')
+    log.count('games_db.games_written', len(rows))
+    return len(rows)
+
+
+@contextlib.contextmanager
+def _without_index_triggers():
+    """Drops the triggers that keep the search index and the summaries in
+    sync, and creates them again when done.
+
+    Only used in a transaction, so no other connection ever sees them
+    missing. If the transaction is rolled back, so is dropping them.
+    """
+    values = database.query(SQLScripts.get_index_triggers)
+    for name in values[::2]:
+        database.query(f'DROP TRIGGER "{name}"')
+
+    yield
+
+    for command in values[1::2]:
+        database.query(command)
+
+
+def _name_ids(command: str, names: List[str]) -> Dict[str, int]:
+    if not names:
+        return {}
+
+    values = database.query(command, [json.dumps(names)])
+    return {name: item_id for item_id, name
+            in zip(values[::2], values[1::2])}
+
+
+def _links(items: Dict[int, List], get_id) -> List[Tuple[int, int, int]]:
+    return [(get_id(item), game_id, position)
+            for game_id, game_items in items.items()
+            for position, item in enumerate(game_items)]
+
+
+def _text(value: Any) -> Optional[str]:
+    """Converts a number read from the database back to the text BGG uses
+    for it."""
+    if value is None or isinstance(value, str):
+        return value
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+@log.log(log.logger)
+def read_games(game_ids: Optional[Iterable[Union[int, str]]] = None) \
+        -> pd.DataFrame:
+    """ Reads games from the database.
+
+    :param game_ids: The BGG ids of the games to read. All the games are
+           read if None.
+    :return: The games, with the columns of a Games object, sorted by BGG id.
+             Games that aren't in the database are left out.
+    """
+    if game_ids is None:
+        command, params = SQLScripts.get_all_games, []
+    else:
+        command = SQLScripts.get_games
+        params = [json.dumps([int(game_id) for game_id in game_ids])]
+
+    # The games are streamed, so their images are only read one at a time
+    rows = []
+    for values in database.iter_rows(command, params):
+        game = dict(zip(_GAME_COLUMNS, values))
+        all_names = game.pop('sub_name')
+
+        publishers = [_publisher(publisher_id, name)
+                      for publisher_id, name in _names(game['publishers'])]
+
+        row = {
+            'BGG Id': str(game['BGG Id']),
+            'Image': Thumbnails.from_bytes(game['Image']),
+            'Name': json.loads(all_names) if all_names else game['Name'],
+            'Version': _loads(game['Version']),
+            'Author': _SEPARATOR.join(
+                name for _, name in _names(game['authors'])
+            ) or _NO_AUTHORS,
+            'Artist': _SEPARATOR.join(
+                name for _, name in _names(game['artists'])
+            ) or _NO_ARTISTS,
+            'Publisher': (publishers[0] if len(publishers) == 1
+                          else publishers),
+            'Category': _SEPARATOR.join(
+                name for _, name in _names(game['categories'])
+            ),
+            'Description': game['Description'],
+            'Related Games': _loads(game['Related Games']),
+            'Player Poll': (PlayerPoll() if game['Player Poll'] is None
+                            else PlayerPoll.from_bytes(game['Player Poll'])),
+        }
+        row.update({column: _text(game[column])
+                    for column in _NUMERIC_COLUMNS})
+        rows.append(row)
+
+    log.logger.info(f'Read {len(rows)} games from the database.')
+    log.count('games_db.games_read', len(rows))
+    return pd.DataFrame(rows)
+
+
+def _loads(value: Optional[str]) -> Any:
+    return None if value is None else json.loads(value)
+
+
+def _names(summary: Optional[str]) -> List[Tuple[int, str]]:
+    """Reads a list of [id, name] from Game_Summaries."""
+    return json.loads(summary) if summary else []
+
+
+@log.log(log.logger)
+def search_games(text: str, limit: int = 50) -> List[int]:
+    """ Searches the names, descriptions, designers and categories of the
+    games in the database.
+
+    Every word of the text has to be found, as a whole word or as the
+    beginning of one. Case and accents are ignored.
+
+    :param text: The words to search for.
+    :param limit: The maximum number of games to return.
+    :return: The BGG ids of the games found, best matches first.
+    """
+    # Each word is quoted, so that it's never read as FTS5 syntax
+    words = [word.replace('"', '""') for word in text.split()]
+    if not words:
+        return []
+
+    match = ' '.join(f'"{word}"*' for word in words)
+    return database.query(SQLScripts.search_games, [match, limit])
+
+
+@log.log(log.logger)
+def find_games_by_name(name: str) -> List[int]:
+    """ Finds the games with a name, ignoring its case.
+
+    :param name: The name of the games.
+    :return: The BGG ids of the games.
+    """
+    return database.query(SQLScripts.find_games_by_name, [name])
+
+
+@log.log(log.logger)
+def find_games_by_category(category: str) -> List[int]:
+    """ Finds the games in a category.
+
+    :param category: The name of the category.
+    :return: The BGG ids of the games.
+    """
+    return database.query(SQLScripts.find_games_by_category, [category])
+
+
+@log.log(log.logger)
+def find_games_by_players(players: int) -> List[int]:
+    """ Finds the games that can be played by a number of players.
+
+    :param players: The number of players.
+    :return: The BGG ids of the games.
+    """
+    # Sorted here, since sorting in SQL would keep the index from being used
+    return sorted(database.query(SQLScripts.find_games_by_players,
+                                 [players, players]))
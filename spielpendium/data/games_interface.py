@@ -1,15 +1,36 @@
 """ The Spielpendium side of the Spielpendium-BGG interface."""
 
 
-from typing import Dict, List, Optional, Union
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Union, NamedTuple, Iterable
 from operator import itemgetter
 
-from spielpendium.network import (get_user_game_collection, get_game_info,
-                                  get_images)
+from spielpendium import log
+from spielpendium.data.parallel_parse import parse_game_rows
+from spielpendium.data.player_poll import PlayerPoll
+from spielpendium.data.row_extractor import boardgame_to_row
+from spielpendium.network import (get_user_game_collection, iter_game_info,
+                                  get_game_xml, get_images)
+from spielpendium.network.bgg_api_interface import (
+    user_exists, get_user_info, download_user_game_collection, save_user_xml
+)
 
 __author__ = 'Eduardo Ruiz'
 
-__all__ = ['import_user_data']
+__all__ = ['import_user_data', 'import_users_data', 'sync_user_data',
+           'SyncResult', 'MultiUserImport']
+
+# How many collections are requested from BGG at the same time
+_MAX_COLLECTION_REQUESTS = 4
+
+
+class SyncResult(NamedTuple):
+    """The changes found when syncing a user's collection."""
+    added: List[str]
+    removed: List[str]
+    updated: List[str]
+    data: List[Dict]
 
 
 def get_name(ii_game: Dict) -> Union[str, List]:
@@ -86,6 +107,31 @@ def get_recommended_players(ii_game: Dict) -> str:
         return num_player_poll['@numplayers']
 
 
+def get_player_poll(ii_game: Dict) -> PlayerPoll:
+    """ Reads all the votes of the user poll about the number of players.
+
+    :param ii_game: The iith game in the game list
+    :return: The votes for each number of players.
+    """
+    polls = ii_game['poll']
+    num_player_poll = [poll.get('results', []) for poll in polls
+                       if poll['@name'] == 'suggested_numplayers'][0]
+
+    if isinstance(num_player_poll, dict):
+        num_player_poll = [num_player_poll]
+
+    entries = []
+    for results in num_player_poll:
+        votes = results.get('result', [])
+        if isinstance(votes, dict):
+            votes = [votes]
+        entries.append((results['@numplayers'],
+                        {num_votes['@value']: int(num_votes['@numvotes'])
+                         for num_votes in votes}))
+
+    return PlayerPoll.from_results(entries)
+
+
 def get_bgg_rank(ii_game: Dict) -> str:
     """ Finds the general BGG rank for the game and returns it.
 
@@ -160,60 +206,232 @@ def dict_list_to_dict(dict_list: Union[Dict, List[Dict]]) -> Dict:
 
 def import_user_data(username: str, force_update: bool = False,
                      filters: Optional[Dict[str, Union[int, bool]]] = None,
-                     ) -> List[Dict]:
+                     parallel: bool = False) -> List[Dict]:
     """ Takes information downloaded using the BGG API and conditions it to
     the format needed by a Games object.
 
     :param username: The BGG username whose collection we're importing.
     :param filters: Additional filters for the game collection.
     :param force_update: Whether to force an update from the API.
+    :param parallel: Whether to parse the game details in several processes.
+           This pays off for large collections.
     :return: A dict in the format needed by a Games object.
     """
 
     user_collection = get_user_game_collection(username, filters, force_update)
 
-    num_items = int(user_collection['items']['@totalitems'])
-
-    game_ids = [user_collection['items']['item'][ii]['@objectid']
-                for ii in range(num_items)]
-
-    game_info = get_game_info(game_ids, get_stats=True)
-
-    boardgame_list = game_info['boardgames']['boardgame']
-
-    image_urls = [boardgame_list[ii]['image'] for ii in range(num_items)]
-
-    images = get_images(image_urls)
-
-    data = []
-
-    for ii, game in enumerate(boardgame_list):
-        data.append(
-            {
-                'BGG Id': game['@objectid'],
-                'Image': images[ii],
-                'Name': get_name(game),
-                'Version': get_version(game),
-                'Author': get_authors(game),
-                'Artist': get_artists(game),
-                'Publisher': game['boardgamepublisher'],
-                'Release Year': game['yearpublished'],
-                'Category': get_categories(game),
-                'Description': game['description'],
-                'Minimum Players': game['minplayers'],
-                'Maximum Players': game['maxplayers'],
-                'Recommended Players': get_recommended_players(game),
-                'Age': game['age'],
-                'Minimum Play Time': game['minplaytime'],
-                'Maximum Play Time': game['maxplaytime'],
-                'BGG Rating': game['statistics']['ratings']['average'],
-                'BGG Rank': get_bgg_rank(game),
-                'Complexity': game['statistics']['ratings']['averageweight'],
-                'Related Games': get_related_games(game),
-            }
+    game_ids = list(collection_index(user_collection).keys())
+
+    return get_game_rows(game_ids, parallel)
+
+
+class MultiUserImport(NamedTuple):
+    """The result of importing several users' collections at once."""
+    # The rows of each user, in collection order
+    users: Dict[str, List[Dict]]
+    # Every game owned by any of the users, once, in order of first owner
+    merged: List[Dict]
+    # The users owning each game
+    owners: Dict[str, List[str]]
+    # The number of games in all the collections, counting duplicates
+    requested: int
+    # How long the import took, in seconds
+    elapsed: float
+
+    @property
+    def duplicates(self) -> int:
+        """The number of game downloads saved by deduplication."""
+        return self.requested - len(self.merged)
+
+
+def import_users_data(usernames: Iterable[str], force_update: bool = False,
+                      filters: Optional[Dict[str, Union[int, bool]]] = None,
+                      parallel: bool = False) -> MultiUserImport:
+    """ Imports the collections of several users at once.
+
+    The collections are fetched concurrently. The details and image of a game
+    owned by several users are only downloaded once and the rows are shared
+    between the users.
+
+    :param usernames: The BGG usernames whose collections we're importing.
+    :param force_update: Whether to force an update from the API.
+    :param filters: Additional filters for the game collections.
+    :param parallel: Whether to parse the game details in several processes.
+    :return: The rows of each user, the merged rows and who owns what.
+    """
+    start = time.perf_counter()
+    usernames = list(dict.fromkeys(usernames))
+
+    with ThreadPoolExecutor(max_workers=_MAX_COLLECTION_REQUESTS) as executor:
+        collections = executor.map(
+            lambda username: get_user_game_collection(username, filters,
+                                                      force_update),
+            usernames
         )
+        user_ids = {username: list(collection_index(collection).keys())
+                    for username, collection in zip(usernames, collections)}
+
+    owners = {}
+    for username, game_ids in user_ids.items():
+        for game_id in game_ids:
+            owners.setdefault(game_id, []).append(username)
+
+    merged = get_game_rows(list(owners.keys()), parallel)
+    rows_by_id = {str(row['BGG Id']): row for row in merged}
+
+    elapsed = time.perf_counter() - start
+    result = MultiUserImport(
+        {username: [rows_by_id[game_id] for game_id in game_ids
+                    if game_id in rows_by_id]
+         for username, game_ids in user_ids.items()},
+        merged, owners, sum(len(ids) for ids in user_ids.values()), elapsed
+    )
+
+    log.logger.info(f'Imported {len(usernames)} collections in '
+                    f'{elapsed:.2f} s: {len(merged)} unique games, '
+                    f'{result.duplicates} duplicate downloads avoided.')
+
+    return result
+
+
+def sync_user_data(username: str,
+                   known_ids: Optional[Iterable[Union[int, str]]] = None,
+                   filters: Optional[Dict[str, Union[int, bool]]] = None,
+                   ) -> SyncResult:
+    """ Refreshes a user's collection, only downloading what changed.
+
+    The fresh collection is compared with the one stored locally, using the
+    object ids and BGG's last-modified timestamps. Details and images are
+    only fetched for games that were added or modified since. The fresh
+    collection is only saved once they have been, so that a failed sync is
+    retried in full the next time.
 
-    return data
+    :param username: The BGG username whose collection we're syncing.
+    :param known_ids: The ids of the games that are already available
+           locally. Games missing from it are treated as added. If None, every
+           game of the stored collection is assumed to be available.
+    :param filters: Additional filters for the game collection.
+    :return: The added, removed and updated ids and the rows for the added
+             and updated games, in the format needed by a Games object.
+             The ids are in collection order.
+    """
+    if user_exists(username):
+        old_index = collection_index(get_user_info(username))
+    else:
+        old_index = {}
+
+    user_collection, xml = download_user_game_collection(username, filters)
+    new_index = collection_index(user_collection)
+
+    # Games that aren't in the stored collection go last, by id
+    removed = [game_id for game_id in old_index if game_id not in new_index]
+    if known_ids is not None:
+        known_ids = {str(game_id) for game_id in known_ids}
+        removed = [game_id for game_id in removed if game_id in known_ids]
+        removed += sorted((game_id for game_id in known_ids
+                           if game_id not in old_index
+                           and game_id not in new_index),
+                          key=lambda game_id: (len(game_id), game_id))
+        old_index = {game_id: modified
+                     for game_id, modified in old_index.items()
+                     if game_id in known_ids}
+
+    added = [game_id for game_id in new_index if game_id not in old_index]
+    updated = [game_id for game_id, modified in new_index.items()
+               if game_id in old_index and old_index[game_id] != modified]
+
+    rows = get_game_rows(added + updated)
+    save_user_xml(username, xml, user_collection)
+
+    log.logger.info(f'Synced collection of {username}: {len(added)} added, '
+                    f'{len(removed)} removed, {len(updated)} updated.')
+
+    return SyncResult(added, removed, updated, rows)
+
+
+def collection_index(user_collection: Dict) -> Dict[str, str]:
+    """ Maps the games of a collection to their last-modified timestamps.
+
+    :param user_collection: The collection, as returned by
+           get_user_game_collection.
+    :return: The last-modified timestamp for each game id, in collection
+             order. A game listed several times keeps its latest timestamp.
+    """
+    items = (user_collection.get('items') or {}).get('item', [])
+    if isinstance(items, dict):
+        items = [items]
+
+    index = {}
+    for item in items:
+        status = item.get('status') or {}
+        modified = status.get('@lastmodified', '')
+        game_id = item['@objectid']
+        index[game_id] = max(index.get(game_id, ''), modified)
+
+    return index
+
+
+def get_game_rows(game_ids: List[Union[int, str]],
+                  parallel: bool = False) -> List[Dict]:
+    """ Downloads games and conditions them to the format needed by a Games
+    object.
+
+    :param game_ids: The BGG ids of the games.
+    :param parallel: Whether to parse the game details in several processes.
+    :return: One row per game.
+    """
+    if not game_ids:
+        return []
+
+    if parallel:
+        games = parse_game_rows(get_game_xml(game_ids, get_stats=True))
+    else:
+        games = list(iter_game_info(game_ids, get_stats=True,
+                                    convert=boardgame_to_row))
+
+    images = get_images([image_url for _, image_url in games])
+
+    rows = []
+    for (row, _), image in zip(games, images):
+        row['Image'] = image
+        rows.append(row)
+
+    return rows
+
+
+def game_to_row(game: Dict, image) -> Dict:
+    """ Converts the details of a game to a row of a Games object.
+
+    boardgame_to_row makes the same row straight from the XML, which is
+    faster.
+
+    :param game: The details of the game, as returned by get_game_info.
+    :param image: The image of the game.
+    :return: The row.
+    """
+    return {
+        'BGG Id': game['@objectid'],
+        'Image': image,
+        'Name': get_name(game),
+        'Version': get_version(game),
+        'Author': get_authors(game),
+        'Artist': get_artists(game),
+        'Publisher': game['boardgamepublisher'],
+        'Release Year': game['yearpublished'],
+        'Category': get_categories(game),
+        'Description': game['description'],
+        'Minimum Players': game['minplayers'],
+        'Maximum Players': game['maxplayers'],
+        'Recommended Players': get_recommended_players(game),
+        'Age': game['age'],
+        'Minimum Play Time': game['minplaytime'],
+        'Maximum Play Time': game['maxplaytime'],
+        'BGG Rating': game['statistics']['ratings']['average'],
+        'BGG Rank': get_bgg_rank(game),
+        'Complexity': game['statistics']['ratings']['averageweight'],
+        'Related Games': get_related_games(game),
+        'Player Poll': get_player_poll(game),
+    }
 
 
 if __name__ == '__main__':
@@ -0,0 +1,224 @@
+"""Progressive import of a BGG collection.
+
+import_user_data waits for every download before returning anything. The
+pipeline in this module splits the import into stages that run at the same
+time in their own threads, connected by bounded queues:
+
+    collection -> details -> rows -> images -> caller
+
+The caller receives batches of finished rows as soon as they are ready and
+can append them to a Games object while the rest is still downloading.
+"""
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterator, List, NamedTuple, Optional, Union
+
+from spielpendium import log
+from spielpendium.data.games_interface import collection_index
+from spielpendium.data.row_extractor import boardgame_to_row
+from spielpendium.network import get_user_game_collection, iter_game_info
+from spielpendium.network.bgg_api_interface import get_single_image
+from spielpendium.thumbnails import Thumbnails
+
+__author__ = 'Eduardo Ruiz'
+
+__all__ = ['iter_import_user_data', 'ImportProgress', 'STAGES']
+
+STAGES = ('collection', 'details', 'rows', 'images')
+
+_DEFAULT_BATCH_SIZE = 25
+_DEFAULT_QUEUE_SIZE = 4
+_IMAGE_WORKERS = 8
+
+# How often blocked stages check whether the import was abandoned
+_POLL_INTERVAL = 0.1
+
+
+class ImportProgress(NamedTuple):
+    """The progress of one stage of the import pipeline."""
+    stage: str
+    done: int
+    total: int
+    elapsed: float
+
+    @property
+    def eta(self) -> Optional[float]:
+        """The estimated number of seconds until the stage finishes."""
+        if self.done == 0:
+            return None
+        return self.elapsed / self.done * (self.total - self.done)
+
+
+class _Failure:
+    """Carries an exception from a stage to the caller."""
+
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+_DONE = object()
+
+
+class _Pipeline:
+
+    def __init__(self, batch_size: int, queue_size: int,
+                 progress: Optional[Callable[[ImportProgress], None]]):
+        self.batch_size = batch_size
+        self.progress = progress
+        self.stopped = threading.Event()
+        self.total = 0
+        self.start_time = time.perf_counter()
+        self.queues = [queue.Queue(maxsize=queue_size)
+                       for _ in range(len(STAGES))]
+
+    def put(self, stage: int, item) -> bool:
+        """Puts an item in the output queue of a stage, unless the import
+        was abandoned."""
+        while not self.stopped.is_set():
+            try:
+                self.queues[stage].put(item, timeout=_POLL_INTERVAL)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def get(self, stage: int):
+        """Gets an item from the output queue of a stage."""
+        while not self.stopped.is_set():
+            try:
+                return self.queues[stage].get(timeout=_POLL_INTERVAL)
+            except queue.Empty:
+                pass
+        return _DONE
+
+    def report(self, stage: int, done: int):
+        if self.progress is not None:
+            elapsed = time.perf_counter() - self.start_time
+            self.progress(ImportProgress(STAGES[stage], done, self.total,
+                                         elapsed))
+
+    def run_stage(self, stage: int, func: Callable):
+        """Runs a stage, forwarding its errors and its end downstream."""
+        try:
+            func()
+        except BaseException as err:
+            log.logger.exception(f'Import stage "{STAGES[stage]}" failed.')
+            self.put(stage, _Failure(err))
+        self.put(stage, _DONE)
+
+    def upstream(self, stage: int) -> Iterator:
+        """Iterates over the output of the previous stage."""
+        while True:
+            item = self.get(stage - 1)
+            if item is _DONE:
+                return
+            if isinstance(item, _Failure):
+                self.put(stage, item)
+                return
+            yield item
+
+
+def iter_import_user_data(
+        username: str, force_update: bool = False,
+        filters: Optional[Dict[str, Union[int, bool]]] = None,
+        batch_size: int = _DEFAULT_BATCH_SIZE,
+        queue_size: int = _DEFAULT_QUEUE_SIZE,
+        progress: Optional[Callable[[ImportProgress], None]] = None
+) -> Iterator[List[Dict]]:
+    """ Imports a user's collection, yielding batches of rows as they finish.
+
+    Each batch can be passed straight to Games.append. The rows are the same
+    as those returned by import_user_data and come in collection order.
+
+    :param username: The BGG username whose collection we're importing.
+    :param force_update: Whether to force an update from the API.
+    :param filters: Additional filters for the game collection.
+    :param batch_size: The number of games requested and yielded at a time.
+    :param queue_size: The number of batches each stage can get ahead of the
+           next one.
+    :param progress: Called with an ImportProgress every time a stage
+           completes a game. It is called from the worker threads.
+    :return: An iterator over batches of rows.
+    """
+    pipeline = _Pipeline(batch_size, queue_size, progress)
+
+    def collection_stage():
+        collection = get_user_game_collection(username, filters, force_update)
+        game_ids = list(collection_index(collection).keys())
+        pipeline.total = len(game_ids)
+        pipeline.report(0, len(game_ids))
+
+        for start in range(0, len(game_ids), batch_size):
+            if not pipeline.put(0, game_ids[start:start + batch_size]):
+                return
+
+    def details_stage():
+        done = 0
+        for game_ids in pipeline.upstream(1):
+            for game in iter_game_info(game_ids, get_stats=True,
+                                       convert=boardgame_to_row):
+                if not pipeline.put(1, game):
+                    return
+                done += 1
+                pipeline.report(1, done)
+
+    def rows_stage():
+        done = 0
+        batch = []
+        for game in pipeline.upstream(2):
+            batch.append(game)
+            done += 1
+            pipeline.report(2, done)
+
+            if len(batch) == batch_size:
+                if not pipeline.put(2, batch):
+                    return
+                batch = []
+
+        if batch:
+            pipeline.put(2, batch)
+
+    def images_stage():
+        done = 0
+        with ThreadPoolExecutor(max_workers=_IMAGE_WORKERS) as executor:
+            for batch in pipeline.upstream(3):
+                # The thumbnails are made here, outside the GUI thread. Their
+                # pixmaps are only made when the games are first drawn.
+                images = executor.map(
+                    lambda url: Thumbnails.from_data(get_single_image(url)),
+                    [image_url for _, image_url in batch]
+                )
+
+                rows = []
+                for (row, _), image in zip(batch, images):
+                    row['Image'] = image
+                    rows.append(row)
+
+                if not pipeline.put(3, rows):
+                    return
+                done += len(rows)
+                pipeline.report(3, done)
+
+    threads = [threading.Thread(target=pipeline.run_stage, args=(ii, func),
+                                name=f'import-{STAGES[ii]}', daemon=True)
+               for ii, func in enumerate([collection_stage, details_stage,
+                                          rows_stage, images_stage])]
+    for thread in threads:
+        thread.start()
+
+    try:
+        while True:
+            rows = pipeline.get(len(STAGES) - 1)
+            if rows is _DONE:
+                break
+            if isinstance(rows, _Failure):
+                raise rows.error
+
+            yield rows
+    finally:
+        # Let the stages wind down if the caller stopped early or failed
+        pipeline.stopped.set()
+        for thread in threads:
+            thread.join()
@@ -0,0 +1,125 @@
+"""Parsing of large get_game_info responses in several processes.
+
+Parsing the details of a big collection is CPU-bound, so a single response
+is split into smaller documents with a share of its <boardgame> elements
+each, and those are parsed in a process pool. The workers send back compact
+tuples instead of dicts, which are cheaper to pickle, and the rows are put
+back together in response order.
+
+The pool is started the first time it's needed and reused afterwards, so
+its start-up cost is paid once per session.
+"""
+import atexit
+import multiprocessing as mp
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from spielpendium import log
+from spielpendium.data.row_extractor import rows_from_xml
+
+__author__ = 'Eduardo Ruiz'
+
+__all__ = ['parse_game_rows', 'split_boardgames', 'shutdown_executor']
+
+# Below this many games per worker, the pool costs more than it saves
+_MIN_GAMES_PER_CHUNK = 50
+
+# Every worker gets a few chunks so a slow chunk doesn't hold up the rest
+_CHUNKS_PER_WORKER = 2
+
+_GAME_START = b'<boardgame '
+_ROOT_END = b'</boardgames>'
+
+# The order of the fields in the records sent back by the workers
+_ROW_KEYS = ('BGG Id', 'Image', 'Name', 'Version', 'Author', 'Artist',
+             'Publisher', 'Release Year', 'Category', 'Description',
+             'Minimum Players', 'Maximum Players', 'Recommended Players',
+             'Age', 'Minimum Play Time', 'Maximum Play Time', 'BGG Rating',
+             'BGG Rank', 'Complexity', 'Related Games', 'Player Poll')
+
+_executor: Optional[ProcessPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+
+    with _executor_lock:
+        if _executor is None:
+            log.logger.debug(f'Starting {mp.cpu_count()} parsing processes.')
+            _executor = ProcessPoolExecutor(max_workers=mp.cpu_count())
+            atexit.register(shutdown_executor)
+
+        return _executor
+
+
+def shutdown_executor():
+    """Stops the parsing processes, if they were started."""
+    global _executor
+
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown()
+            _executor = None
+
+
+def split_boardgames(xml: bytes, num_chunks: int) -> List[bytes]:
+    """ Splits a get_game_info response into smaller, complete responses.
+
+    :param xml: The response.
+    :param num_chunks: The number of responses to split it into.
+    :return: The responses, each with a consecutive share of the games.
+    """
+    starts = []
+    position = xml.find(_GAME_START)
+    while position != -1:
+        starts.append(position)
+        position = xml.find(_GAME_START, position + len(_GAME_START))
+
+    end = xml.rfind(_ROOT_END)
+    if not starts or end == -1 or num_chunks <= 1:
+        return [xml]
+
+    # Everything before the first game (declaration and root start tag)
+    header = xml[:starts[0]]
+
+    num_chunks = min(num_chunks, len(starts))
+    chunk_size = -(-len(starts) // num_chunks)
+    bounds = starts[::chunk_size] + [end]
+
+    return [header + xml[bounds[ii]:bounds[ii + 1]] + _ROOT_END
+            for ii in range(len(bounds) - 1)]
+
+
+def _parse_chunk(xml: bytes) -> List[Tuple]:
+    """Parses a response in a worker process into compact records."""
+    return [tuple(row[key] for key in _ROW_KEYS) + (image_url,)
+            for row, image_url in rows_from_xml([xml])]
+
+
+def parse_game_rows(xml: bytes, parallel: bool = True) \
+        -> List[Tuple[Dict, str]]:
+    """ Converts a get_game_info response to rows of a Games object.
+
+    :param xml: The response.
+    :param parallel: Whether to parse large responses in several processes.
+    :return: The row and image URL of each game, in response order.
+    """
+    num_games = xml.count(_GAME_START)
+    num_chunks = min(mp.cpu_count() * _CHUNKS_PER_WORKER,
+                     num_games // _MIN_GAMES_PER_CHUNK)
+
+    if not parallel or num_chunks <= 1:
+        return rows_from_xml([xml])
+
+    log.logger.debug(f'Parsing {num_games} games in {num_chunks} chunks.')
+
+    rows = []
+    # map keeps the chunks in order, whichever worker finishes first
+    for records in _get_executor().map(_parse_chunk,
+                                       split_boardgames(xml, num_chunks)):
+        for record in records:
+            rows.append((dict(zip(_ROW_KEYS, record)), record[-1]))
+
+    return rows
@@ -0,0 +1,265 @@
+"""The "suggested number of players" poll of BGG games.
+
+BGG users vote, for every player count, whether a game is best,
+recommended or not recommended at that count. PlayerPoll keeps all of those
+votes for one game in a small numpy array, and PlayerPollIndex stacks the
+polls of many games into a matrix that answers questions like "which games
+are best at 4" for the whole collection at once.
+
+The last player count of a poll is usually of the form "N+", meaning
+"more than N players". It is kept as is and used for any player count above
+N that has no votes of its own.
+"""
+from __future__ import annotations
+
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+__author__ = 'Eduardo Ruiz'
+
+__all__ = ['PlayerPoll', 'PlayerPollIndex', 'POLL_DTYPE', 'VOTE_VALUES']
+
+# The answers of the poll, in the order they're stored
+VOTE_VALUES = ('Best', 'Recommended', 'Not Recommended')
+
+# Explicitly little-endian so the bytes are the same on every machine
+POLL_DTYPE = np.dtype([('players', 'u1'), ('plus', '?'), ('best', '<u4'),
+                       ('recommended', '<u4'), ('not_recommended', '<u4')])
+
+_VOTE_FIELDS = ('best', 'recommended', 'not_recommended')
+
+
+class PlayerPoll:
+    """The votes of the player count poll of a single game."""
+
+    def __init__(self, votes: Optional[np.ndarray] = None):
+        """Initialize the poll.
+
+        :param votes: The votes, as an array of POLL_DTYPE with one entry per
+            player count.
+        """
+        if votes is None:
+            votes = np.zeros(0, POLL_DTYPE)
+        self.votes = np.asarray(votes, POLL_DTYPE)
+
+    @classmethod
+    def from_results(cls, results: Iterable[Tuple[str, Dict[str, int]]]) \
+            -> PlayerPoll:
+        """Builds a poll from the results of each player count.
+
+        :param results: (number of players, {answer: votes}) pairs, where the
+            number of players is a label like '3' or '4+'.
+        :return: The poll.
+        """
+        entries = []
+        for label, votes in results:
+            players, plus = _parse_label(label)
+            if players is None:
+                continue
+            entries.append((players, plus)
+                           + tuple(int(votes.get(value, 0))
+                                   for value in VOTE_VALUES))
+
+        return cls(np.array(entries, POLL_DTYPE))
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> PlayerPoll:
+        """Rebuilds a poll saved with to_bytes.
+
+        :param data: The bytes of the poll.
+        :return: The poll.
+        """
+        return cls(np.frombuffer(data, POLL_DTYPE).copy())
+
+    def to_bytes(self) -> bytes:
+        """Converts the poll to bytes, e.g. to store it in the database.
+
+        :return: The bytes of the poll.
+        """
+        return self.votes.tobytes()
+
+    @classmethod
+    def from_list(cls, entries: Optional[List[List]]) -> PlayerPoll:
+        """Rebuilds a poll saved with to_list.
+
+        :param entries: [number of players, best, recommended,
+            not recommended] for each player count.
+        :return: The poll.
+        """
+        return cls.from_results(
+            (label, dict(zip(VOTE_VALUES, votes)))
+            for label, *votes in (entries or [])
+        )
+
+    def to_list(self) -> List[List]:
+        """Converts the poll to plain lists, e.g. to save it as JSON.
+
+        :return: [number of players, best, recommended, not recommended] for
+            each player count.
+        """
+        return [[label] + [int(entry[field]) for field in _VOTE_FIELDS]
+                for label, entry in zip(self.labels, self.votes)]
+
+    @property
+    def labels(self) -> List[str]:
+        """The player counts of the poll, as BGG writes them."""
+        return [f'{entry["players"]}{"+" if entry["plus"] else ""}'
+                for entry in self.votes]
+
+    def best_players(self) -> Optional[str]:
+        """Returns the first player count with the most 'Best' votes.
+
+        :return: The player count, as BGG writes it.
+        """
+        if len(self.votes) == 0:
+            return None
+        return self.labels[int(np.argmax(self.votes['best']))]
+
+    def __len__(self) -> int:
+        return len(self.votes)
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, PlayerPoll):
+            return NotImplemented
+        return np.array_equal(self.votes, other.votes)
+
+    def __repr__(self) -> str:
+        return f'PlayerPoll({self.to_list()})'
+
+
+class PlayerPollIndex:
+    """The player count polls of many games, for vectorized queries.
+
+    Every query returns a boolean mask with one element per game, in the
+    order the polls were given. Use ids() to turn it into BGG ids.
+    """
+
+    def __init__(self, game_ids: Sequence[Union[int, str]],
+                 polls: Sequence[Optional[PlayerPoll]]):
+        """Initialize the index.
+
+        :param game_ids: The BGG ids of the games.
+        :param polls: The poll of each game. Missing polls count as no votes.
+        """
+        self.game_ids = np.array([str(game_id) for game_id in game_ids],
+                                 dtype=object)
+
+        polls = [poll if isinstance(poll, PlayerPoll) else PlayerPoll()
+                 for poll in polls]
+        max_players = max([int(entry['players']) + int(entry['plus'])
+                           for poll in polls for entry in poll.votes],
+                          default=0)
+
+        # votes[game, players] holds the best/recommended/not recommended
+        # votes, and overflow the votes for more players than that
+        self.votes = np.zeros((len(polls), max_players + 1, 3), np.uint32)
+        self.overflow = np.zeros((len(polls), 3), np.uint32)
+
+        for row, poll in enumerate(polls):
+            entries = poll.votes
+            counts = np.stack([entries[field] for field in _VOTE_FIELDS],
+                              axis=-1)
+
+            exact = ~entries['plus']
+            self.votes[row, entries['players'][exact]] = counts[exact]
+
+            for entry, entry_counts in zip(entries[~exact], counts[~exact]):
+                start = int(entry['players']) + 1
+                missing = ~self.votes[row, start:].any(axis=1)
+                self.votes[row, start:][missing] = entry_counts
+                self.overflow[row] = entry_counts
+
+    def _votes_in(self, min_players: int, max_players: int) -> np.ndarray:
+        """Returns the votes of every game for a range of player counts, with
+        shape (games, player counts, 3)."""
+        width = self.votes.shape[1]
+        votes = self.votes[:, max(min_players, 0):min(max_players, width - 1)
+                           + 1]
+
+        if max_players >= width:
+            extra = max_players - max(min_players, width) + 1
+            votes = np.concatenate(
+                [votes, np.repeat(self.overflow[:, np.newaxis], extra,
+                                  axis=1)], axis=1
+            )
+
+        return votes
+
+    @staticmethod
+    def _is_best(votes: np.ndarray) -> np.ndarray:
+        best = votes[..., 0]
+        return (best > votes[..., 1]) & (best > votes[..., 2])
+
+    @staticmethod
+    def _is_recommended(votes: np.ndarray) -> np.ndarray:
+        return votes[..., 0] + votes[..., 1] > votes[..., 2]
+
+    def best_at(self, players: int) -> np.ndarray:
+        """Finds the games whose most common vote at a player count is
+        'Best'.
+
+        :param players: The number of players.
+        :return: A mask of the matching games.
+        """
+        return self.best_in(players, players)
+
+    def recommended_at(self, players: int) -> np.ndarray:
+        """Finds the games with more 'Best' and 'Recommended' votes than
+        'Not Recommended' votes at a player count.
+
+        :param players: The number of players.
+        :return: A mask of the matching games.
+        """
+        return self.recommended_in(players, players)
+
+    def best_in(self, min_players: int, max_players: int,
+                every: bool = False) -> np.ndarray:
+        """Finds the games that are best at some (or every) player count in a
+        range.
+
+        :param min_players: The smallest number of players.
+        :param max_players: The largest number of players.
+        :param every: Whether the games have to be best at every player count
+            of the range, instead of at least one.
+        :return: A mask of the matching games.
+        """
+        matches = self._is_best(self._votes_in(min_players, max_players))
+        return matches.all(axis=1) if every else matches.any(axis=1)
+
+    def recommended_in(self, min_players: int, max_players: int,
+                       every: bool = False) -> np.ndarray:
+        """Finds the games that are recommended at some (or every) player
+        count in a range.
+
+        :param min_players: The smallest number of players.
+        :param max_players: The largest number of players.
+        :param every: Whether the games have to be recommended at every
+            player count of the range, instead of at least one.
+        :return: A mask of the matching games.
+        """
+        matches = self._is_recommended(self._votes_in(min_players,
+                                                      max_players))
+        return matches.all(axis=1) if every else matches.any(axis=1)
+
+    def ids(self, mask: np.ndarray) -> List[str]:
+        """Converts a mask returned by a query to BGG ids.
+
+        :param mask: The mask.
+        :return: The ids of the games in the mask.
+        """
+        return list(self.game_ids[mask])
+
+    def __len__(self) -> int:
+        return len(self.game_ids)
+
+
+def _parse_label(label: str) -> Tuple[Optional[int], bool]:
+    plus = label.endswith('+')
+    try:
+        players = int(label.rstrip('+'))
+    except ValueError:
+        return None, False
+    if not 0 <= players <= 255:
+        return None, False
+    return players, plus
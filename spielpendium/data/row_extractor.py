@@ -0,0 +1,247 @@
+"""Direct conversion of BGG <boardgame> elements to Games rows.
+
+game_to_row works on the generic dicts produced by xmltodict, which have to
+be built in full and then walked by the helper functions in games_interface.
+The extractor in this module reads a parsed <boardgame> element in a single
+pass over its children instead, and produces exactly the same row.
+
+Strings that repeat a lot between games (category, designer, artist and
+publisher names, player counts) are interned, so a large collection keeps a
+single copy of each.
+"""
+import sys
+import xml.etree.ElementTree as ElementTree
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+from spielpendium.data.player_poll import PlayerPoll
+from spielpendium.network.xml_stream import iter_xml_elements
+
+__author__ = 'Eduardo Ruiz'
+
+__all__ = ['boardgame_to_row', 'rows_from_xml']
+
+# Children whose text goes into the row as is
+_LEAF_TAGS = frozenset({'yearpublished', 'description', 'minplayers',
+                        'maxplayers', 'age', 'minplaytime', 'maxplaytime',
+                        'image'})
+
+# Children pointing to other BGG objects, as objectid and name
+_LINK_TAGS = frozenset({'boardgamepublisher', 'boardgameversion',
+                        'boardgamecategory', 'boardgamedesigner',
+                        'boardgameartist', 'boardgameexpansion'})
+
+_PLAYERS_POLL = 'suggested_numplayers'
+_RANK_NAME = 'boardgame'
+_BEST = 'Best'
+
+_attribute_keys: Dict[str, str] = {}
+
+
+def _attribute_key(name: str) -> str:
+    key = _attribute_keys.get(name)
+    if key is None:
+        key = _attribute_keys[name] = sys.intern(f'@{name}')
+    return key
+
+
+def _text(element: ElementTree.Element) -> Optional[str]:
+    """Returns the text of a leaf element like xmltodict does."""
+    return (element.text or '').strip() or None
+
+
+def _link_text(element: ElementTree.Element) -> Optional[str]:
+    text = _text(element)
+    return None if text is None else sys.intern(text)
+
+
+def _name(names: List[ElementTree.Element]) -> Union[str, List]:
+    if not names:
+        raise KeyError('name')
+
+    if len(names) == 1:
+        # xmltodict turns a name without attributes into a plain string
+        if not names[0].attrib:
+            return ''
+        return _required_text(names[0])
+
+    for name in names:
+        if 'primary' in name.attrib:
+            return _required_text(name)
+
+    return [_required_text(name) for name in names]
+
+
+def _required_text(element: ElementTree.Element) -> str:
+    text = _text(element)
+    if text is None:
+        raise KeyError('#text')
+    return text
+
+
+def _joined(links: List[ElementTree.Element], missing: str = None) -> str:
+    """Joins the names of linked objects. If the links are missing (or one of
+    them has no name), the missing text is returned instead, if given."""
+    texts = [_link_text(link) for link in links]
+    if not texts or None in texts:
+        if missing is None:
+            raise KeyError(links[0].tag if links else 'link')
+        return missing
+
+    return ', '.join(texts)
+
+
+def _link_dict(links: List[ElementTree.Element], tag: str) -> Dict:
+    if not links:
+        raise KeyError(tag)
+
+    return {link.attrib['objectid']: _link_text(link) for link in links}
+
+
+def _publisher(links: List[ElementTree.Element]) -> Union[Dict, List[Dict]]:
+    """Returns the publishers in the raw form xmltodict gives them."""
+    if not links:
+        raise KeyError('boardgamepublisher')
+
+    publishers = []
+    for link in links:
+        publisher = {_attribute_key(key): value
+                     for key, value in link.attrib.items()}
+        text = _link_text(link)
+        if text is not None:
+            publisher['#text'] = text
+        publishers.append(publisher)
+
+    return publishers[0] if len(publishers) == 1 else publishers
+
+
+def _players_poll(poll: Optional[ElementTree.Element]) \
+        -> Tuple[str, PlayerPoll]:
+    """Returns the recommended number of players and the whole poll."""
+    if poll is None:
+        raise KeyError(_PLAYERS_POLL)
+
+    results = poll.findall('results')
+    entries = []
+    for result in results:
+        entries.append((sys.intern(result.attrib['numplayers']),
+                        {vote.get('value'): int(vote.attrib['numvotes'])
+                         for vote in result}))
+
+    player_poll = PlayerPoll.from_results(entries)
+
+    if len(entries) == 1:
+        return entries[0][0], player_poll
+
+    # The first player count with the most 'Best' votes wins
+    best_players, best_votes = None, -1
+    for players, votes in entries:
+        if votes[_BEST] > best_votes:
+            best_players, best_votes = players, votes[_BEST]
+
+    return best_players, player_poll
+
+
+def _ratings(statistics: Optional[ElementTree.Element]) \
+        -> Tuple[Optional[str], Optional[str], str]:
+    """Returns the average rating, the complexity and the BGG rank."""
+    if statistics is None:
+        raise KeyError('statistics')
+
+    average = weight = None
+    ranks = []
+    ratings = statistics.find('ratings')
+    if ratings is None:
+        raise KeyError('ratings')
+
+    for child in ratings:
+        tag = child.tag
+        if tag == 'average':
+            average = _text(child)
+        elif tag == 'averageweight':
+            weight = _text(child)
+        elif tag == 'ranks':
+            ranks = child.findall('rank')
+
+    if not ranks:
+        raise KeyError('rank')
+    if len(ranks) == 1:
+        return average, weight, ranks[0].attrib['value']
+
+    return average, weight, [rank.attrib['value'] for rank in ranks
+                             if rank.get('name') == _RANK_NAME][0]
+
+
+def boardgame_to_row(element: ElementTree.Element) -> Tuple[Dict, str]:
+    """ Converts a <boardgame> element to a row of a Games object.
+
+    The row is identical to the one game_to_row makes from the xmltodict
+    version of the same element.
+
+    :param element: The <boardgame> element of a get_game_info response
+           fetched with stats.
+    :raises KeyError: If a field needed by the row is missing.
+    :return: The row, without an image, and the URL of the game's image.
+    """
+    leaves = {}
+    names = []
+    links = {tag: [] for tag in _LINK_TAGS}
+    players_poll = None
+    statistics = None
+
+    for child in element:
+        tag = child.tag
+        if tag in _LEAF_TAGS:
+            leaves[tag] = _text(child)
+        elif tag in _LINK_TAGS:
+            links[tag].append(child)
+        elif tag == 'name':
+            names.append(child)
+        elif tag == 'poll':
+            if players_poll is None and child.get('name') == _PLAYERS_POLL:
+                players_poll = child
+        elif tag == 'statistics':
+            statistics = child
+
+    rating, complexity, rank = _ratings(statistics)
+    recommended_players, player_poll = _players_poll(players_poll)
+
+    row = {
+        'BGG Id': element.attrib['objectid'],
+        'Image': None,
+        'Name': _name(names),
+        'Version': _link_dict(links['boardgameversion'], 'boardgameversion'),
+        'Author': _joined(links['boardgamedesigner'], 'No Authors Listed'),
+        'Artist': _joined(links['boardgameartist'], 'No Artists Listed'),
+        'Publisher': _publisher(links['boardgamepublisher']),
+        'Release Year': leaves['yearpublished'],
+        'Category': _joined(links['boardgamecategory']),
+        'Description': leaves['description'],
+        'Minimum Players': leaves['minplayers'],
+        'Maximum Players': leaves['maxplayers'],
+        'Recommended Players': recommended_players,
+        'Age': leaves['age'],
+        'Minimum Play Time': leaves['minplaytime'],
+        'Maximum Play Time': leaves['maxplaytime'],
+        'BGG Rating': rating,
+        'BGG Rank': rank,
+        'Complexity': complexity,
+        # Accessories are not part of the related games (see
+        # get_related_games)
+        'Related Games': ({} if not links['boardgameexpansion'] else
+                          _link_dict(links['boardgameexpansion'],
+                                     'boardgameexpansion')),
+        'Player Poll': player_poll,
+    }
+
+    return row, leaves['image']
+
+
+def rows_from_xml(chunks: Iterable[bytes]) -> List[Tuple[Dict, str]]:
+    """ Converts a get_game_info response to rows of a Games object.
+
+    :param chunks: The pieces of the response.
+    :return: The row and image URL of each game, in response order.
+    """
+    return [boardgame_to_row(element) for _, element
+            in iter_xml_elements(chunks, ('boardgame',))
+            if element is not None]
@@ -1 +1,15 @@
-from .database import *
+from spielpendium.lazy_import import lazy_attributes
+
+# The modules are only imported when one of their names is first used, so
+# that QtSql isn't loaded with the package
+__all__ = ['connect', 'disconnect', 'close_all', 'connection', 'query',
+           'query_batch', 'execute_many', 'bulk_write', 'transaction',
+           'database_connection', 'create', 'migrate',
+           'schema_version', 'statistics', 'reset_statistics', 'settings',
+           'queue_write', 'queue_query', 'queue_execute_many', 'flush_writes',
+           'Cursor', 'cursor', 'iter_rows', 'iter_batches']
+
+__getattr__, __dir__ = lazy_attributes(__name__, {
+    **dict.fromkeys(__all__[:-4], 'database'),
+    **dict.fromkeys(__all__[-4:], 'cursor'),
+})
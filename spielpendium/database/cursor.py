@@ -0,0 +1,190 @@
+"""Row by row access to the results of a query.
+
+query() returns every value of every row in one flat list, which is fine for
+small results. A Cursor instead hands out rows as tuples (or named records),
+reading them from SQLite as they are needed. It's forward only, so Qt doesn't
+keep the rows already read either, and large results such as cached XML or
+images can be streamed in batches.
+
+Like the connections, a cursor must be used by the thread that created it.
+"""
+import collections
+from typing import Any, Iterator, List, Optional, Sequence, Tuple
+
+from PyQt5 import QtSql
+
+from spielpendium import log
+from spielpendium.database.database import (_bind_value, _column_value,
+                                            _connections, connection)
+
+__author__ = 'Eduardo Ruiz'
+
+__all__ = ['Cursor', 'cursor', 'iter_rows', 'iter_batches']
+
+# How many rows fetchmany and iter_batches read at a time by default
+FETCH_SIZE = 500
+
+
+class Cursor:
+    """ A forward only cursor over the result of a query.
+
+    Rows are tuples, or named records if named is True. The names come from
+    the columns of the result, e.g. "SELECT id, name" gives records with
+    .id and .name. Names that aren't valid identifiers, like "COUNT(*)",
+    are replaced by _0, _1, etc.
+
+    :param named: Whether to return named records instead of tuples.
+    :param fetch_size: The default number of rows fetchmany reads.
+    """
+
+    def __init__(self, named: bool = False, fetch_size: int = FETCH_SIZE):
+        self.named = named
+        self.fetch_size = fetch_size
+        self.columns: Tuple[str, ...] = ()
+        self.rows_read = 0
+        self._query: Optional[QtSql.QSqlQuery] = None
+        self._record_type = None
+
+    def execute(self, command: str, params: Sequence = None) -> 'Cursor':
+        """ Runs a query, dropping the result of the previous one.
+
+        :param command: The SQL command.
+        :param params: The parameters of the command.
+        :raises IOError: If the query fails.
+        :return: The cursor itself.
+        """
+        self.close()
+
+        q = QtSql.QSqlQuery(connection())
+        q.setForwardOnly(True)
+        _connections.count_query()
+
+        if not q.prepare(command):
+            raise IOError(f'Unable to prepare the command "{command}". '
+                          f'Reason: {q.lastError().text()}.')
+
+        for param in params or []:
+            q.addBindValue(_bind_value(param))
+
+        if not q.exec():
+            raise IOError(f'Unable to execute the command "{command}" '
+                          f'with the parameters "{params}". '
+                          f'Reason: {q.lastError().text()}.')
+
+        record = q.record()
+        self.columns = tuple(record.fieldName(ii)
+                             for ii in range(record.count()))
+        self._record_type = (collections.namedtuple('Row', self.columns,
+                                                    rename=True)
+                             if self.named and self.columns else None)
+        self.rows_read = 0
+        self._query = q if q.isSelect() else None
+
+        return self
+
+    def fetchone(self) -> Optional[Tuple]:
+        """ Reads the next row.
+
+        :return: The row, or None if there are no rows left.
+        """
+        if self._query is None or not self._query.next():
+            self.close()
+            return None
+
+        values = [_column_value(self._query, ii)
+                  for ii in range(len(self.columns))]
+        self.rows_read += 1
+
+        if self._record_type is None:
+            return tuple(values)
+        return self._record_type(*values)
+
+    def fetchmany(self, size: int = None) -> List[Tuple]:
+        """ Reads the next rows.
+
+        :param size: The most rows to read, fetch_size if None.
+        :return: The rows. Fewer than size (or none) once the end is reached.
+        """
+        rows = []
+        for _ in range(self.fetch_size if size is None else size):
+            row = self.fetchone()
+            if row is None:
+                break
+            rows.append(row)
+
+        return rows
+
+    def fetchall(self) -> List[Tuple]:
+        """ Reads all the remaining rows.
+
+        :return: The rows.
+        """
+        return list(self)
+
+    def close(self):
+        """Releases the result of the current query."""
+        if self._query is not None:
+            self._query.finish()
+            self._query = None
+            log.count('database.rows_read', self.rows_read)
+
+    def __iter__(self) -> Iterator[Tuple]:
+        while True:
+            row = self.fetchone()
+            if row is None:
+                return
+            yield row
+
+    def __enter__(self) -> 'Cursor':
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+@log.log(log.logger)
+def cursor(command: str, params: Sequence = None,
+           named: bool = False) -> Cursor:
+    """ Runs a query and returns a cursor over its rows.
+
+    :param command: The SQL command.
+    :param params: The parameters of the command.
+    :param named: Whether the rows are named records instead of tuples.
+    :raises IOError: If the query fails.
+    :return: The cursor.
+    """
+    return Cursor(named).execute(command, params)
+
+
+def iter_rows(command: str, params: Sequence = None,
+              named: bool = False) -> Iterator[Any]:
+    """ Runs a query and yields its rows one at a time.
+
+    :param command: The SQL command.
+    :param params: The parameters of the command.
+    :param named: Whether the rows are named records instead of tuples.
+    :raises IOError: If the query fails.
+    :return: An iterator over the rows.
+    """
+    with cursor(command, params, named) as rows:
+        yield from rows
+
+
+def iter_batches(command: str, params: Sequence = None,
+                 batch_size: int = FETCH_SIZE,
+                 named: bool = False) -> Iterator[List[Any]]:
+    """ Runs a query and yields its rows in lists of batch_size.
+
+    :param command: The SQL command.
+    :param params: The parameters of the command.
+    :param batch_size: The number of rows in every list but the last.
+    :param named: Whether the rows are named records instead of tuples.
+    :raises IOError: If the query fails.
+    :return: An iterator over the lists of rows.
+    """
+    with cursor(command, params, named) as rows:
+        while True:
+            batch = rows.fetchmany(batch_size)
+            if not batch:
+                return
+            yield batch
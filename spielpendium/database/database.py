@@ -1,61 +1,593 @@
+import atexit
+import collections
+import contextlib
 import functools
-from typing import List, Any
+import itertools
+import queue
+import threading
+import time
+import weakref
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from typing import List, Any, Callable, Dict, Iterable, Sequence, Tuple
 
-from PyQt5 import QtSql
+from PyQt5 import QtSql, QtCore
 
 from spielpendium import log
-from spielpendium.constants import DB_FILE, DB_DIR
-from spielpendium.database.scripts import SQLScripts
+from spielpendium.constants import DB_FILE, DB_DIR, DB_PRAGMAS
+from spielpendium.database.scripts import Migration, SQLScripts
 
 __author__ = 'Eduardo Ruiz'
 
-__all__ = ['connect', 'disconnect', 'query', 'query_batch',
-           'database_connection', 'create']
+__all__ = ['connect', 'disconnect', 'close_all', 'connection', 'query',
+           'query_batch', 'execute_many', 'bulk_write', 'transaction',
+           'database_connection', 'create', 'migrate',
+           'schema_version', 'statistics',
+           'reset_statistics', 'settings', 'queue_write', 'queue_query',
+           'queue_execute_many', 'flush_writes']
+
+# How long a connection waits for another one to release a lock
+_BUSY_TIMEOUT_MS = 5000
+
+# The most queued writes that are committed in a single transaction
+_MAX_WRITE_BATCH = 200
+
+# How many prepared statements each connection keeps
+_STATEMENT_CACHE_SIZE = 64
+
+
+class _ConnectionManager:
+    """Keeps one open connection per thread.
+
+    Qt only allows a connection to be used (and closed) by the thread that
+    created it, so every thread gets its own named connection. It's opened
+    the first time the thread needs it and stays open until disconnect() is
+    called or the thread ends. close_all() only closes the connection of the
+    calling thread, the other threads reopen theirs the next time they use
+    them.
+
+    Each connection also keeps its most recently used prepared statements,
+    so running the same SQL again only binds the new parameters.
+    """
+
+    def __init__(self, statement_cache_size: int = _STATEMENT_CACHE_SIZE):
+        self.statement_cache_size = statement_cache_size
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._names = set()
+        self._statements: Dict[str, collections.OrderedDict] = {}
+        self._ids = itertools.count()
+        # Bumped by close_all, connections opened before are reopened
+        self._generation = 0
+        self._stats = {}
+        self.reset_statistics()
+
+    def connection(self) -> QtSql.QSqlDatabase:
+        """ Returns the open connection of the current thread.
+
+        The connection is (re)opened if needed, e.g. if the database file was
+        changed since it was opened.
+
+        :raises IOError: If the database can't be opened.
+        :return: The connection.
+        """
+        db = getattr(self._local, 'db', None)
+        if db is not None and db.isOpen() \
+                and db.databaseName() == str(DB_FILE) \
+                and self._local.generation == self._generation:
+            return db
+
+        if db is not None:
+            # Qt can't remove a connection that's still referenced
+            del db
+            self.close()
+
+        name = f'spielpendium-{next(self._ids)}'
+        db = QtSql.QSqlDatabase.addDatabase('QSQLITE', name)
+        db.setDatabaseName(str(DB_FILE))
+        db.setConnectOptions(f'QSQLITE_BUSY_TIMEOUT={_BUSY_TIMEOUT_MS}')
+
+        DB_DIR.mkdir(exist_ok=True)
+
+        if not db.open():
+            error = db.lastError().text()
+            del db
+            QtSql.QSqlDatabase.removeDatabase(name)
+            raise IOError(f'Unable to open the database at {DB_FILE}. '
+                          f'Reason: {error}.')
+
+        _apply_pragmas(db)
+        log.logger.debug('Opened database connection %s.', name)
+
+        with self._lock:
+            self._names.add(name)
+            self._statements[name] = collections.OrderedDict()
+            self._stats['opens'] += 1
+
+        self._local.db = db
+        self._local.generation = self._generation
+        # Drop the connection when the thread ends
+        self._local.finalizer = weakref.finalize(
+            self._local.__dict__.setdefault('token', _Token()),
+            self._thread_ended, name, threading.get_ident()
+        )
+
+        return db
+
+    def close(self):
+        """Closes the connection of the current thread, if it has one."""
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            return
+
+        name = db.connectionName()
+        self._drop_statements(name)
+        db.close()
+        del db
+        self._local.db = None
+        self._local.finalizer.detach()
+        self._remove(name)
+
+    def close_all(self):
+        """Closes the connection of the current thread, and makes the other
+        threads close theirs the next time they use them."""
+        with self._lock:
+            self._generation += 1
+        self.close()
+
+    def _thread_ended(self, name: str, thread_id: int):
+        if threading.get_ident() == thread_id:
+            self._remove(name)
+            return
+
+        # A forked process drops the locals of the threads it doesn't have,
+        # in its own thread. Their connections can't be closed from there.
+        with self._lock:
+            self._names.discard(name)
+            self._statements.pop(name, None)
+
+    def _remove(self, name: str):
+        with self._lock:
+            if name not in self._names:
+                return
+            self._names.discard(name)
+
+        # The statements have to go before their connection
+        self._drop_statements(name)
+        QtSql.QSqlDatabase.database(name, False).close()
+        QtSql.QSqlDatabase.removeDatabase(name)
+        log.logger.debug('Closed database connection %s.', name)
+
+    @property
+    def transaction_depth(self) -> int:
+        """How many transaction blocks the current thread is in."""
+        return getattr(self._local, 'transaction_depth', 0)
+
+    @transaction_depth.setter
+    def transaction_depth(self, depth: int):
+        self._local.transaction_depth = depth
+
+    def _drop_statements(self, name: str):
+        with self._lock:
+            statements = self._statements.pop(name, {})
+
+        for statement in statements.values():
+            statement.finish()
+        statements.clear()
+
+    def prepared(self, command: str) -> QtSql.QSqlQuery:
+        """ Returns a prepared statement for the current thread's connection.
+
+        Statements are kept per connection, keyed by their SQL text, and the
+        least recently used one is dropped once there are more than
+        statement_cache_size of them. The caller has to finish() the
+        statement once it's done with it, and must not hand it out, since
+        the next call with the same SQL returns the same object.
+
+        :param command: The SQL command.
+        :raises IOError: If the command can't be prepared.
+        :return: The statement, ready to be bound.
+        """
+        db = self.connection()
+        statements = self._statements[db.connectionName()]
+
+        statement = statements.get(command)
+        if statement is not None:
+            statements.move_to_end(command)
+            with self._lock:
+                self._stats['statement_hits'] += 1
+            log.count('database.statement_hits')
+            return statement
+
+        statement = QtSql.QSqlQuery(db)
+        statement.setForwardOnly(True)
+        if not statement.prepare(command):
+            raise IOError(f'Unable to prepare the command "{command}". '
+                          f'Reason: {statement.lastError().text()}.')
+
+        statements[command] = statement
+        evicted = 0
+        while len(statements) > max(self.statement_cache_size, 1):
+            statements.popitem(last=False)[1].finish()
+            evicted += 1
+
+        with self._lock:
+            self._stats['statement_misses'] += 1
+            self._stats['statement_evictions'] += evicted
+        log.count('database.statement_misses')
+
+        return statement
+
+    def count_query(self):
+        with self._lock:
+            self._stats['queries'] += 1
+
+    def statistics(self) -> Dict[str, float]:
+        """ Returns how many connections were opened and queries were run.
+
+        :return: The counters, the connections currently open and the rates
+                 per second since the counters were last reset.
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats['open_connections'] = len(self._names)
+            stats['cached_statements'] = sum(
+                len(statements) for statements in self._statements.values()
+            )
+
+        elapsed = max(time.perf_counter() - stats.pop('since'), 1e-9)
+        stats['opens_per_second'] = stats['opens'] / elapsed
+        stats['queries_per_second'] = stats['queries'] / elapsed
+
+        return stats
+
+    def reset_statistics(self):
+        """Sets all the statistics counters back to zero."""
+        self._stats = {'opens': 0, 'queries': 0, 'statement_hits': 0,
+                       'statement_misses': 0, 'statement_evictions': 0,
+                       'since': time.perf_counter()}
+
+
+class _Token:
+    """Lives in the thread-local storage, to notice when a thread ends."""
+
+
+def _apply_pragmas(db: QtSql.QSqlDatabase):
+    q = QtSql.QSqlQuery(db)
+    for pragma, value in DB_PRAGMAS.items():
+        if not q.exec(f'PRAGMA {pragma} = {value}'):
+            log.logger.warning(f'Unable to set PRAGMA {pragma} to {value}. '
+                               f'Reason: {q.lastError().text()}.')
+
+
+class _BackgroundWriter:
+    """Runs queued writes on a single thread.
+
+    Whatever is waiting in the queue when the thread gets to it is committed
+    in one transaction, so many small writes share a single sync to disk. If
+    that transaction fails, its writes are retried one by one, so that only
+    the faulty ones fail.
+    """
+
+    def __init__(self, max_batch: int = _MAX_WRITE_BATCH):
+        self.max_batch = max_batch
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stats = {}
+        self.reset_statistics()
+
+    def submit(self, func: Callable, *args, **kwargs) -> Future:
+        """ Queues a function that writes to the database.
+
+        :param func: The function, run on the writer thread.
+        :return: A future with the result of the function.
+        """
+        future = Future()
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name='spielpendium-db-writer',
+                    daemon=True
+                )
+                self._thread.start()
+
+            self._queue.put((future, func, args, kwargs))
+            self._stats['writes'] += 1
+
+        return future
+
+    def flush(self, timeout: float = None) -> bool:
+        """ Waits until everything queued so far is written.
+
+        :param timeout: The most seconds to wait, or None to wait for as
+               long as it takes.
+        :return: True if everything was written, False if it timed out.
+        """
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                return True
+
+        try:
+            self.submit(lambda: None).result(timeout)
+        except FutureTimeoutError:
+            return False
+
+        return True
+
+    def stop(self, timeout: float = None):
+        """Writes whatever is queued and stops the writer thread."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+            if thread is None:
+                return
+            self._queue.put(None)
+
+        thread.join(timeout)
+
+    def _run(self):
+        while True:
+            jobs = [self._queue.get()]
+            while jobs[-1] is not None and len(jobs) < self.max_batch:
+                try:
+                    jobs.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            stop = jobs[-1] is None
+            if stop:
+                jobs.pop()
+
+            self._write(jobs)
+
+            if stop:
+                _connections.close()
+                return
+
+    def _write(self, jobs: List[Tuple]):
+        jobs = [job for job in jobs if job[0].set_running_or_notify_cancel()]
+        if not jobs:
+            return
+
+        try:
+            with transaction():
+                results = [func(*args, **kwargs)
+                           for _, func, args, kwargs in jobs]
+        except Exception as err:
+            if len(jobs) == 1:
+                self._fail(jobs[0][0], err)
+                return
+
+            log.logger.debug('A batch of %d writes failed. Retrying them '
+                             'one at a time.', len(jobs))
+            for future, func, args, kwargs in jobs:
+                try:
+                    with transaction():
+                        result = func(*args, **kwargs)
+                except Exception as job_err:
+                    self._fail(future, job_err)
+                else:
+                    future.set_result(result)
+            return
+        finally:
+            with self._lock:
+                self._stats['batches'] += 1
+
+        for (future, *_), result in zip(jobs, results):
+            future.set_result(result)
+
+    @staticmethod
+    def _fail(future: Future, err: Exception):
+        log.logger.warning(f'Queued database write failed. {err}')
+        future.set_exception(err)
+
+    def statistics(self) -> Dict[str, int]:
+        """Returns how many writes were queued, and in how many transactions
+        they were written."""
+        with self._lock:
+            return {'queued_writes': self._stats['writes'],
+                    'write_batches': self._stats['batches'],
+                    'pending_writes': self._queue.qsize()}
+
+    def reset_statistics(self):
+        """Sets the statistics counters back to zero."""
+        self._stats = {'writes': 0, 'batches': 0}
+
+
+_connections = _ConnectionManager()
+# The other threads close their own connections as they end
+atexit.register(_connections.close)
+
+_writer = _BackgroundWriter()
+# Registered last, so that it runs before the connections are closed
+atexit.register(_writer.stop)
+
+
+def connection() -> QtSql.QSqlDatabase:
+    """Returns the database connection of the current thread, opening it if
+    needed.
+
+    :raises IOError: If the database can't be opened.
+    :return: The connection.
+    """
+    return _connections.connection()
 
 
 def connect() -> bool:
-    """Open the database file connection.
+    """Open the database connection of the current thread.
+
+    Calling this is optional. The connection is opened the first time it's
+    needed anyway.
 
     :return: True if the connection to the database was established,
         False otherwise
     """
-    db = QtSql.QSqlDatabase.database()
-    if not db.isValid():
-        db = QtSql.QSqlDatabase.addDatabase('QSQLITE')
-        db.setDatabaseName(str(DB_FILE))
+    try:
+        return _connections.connection().isOpen()
+    except IOError as err:
+        log.logger.error(str(err))
+        return False
+
 
-    DB_DIR.mkdir(exist_ok=True)
+def disconnect():
+    """Close the database connection of the current thread."""
+    _connections.close()
 
-    return db.open()
 
+def close_all():
+    """Close the database connections of all threads, e.g. before the
+    database file is moved or deleted.
 
-def disconnect():
-    """Close the database file connection."""
+    The queued writes are written first, and the writer thread closes its
+    connection as it stops. Connections can only be closed by their own
+    thread, so any other thread closes its connection the next time it uses
+    the database, or when it ends.
+    """
+    _writer.stop()
+    _connections.close_all()
+
+
+def statistics() -> Dict[str, float]:
+    """Returns how many connections were opened, queries were run and writes
+    were queued.
+
+    :return: The statistics.
+    """
+    return {**_connections.statistics(), **_writer.statistics()}
+
+
+def reset_statistics():
+    """Sets the connection and writer statistics back to zero."""
+    _connections.reset_statistics()
+    _writer.reset_statistics()
+
+
+def settings() -> Dict[str, Any]:
+    """ Returns the SQLite settings of the current thread's connection.
+
+    :return: The current value of every PRAGMA in DB_PRAGMAS.
+    """
+    q = QtSql.QSqlQuery(connection())
+    values = {}
+    for pragma in DB_PRAGMAS:
+        if q.exec(f'PRAGMA {pragma}') and q.next():
+            values[pragma] = _column_value(q, 0)
+
+    return values
+
+
+def queue_write(func: Callable, *args, **kwargs) -> Future:
+    """ Runs a function that writes to the database on the writer thread.
+
+    Writes are run in the order they were queued. The ones queued together
+    are committed in a single transaction, so the function shouldn't commit
+    or roll back itself. Failures are logged, and set on the future.
+
+    :param func: The function, called with the rest of the arguments.
+    :return: A future with the result of the function.
+    """
+    return _writer.submit(func, *args, **kwargs)
+
+
+def queue_query(command: str, params: List = None) -> Future:
+    """ Runs a query on the writer thread, see queue_write.
+
+    :param command: The SQL command.
+    :param params: The parameters of the command.
+    :return: A future with the result of the query.
+    """
+    return _writer.submit(query, command, params)
+
+
+def queue_execute_many(command: str, rows: Iterable[Sequence]) -> Future:
+    """ Runs execute_many on the writer thread, see queue_write.
+
+    :param command: The statement, with one '?' per column.
+    :param rows: The parameters of each run of the statement.
+    :return: A future with the number of rows written.
+    """
+    return _writer.submit(execute_many, command, list(rows))
 
-    db = QtSql.QSqlDatabase.database()
-    db.close()
 
-    del db
+def flush_writes(timeout: float = None) -> bool:
+    """ Waits until every queued write so far is committed.
 
-    QtSql.QSqlDatabase.removeDatabase(
-        QtSql.QSqlDatabase.database().connectionName()
-    )
+    :param timeout: The most seconds to wait, or None to wait for as long as
+           it takes.
+    :return: True if everything was written, False if it timed out.
+    """
+    return _writer.flush(timeout)
 
 
 def database_connection(func):
+    """Makes sure the current thread has an open connection before running
+    the function."""
 
     @functools.wraps(func)
     def wrapper(*args, **kwargs):
-        connect()
-        ret = func(*args, **kwargs)
-        disconnect()
+        _connections.connection()
+        return func(*args, **kwargs)
 
-        return ret
     return wrapper
 
 
-def create() -> Any:
-    return query_batch(SQLScripts.create_database)
+def create() -> List[int]:
+    """ Creates the database, or brings an existing one up to date.
+
+    Nothing is dropped, so the cached collections, searches and images are
+    kept, also in databases made before there were versions. If the database
+    is up to date, only its version is read.
+
+    :raises IOError: If a migration fails.
+    :return: The versions of the migrations applied. Empty if nothing had to
+             change.
+    """
+    return migrate()
+
+
+@log.log(log.logger)
+def schema_version() -> int:
+    """ Returns the version of the schema of the database.
+
+    :return: The version of the last migration applied, 0 for a new
+             database or one made before there were versions.
+    """
+    if not query(SQLScripts.schema_version_exists)[0]:
+        return 0
+    return query(SQLScripts.get_schema_version)[0] or 0
+
+
+@log.log(log.logger)
+def migrate(migrations: Sequence[Migration] = None) -> List[int]:
+    """ Applies the migrations the database is missing, in order.
+
+    Each migration runs in a transaction of its own, along with the update
+    of the schema version. The data is migrated in place by the scripts
+    themselves. When the database is up to date this only reads the
+    version.
+
+    :param migrations: The migrations, SQLScripts.migrations if None.
+    :raises IOError: If a migration fails. The database is left at the
+            version of the last migration that succeeded.
+    :return: The versions applied.
+    """
+    if migrations is None:
+        migrations = SQLScripts.migrations
+
+    version = schema_version()
+    pending = [migration for migration in migrations
+               if migration.version > version]
+
+    for migration in pending:
+        log.logger.info(f'Migrating the database to version '
+                        f'{migration.version} ({migration.name}).')
+        with transaction():
+            if not all(query_batch(migration.commands)):
+                raise IOError(f'Unable to apply the migration '
+                              f'{migration.version} ({migration.name}).')
+            query(SQLScripts.save_schema_version,
+                  [migration.version, migration.name])
+
+    return [migration.version for migration in pending]
 
 
 @log.log(log.logger)
@@ -65,47 +597,77 @@ def query(command: str, params: List = None) -> Any:
         params = []
 
     log.logger.debug('Preparing query for execution.')
-    q = QtSql.QSqlQuery()
+    q = _connections.prepared(command)
+    _connections.count_query()
 
-    q.prepare(command)
-
-    for param in params:
-        q.addBindValue(param)
+    for ii, param in enumerate(params):
+        q.bindValue(ii, _bind_value(param))
 
     log.logger.debug('Executing the query.')
     success = q.exec()
 
     if not success:
+        error = q.lastError().text()
+        q.finish()
         raise IOError(f'Unable to execute the command "{command}" '
                       f'with the parameters "{params}". '
-                      f'Reason: {q.lastError().text()}.')
+                      f'Reason: {error}.')
 
     if q.isSelect():
         ret = []
 
         log.logger.debug('Getting selected data.')
+        num_columns = q.record().count()
         while q.next():
-            for ii in range(len(params)):
-                ret.append(q.value(ii))
+            for ii in range(num_columns):
+                ret.append(_column_value(q, ii))
 
+        # Resets the statement, so it's ready to be run again
+        q.finish()
         return ret
     else:
+        q.finish()
         return success
 
 
+def _bind_value(value: Any) -> Any:
+    # Raw bytes have to be wrapped to be stored as a BLOB
+    if isinstance(value, bytes):
+        return QtCore.QByteArray(value)
+    return value
+
+
+def _column_value(q: QtSql.QSqlQuery, column: int) -> Any:
+    """Converts the value in a column of the current row to a Python object.
+
+    :param q: The query positioned on a valid row.
+    :param column: The column number.
+    :return: None for NULL values, bytes for BLOBs, otherwise the value.
+    """
+    if q.isNull(column):
+        return None
+
+    value = q.value(column)
+    if isinstance(value, QtCore.QByteArray):
+        return bytes(value)
+
+    return value
+
+
 @log.log(log.logger)
 @database_connection
 def query_batch(commands: tuple) -> list:
-    log.logger.debug(f'Number of commands in batch: {len(commands)}')
-    q = QtSql.QSqlQuery()
+    log.logger.debug('Number of commands in batch: %d', len(commands))
+    q = QtSql.QSqlQuery(connection())
 
     successes = [True for _ in range(len(commands))]
 
     for ii, command in enumerate(commands):
         if command.strip() != '':
-            log.logger.debug(f'Running query {ii+1} of {len(commands)}:\n'
-                             f'{command.strip()}')
+            log.logger.debug('Running query %d of %d:\n%s', ii + 1,
+                             len(commands), command)
 
+            _connections.count_query()
             if not q.exec(command):
                 successes[ii] = False
                 log.logger.error(f'Command could not be run:\n    {command}. '
@@ -116,6 +678,85 @@ def query_batch(commands: tuple) -> list:
     return successes
 
 
+@contextlib.contextmanager
+def transaction():
+    """ Runs the queries of a with block in a single transaction.
+
+    The transaction is committed when the block ends and rolled back if it
+    raises. Nested blocks join the outermost transaction.
+
+    :raises IOError: If the transaction can't be started or committed.
+    """
+    db = connection()
+    depth = _connections.transaction_depth
+    if depth == 0 and not db.transaction():
+        raise IOError(f'Unable to start a transaction. '
+                      f'Reason: {db.lastError().text()}.')
+
+    _connections.transaction_depth = depth + 1
+    try:
+        yield db
+    except BaseException:
+        _connections.transaction_depth = depth
+        if depth == 0:
+            db.rollback()
+            log.logger.warning('Transaction rolled back.')
+        raise
+
+    _connections.transaction_depth = depth
+    if depth == 0 and not db.commit():
+        error = db.lastError().text()
+        db.rollback()
+        raise IOError(f'Unable to commit the transaction. Reason: {error}.')
+
+
+@log.log(log.logger)
+@database_connection
+def execute_many(command: str, rows: Iterable[Sequence]) -> int:
+    """ Runs a statement once for every row of parameters, in a single
+    transaction.
+
+    The parameters are bound column by column and run with execBatch, which
+    is much faster than calling query once per row.
+
+    :param command: The statement, with one '?' per column.
+    :param rows: The parameters of each run of the statement.
+    :raises IOError: If the statement fails. Nothing is written in that case.
+    :return: The number of rows the statement was run for.
+    """
+    rows = list(rows)
+    if not rows:
+        return 0
+
+    q = _connections.prepared(command)
+    for ii, column in enumerate(zip(*rows)):
+        q.bindValue(ii, [_bind_value(value) for value in column])
+
+    with transaction():
+        _connections.count_query()
+        success = q.execBatch()
+        error = q.lastError().text()
+        q.finish()
+        if not success:
+            raise IOError(f'Unable to execute the command "{command}" '
+                          f'for {len(rows)} rows. Reason: {error}.')
+
+    log.logger.debug('Ran a batch of %d rows.', len(rows))
+    log.count('database.rows_written', len(rows))
+    return len(rows)
+
+
+def bulk_write(batches: Iterable[Tuple[str, Iterable[Sequence]]]) -> int:
+    """ Runs several batches of rows in one transaction.
+
+    :param batches: (statement, rows) pairs, run in order with execute_many.
+    :raises IOError: If any statement fails. Nothing is written in that case.
+    :return: The total number of rows written.
+    """
+    with transaction():
+        return sum(execute_many(command, rows) for command, rows in batches)
+
+
 if __name__ == '__main__':
     my_successes = create()
     print(my_successes)
@@ -1 +1 @@
-from ._script_reader import SQLScripts
+from ._script_reader import SQLScripts, split_statements, Migration
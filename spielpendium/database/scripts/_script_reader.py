@@ -2,59 +2,144 @@
 import glob
 import os
 import pathlib
+import sqlite3
+from typing import List, NamedTuple, Tuple
 
 from spielpendium import log
 
 __author__ = 'Eduardo Ruiz'
 
-__all__ = ['SQLScripts']
+__all__ = ['SQLScripts', 'split_statements', 'Migration']
+
+# Migrations are named like 0001_description.sql
+_MIGRATIONS_DIR = 'migrations'
+
+
+def split_statements(sql: str) -> List[str]:
+    """ Splits a script into its SQL statements.
+
+    A ';' only ends a statement if it's not inside a string, a comment or the
+    BEGIN...END body of a trigger. SQLite's own parser is the judge of that.
+
+    :param sql: The script.
+    :return: The statements, without their final ';'.
+    """
+    statements = []
+    statement = ''
+    for piece in sql.split(';'):
+        statement += piece
+        if sqlite3.complete_statement(statement + ';'):
+            if statement.strip() != '':
+                statements.append(statement)
+            statement = ''
+        else:
+            statement += ';'
+
+    # Whatever is left has no final ';'
+    if statement.strip(' \t\r\n;') != '':
+        statements.append(statement.rstrip(';'))
+
+    return statements
+
+
+class Migration(NamedTuple):
+    """A step from one version of the database schema to the next."""
+    version: int
+    name: str
+    commands: Tuple[str, ...]
+
+
+def _read_migrations(directory) -> Tuple[Migration, ...]:
+    migrations = []
+    for script_file in glob.glob(f'{directory}{os.sep}*.sql'):
+        script_name = os.path.splitext(os.path.basename(script_file))[0]
+        version, _, name = script_name.partition('_')
+
+        with open(script_file, 'r') as file:
+            migrations.append(Migration(int(version), name,
+                                        tuple(split_statements(file.read()))))
+
+    migrations.sort()
+    versions = [migration.version for migration in migrations]
+    if versions != list(range(1, len(versions) + 1)):
+        raise ValueError(f'The migrations in {directory} are not numbered '
+                         f'1 to {len(versions)}: {versions}.')
+
+    return tuple(migrations)
 
 
 class _SQLScriptReader:
+    """Reads each script the first time it's used, rather than all of them
+    at import time."""
 
     def __init__(self, directory):
-        file_list = glob.glob(f'{directory}{os.sep}*.sql')
+        self._directory = pathlib.Path(directory)
         self._script_dict = {}
+        self._all_read = False
+        self._migrations = None
+
+    def _read(self, script_name):
+        if script_name not in self._script_dict:
+            script_file = self._directory / f'{script_name}.sql'
+            if not script_file.is_file():
+                return None
 
-        for script_file in file_list:
             # Open and read the file
-            log.logger.debug(f'Reading SQL file: '
-                             f'{os.path.basename(script_file)}')
+            log.logger.debug('Reading SQL file: %s', script_file.name)
             with open(script_file, 'r') as file:
                 sql = file.read()
 
-            log.logger.debug('Successfully read SQL file.')
-
-            # Separate all SQL commands by splitting on ';'
-            sql_commands = tuple([x for x in sql.split(';')
-                                  if x.strip() != ''])
+            # Separate all SQL commands
+            sql_commands = tuple(split_statements(sql))
             if len(sql_commands) == 1:
                 sql_commands = sql_commands[0]
 
-            script_name = os.path.splitext(os.path.basename(script_file))[0]
             self._script_dict[script_name] = sql_commands
 
+        return self._script_dict[script_name]
+
+    def _read_all(self):
+        if not self._all_read:
+            for script_file in sorted(glob.glob(f'{self._directory}{os.sep}'
+                                                f'*.sql')):
+                self._read(os.path.splitext(os.path.basename(script_file))[0])
+            self._all_read = True
+
+        return self._script_dict
+
+    @property
+    def migrations(self):
+        """The schema changes, in the order they are applied."""
+        if self._migrations is None:
+            self._migrations = _read_migrations(
+                self._directory / _MIGRATIONS_DIR
+            )
+        return self._migrations
+
     def __str__(self):
         keys = [f"'{x}'" for x in self.keys()]
         return f'SQLScripts([{", ".join(keys)}])'
 
     def __getattr__(self, item):
-        if item in self._script_dict.keys():
-            script = self._script_dict[item]
+        script = None if item.startswith('_') else self._read(item)
+        if script is not None:
             return script
         elif item in ['all', 'all_scripts']:
-            return self._script_dict
+            return self._read_all()
         else:
             raise AttributeError(f'{item} is a nonexistent script.')
 
     def __getitem__(self, item):
-        return self._script_dict[item]
+        script = self._read(item)
+        if script is None:
+            raise KeyError(item)
+        return script
 
     def keys(self):
-        return _SQLScriptKeys(self._script_dict.keys())
+        return _SQLScriptKeys(self._read_all().keys())
 
     def commands(self):
-        return list(self._script_dict.values())
+        return list(self._read_all().values())
 
     def items(self):
         return zip(self.keys(), self.commands())
@@ -66,7 +151,7 @@ class _SQLScriptReader:
         return [(k, v) for k, v in self.items()]
 
     def __len__(self):
-        return len(self._script_dict)
+        return len(self._read_all())
 
 
 class _SQLScriptKeys:
@@ -88,9 +173,10 @@ class _SQLScriptKeys:
 SQLScripts = _SQLScriptReader(pathlib.Path(__file__).parent.absolute())
 
 if __name__ == '__main__':
-    print(SQLScripts.create_database)
+    print(SQLScripts.schema_version_exists)
     print(SQLScripts.keys())
-    print(SQLScripts['create_database'])
+    print(SQLScripts['schema_version_exists'])
+    print(SQLScripts.migrations)
 
     print(SQLScripts[SQLScripts.keys()[0]])
 
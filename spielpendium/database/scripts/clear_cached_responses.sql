@@ -0,0 +1 @@
+DELETE FROM Http_Cache;
\ No newline at end of file
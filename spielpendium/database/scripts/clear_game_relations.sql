@@ -0,0 +1,8 @@
+DELETE FROM Author_Game
+WHERE game_id IN (SELECT value FROM json_each(?));
+DELETE FROM Artist_Game
+WHERE game_id IN (SELECT value FROM json_each(?));
+DELETE FROM Games_Categories
+WHERE game_id IN (SELECT value FROM json_each(?));
+DELETE FROM Game_Publishers
+WHERE game_id IN (SELECT value FROM json_each(?));
\ No newline at end of file
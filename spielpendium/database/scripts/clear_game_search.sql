@@ -0,0 +1,2 @@
+DELETE FROM Games_Search
+WHERE rowid IN (SELECT value FROM json_each(?));
\ No newline at end of file
@@ -0,0 +1,2 @@
+DELETE FROM Game_Summaries
+WHERE game_id IN (SELECT value FROM json_each(?));
\ No newline at end of file
@@ -0,0 +1,2 @@
+DELETE FROM Search_Results
+WHERE search_id NOT IN (SELECT id FROM Searches);
\ No newline at end of file
@@ -0,0 +1,5 @@
+SELECT gc.game_id
+FROM Categories c
+    JOIN Games_Categories gc ON gc.category_id = c.id
+WHERE c.name = ?
+ORDER BY gc.game_id;
\ No newline at end of file
@@ -0,0 +1,4 @@
+SELECT id
+FROM Games
+WHERE name = ? COLLATE NOCASE
+ORDER BY id;
\ No newline at end of file
@@ -0,0 +1,3 @@
+SELECT id
+FROM Games
+WHERE min_players <= ? AND max_players >= ?;
\ No newline at end of file
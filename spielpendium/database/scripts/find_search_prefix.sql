@@ -0,0 +1,6 @@
+SELECT query
+FROM Searches
+WHERE query = substr(?, 1, length(query))
+    AND date_time >= strftime('%Y-%m-%dT%H:%M:%S', 'now', ?)
+ORDER BY length(query) DESC
+LIMIT 1;
\ No newline at end of file
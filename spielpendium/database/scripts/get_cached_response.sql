@@ -0,0 +1,3 @@
+SELECT endpoint, encoding, body, etag, last_modified, fetched_at
+FROM Http_Cache
+WHERE url=?;
\ No newline at end of file
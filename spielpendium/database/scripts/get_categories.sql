@@ -0,0 +1,3 @@
+SELECT id, name
+FROM Categories
+WHERE name IN (SELECT value FROM json_each(?));
\ No newline at end of file
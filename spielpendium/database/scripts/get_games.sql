@@ -0,0 +1,9 @@
+SELECT g.id, g.name, g.sub_name, g.version, g.image, g.description,
+       g.release_year, g.min_players, g.max_players, g.recommended_players,
+       g.min_age, g.min_play_time, g.max_play_time, g.bgg_rating,
+       g.bgg_rank, g.complexity, g.related_games, g.player_poll,
+       s.authors, s.artists, s.categories, s.publishers
+FROM Games g
+    LEFT JOIN Game_Summaries s ON s.game_id = g.id
+WHERE g.id IN (SELECT value FROM json_each(?))
+ORDER BY g.id;
\ No newline at end of file
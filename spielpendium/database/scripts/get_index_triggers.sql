@@ -0,0 +1,4 @@
+SELECT name, sql
+FROM sqlite_master
+WHERE type = 'trigger' AND name LIKE 'Games\_Indexes\_%' ESCAPE '\'
+ORDER BY name;
\ No newline at end of file
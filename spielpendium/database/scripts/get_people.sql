@@ -0,0 +1,3 @@
+SELECT id, name
+FROM People
+WHERE name IN (SELECT value FROM json_each(?));
\ No newline at end of file
@@ -0,0 +1 @@
+SELECT MAX(version) FROM Schema_Version;
\ No newline at end of file
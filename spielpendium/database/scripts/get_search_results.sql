@@ -0,0 +1,5 @@
+SELECT sr.xml
+FROM Searches s
+    JOIN Search_Results sr ON sr.search_id = s.id
+WHERE s.query=?
+ORDER BY sr.position;
\ No newline at end of file
@@ -0,0 +1,2 @@
+SELECT parsed, xml FROM User_Lists
+WHERE username=?;
\ No newline at end of file
@@ -0,0 +1,3 @@
+INSERT INTO Games_Search (rowid, name, description, designers, categories)
+    SELECT * FROM Games_Search_Source
+    WHERE id IN (SELECT value FROM json_each(?));
\ No newline at end of file
@@ -0,0 +1,3 @@
+-- Replaced by Game_Summaries, see 0004_indexes_and_search.sql. It was never
+-- valid, it joins on columns that don't exist.
+DROP VIEW IF EXISTS BGG_Games_View;
\ No newline at end of file
@@ -0,0 +1,111 @@
+-- Brings the tables of version 1 up to date, keeping their rows. Tables
+-- whose columns only gained a default are altered, the others are rebuilt
+-- (create the new table, copy the rows, drop the old one and rename).
+
+-- BGG has publishers that share a name, so names aren't unique
+CREATE TABLE Publishers_New (
+id INTEGER PRIMARY KEY NOT NULL,
+name TEXT NOT NULL);
+
+INSERT INTO Publishers_New (id, name)
+    SELECT id, name FROM Publishers;
+
+DROP TABLE Publishers;
+
+ALTER TABLE Publishers_New RENAME TO Publishers;
+
+-- Collections are stored compressed, along with their parsed form. The XML
+-- of older rows is kept as it is, and parsed again when it's read.
+CREATE TABLE User_Lists_New (
+id INTEGER PRIMARY KEY NOT NULL,
+username TEXT NOT NULL UNIQUE,
+xml BLOB NOT NULL,
+parsed BLOB,
+last_refreshed DATETIME NOT NULL);
+
+INSERT INTO User_Lists_New (id, username, xml, last_refreshed)
+    SELECT id, username, CAST(xml AS BLOB), last_refreshed FROM User_Lists;
+
+DROP TABLE User_Lists;
+
+ALTER TABLE User_Lists_New RENAME TO User_Lists;
+
+-- BGG leaves out what it doesn't know, so most details are optional. The
+-- version is stored as JSON, the related games and player poll are new.
+CREATE TABLE Games_New (
+id INTEGER PRIMARY KEY NOT NULL,
+timestamp DATETIME NOT NULL,
+name TEXT NOT NULL,
+sub_name TEXT,
+version TEXT,
+image BLOB,
+description TEXT,
+publisher_id INTEGER,
+release_year DATE,
+min_players INTEGER,
+max_players INTEGER,
+recommended_players INTEGER,
+min_age INTEGER,
+min_play_time INTEGER,
+max_play_time INTEGER,
+bgg_rating FLOAT,
+bgg_rank INTEGER,
+complexity FLOAT,
+related_games TEXT,
+player_poll BLOB,
+FOREIGN KEY(publisher_id) REFERENCES Publishers(id));
+
+INSERT INTO Games_New
+    (id, timestamp, name, sub_name, version, image, description,
+     publisher_id, release_year, min_players, max_players,
+     recommended_players, min_age, min_play_time, max_play_time,
+     bgg_rating, bgg_rank, complexity)
+    SELECT id, timestamp, name, sub_name,
+           CASE WHEN json_valid(version) THEN version
+                ELSE json_quote(version) END,
+           image, description,
+           publisher_id, release_year, min_players, max_players,
+           recommended_players, min_age, min_play_time, max_play_time,
+           bgg_rating, bgg_rank, complexity
+    FROM Games;
+
+DROP TABLE Games;
+
+ALTER TABLE Games_New RENAME TO Games;
+
+-- The order of the relations, as BGG lists them
+ALTER TABLE Search_Results ADD COLUMN position INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE Games_Categories ADD COLUMN position INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE Author_Game ADD COLUMN position INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE Artist_Game ADD COLUMN position INTEGER NOT NULL DEFAULT 0;
+
+-- A game can have several publishers. The one games had so far is the
+-- first.
+CREATE TABLE Game_Publishers (
+game_id INTEGER NOT NULL,
+publisher_id INTEGER NOT NULL,
+position INTEGER NOT NULL DEFAULT 0,
+PRIMARY KEY (game_id,publisher_id),
+FOREIGN KEY(game_id) REFERENCES Games(id),
+FOREIGN KEY(publisher_id) REFERENCES Publishers(id));
+
+INSERT INTO Game_Publishers (game_id, publisher_id)
+    SELECT id, publisher_id FROM Games WHERE publisher_id IS NOT NULL;
+
+-- Cached responses of the BGG API
+CREATE TABLE Http_Cache (
+url TEXT PRIMARY KEY NOT NULL,
+endpoint TEXT NOT NULL,
+encoding TEXT NOT NULL,
+body BLOB NOT NULL,
+etag TEXT,
+last_modified TEXT,
+fetched_at FLOAT NOT NULL);
+
+-- Prefixes of the names of games, for the typeahead
+CREATE TABLE Game_Names (
+prefix TEXT NOT NULL,
+game_id INTEGER NOT NULL,
+name TEXT NOT NULL,
+year_published INTEGER,
+PRIMARY KEY (prefix,game_id)) WITHOUT ROWID;
\ No newline at end of file
@@ -0,0 +1,239 @@
+-- Indexes for the common lookups, the full-text search over games and the
+-- summaries games are loaded from. Everything is created only if missing,
+-- so this can be run on an existing database.
+
+-- Relations of a game
+CREATE INDEX IF NOT EXISTS Author_Game_game_id ON Author_Game(game_id);
+CREATE INDEX IF NOT EXISTS Artist_Game_game_id ON Artist_Game(game_id);
+CREATE INDEX IF NOT EXISTS Games_Categories_game_id
+    ON Games_Categories(game_id);
+CREATE INDEX IF NOT EXISTS Authors_person_id ON Authors(person_id);
+CREATE INDEX IF NOT EXISTS Artists_person_id ON Artists(person_id);
+CREATE INDEX IF NOT EXISTS Game_Publishers_game_id
+    ON Game_Publishers(game_id);
+
+-- Games by name and by number of players
+CREATE INDEX IF NOT EXISTS Games_name ON Games(name COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS Games_players ON Games(min_players, max_players);
+
+-- Search results and user lists
+CREATE INDEX IF NOT EXISTS Search_Results_search_id
+    ON Search_Results(search_id, position);
+CREATE INDEX IF NOT EXISTS User_List_Games_user_list_id
+    ON User_List_Games(user_List_id);
+CREATE INDEX IF NOT EXISTS User_List_Games_game_id
+    ON User_List_Games(game_id);
+
+-- Full-text search. The rowid of Games_Search is the id of the game.
+CREATE VIRTUAL TABLE IF NOT EXISTS Games_Search USING fts5(
+    name, description, designers, categories,
+    tokenize='unicode61 remove_diacritics 2');
+
+CREATE VIEW IF NOT EXISTS Games_Search_Source AS
+    SELECT g.id,
+           g.name,
+           g.description,
+           (SELECT group_concat(p.name, ', ')
+            FROM Author_Game ag
+                JOIN Authors a ON a.id = ag.author_id
+                JOIN People p ON p.id = a.person_id
+            WHERE ag.game_id = g.id) AS designers,
+           (SELECT group_concat(c.name, ', ')
+            FROM Games_Categories gc
+                JOIN Categories c ON c.id = gc.category_id
+            WHERE gc.game_id = g.id) AS categories
+    FROM Games g;
+
+CREATE TRIGGER IF NOT EXISTS Games_Search_game_inserted
+AFTER INSERT ON Games
+BEGIN
+    INSERT INTO Games_Search (rowid, name, description, designers, categories)
+        SELECT * FROM Games_Search_Source WHERE id = new.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS Games_Search_game_updated
+AFTER UPDATE OF name, description ON Games
+WHEN old.name IS NOT new.name OR old.description IS NOT new.description
+BEGIN
+    DELETE FROM Games_Search WHERE rowid = old.id;
+    INSERT INTO Games_Search (rowid, name, description, designers, categories)
+        SELECT * FROM Games_Search_Source WHERE id = new.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS Games_Search_game_deleted
+AFTER DELETE ON Games
+BEGIN
+    DELETE FROM Games_Search WHERE rowid = old.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS Games_Search_author_added
+AFTER INSERT ON Author_Game
+BEGIN
+    UPDATE Games_Search
+    SET designers = (SELECT designers FROM Games_Search_Source
+                     WHERE id = new.game_id)
+    WHERE rowid = new.game_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS Games_Search_author_removed
+AFTER DELETE ON Author_Game
+BEGIN
+    UPDATE Games_Search
+    SET designers = (SELECT designers FROM Games_Search_Source
+                     WHERE id = old.game_id)
+    WHERE rowid = old.game_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS Games_Search_category_added
+AFTER INSERT ON Games_Categories
+BEGIN
+    UPDATE Games_Search
+    SET categories = (SELECT categories FROM Games_Search_Source
+                      WHERE id = new.game_id)
+    WHERE rowid = new.game_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS Games_Search_category_removed
+AFTER DELETE ON Games_Categories
+BEGIN
+    UPDATE Games_Search
+    SET categories = (SELECT categories FROM Games_Search_Source
+                      WHERE id = old.game_id)
+    WHERE rowid = old.game_id;
+END;
+
+-- Games written before the search table existed
+INSERT INTO Games_Search (rowid, name, description, designers, categories)
+    SELECT * FROM Games_Search_Source
+    WHERE id NOT IN (SELECT rowid FROM Games_Search);
+
+-- One row per game with its authors, artists, categories and publishers, so
+-- games can be loaded without joining every relation. Each list is a JSON
+-- array of [id, name] in the order BGG lists them.
+CREATE TABLE IF NOT EXISTS Game_Summaries (
+game_id INTEGER PRIMARY KEY NOT NULL,
+authors TEXT NOT NULL DEFAULT '[]',
+artists TEXT NOT NULL DEFAULT '[]',
+categories TEXT NOT NULL DEFAULT '[]',
+publishers TEXT NOT NULL DEFAULT '[]',
+FOREIGN KEY(game_id) REFERENCES Games(id));
+
+CREATE VIEW IF NOT EXISTS Game_Summaries_Source AS
+    SELECT g.id AS game_id,
+           (SELECT json_group_array(json_array(id, name))
+            FROM (SELECT p.id, p.name
+                  FROM Author_Game ag
+                      JOIN Authors a ON a.id = ag.author_id
+                      JOIN People p ON p.id = a.person_id
+                  WHERE ag.game_id = g.id
+                  ORDER BY ag.position)) AS authors,
+           (SELECT json_group_array(json_array(id, name))
+            FROM (SELECT p.id, p.name
+                  FROM Artist_Game arg
+                      JOIN Artists a ON a.id = arg.artist_id
+                      JOIN People p ON p.id = a.person_id
+                  WHERE arg.game_id = g.id
+                  ORDER BY arg.position)) AS artists,
+           (SELECT json_group_array(json_array(id, name))
+            FROM (SELECT c.id, c.name
+                  FROM Games_Categories gc
+                      JOIN Categories c ON c.id = gc.category_id
+                  WHERE gc.game_id = g.id
+                  ORDER BY gc.position)) AS categories,
+           (SELECT json_group_array(json_array(id, name))
+            FROM (SELECT pub.id, pub.name
+                  FROM Game_Publishers gp
+                      JOIN Publishers pub ON pub.id = gp.publisher_id
+                  WHERE gp.game_id = g.id
+                  ORDER BY gp.position)) AS publishers
+    FROM Games g;
+
+CREATE TRIGGER IF NOT EXISTS Game_Summaries_game_inserted
+AFTER INSERT ON Games
+BEGIN
+    INSERT OR REPLACE INTO Game_Summaries
+        SELECT * FROM Game_Summaries_Source WHERE game_id = new.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS Game_Summaries_game_deleted
+AFTER DELETE ON Games
+BEGIN
+    DELETE FROM Game_Summaries WHERE game_id = old.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS Game_Summaries_author_added
+AFTER INSERT ON Author_Game
+BEGIN
+    UPDATE Game_Summaries
+    SET authors = (SELECT authors FROM Game_Summaries_Source
+                   WHERE game_id = new.game_id)
+    WHERE game_id = new.game_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS Game_Summaries_author_removed
+AFTER DELETE ON Author_Game
+BEGIN
+    UPDATE Game_Summaries
+    SET authors = (SELECT authors FROM Game_Summaries_Source
+                   WHERE game_id = old.game_id)
+    WHERE game_id = old.game_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS Game_Summaries_artist_added
+AFTER INSERT ON Artist_Game
+BEGIN
+    UPDATE Game_Summaries
+    SET artists = (SELECT artists FROM Game_Summaries_Source
+                   WHERE game_id = new.game_id)
+    WHERE game_id = new.game_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS Game_Summaries_artist_removed
+AFTER DELETE ON Artist_Game
+BEGIN
+    UPDATE Game_Summaries
+    SET artists = (SELECT artists FROM Game_Summaries_Source
+                   WHERE game_id = old.game_id)
+    WHERE game_id = old.game_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS Game_Summaries_category_added
+AFTER INSERT ON Games_Categories
+BEGIN
+    UPDATE Game_Summaries
+    SET categories = (SELECT categories FROM Game_Summaries_Source
+                      WHERE game_id = new.game_id)
+    WHERE game_id = new.game_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS Game_Summaries_category_removed
+AFTER DELETE ON Games_Categories
+BEGIN
+    UPDATE Game_Summaries
+    SET categories = (SELECT categories FROM Game_Summaries_Source
+                      WHERE game_id = old.game_id)
+    WHERE game_id = old.game_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS Game_Summaries_publisher_added
+AFTER INSERT ON Game_Publishers
+BEGIN
+    UPDATE Game_Summaries
+    SET publishers = (SELECT publishers FROM Game_Summaries_Source
+                      WHERE game_id = new.game_id)
+    WHERE game_id = new.game_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS Game_Summaries_publisher_removed
+AFTER DELETE ON Game_Publishers
+BEGIN
+    UPDATE Game_Summaries
+    SET publishers = (SELECT publishers FROM Game_Summaries_Source
+                      WHERE game_id = old.game_id)
+    WHERE game_id = old.game_id;
+END;
+
+-- Games written before there were summaries
+INSERT INTO Game_Summaries
+    SELECT * FROM Game_Summaries_Source
+    WHERE game_id NOT IN (SELECT game_id FROM Game_Summaries);
\ No newline at end of file
@@ -0,0 +1,21 @@
+-- The search table and the summaries are rebuilt by write_games, once for
+-- all the games it writes. The triggers did it again for every game and
+-- every link, which made writing a collection several times slower. Only
+-- the ones for deleted games are kept, write_games never fires them.
+
+DROP TRIGGER IF EXISTS Games_Search_game_inserted;
+DROP TRIGGER IF EXISTS Games_Search_game_updated;
+DROP TRIGGER IF EXISTS Games_Search_author_added;
+DROP TRIGGER IF EXISTS Games_Search_author_removed;
+DROP TRIGGER IF EXISTS Games_Search_category_added;
+DROP TRIGGER IF EXISTS Games_Search_category_removed;
+
+DROP TRIGGER IF EXISTS Game_Summaries_game_inserted;
+DROP TRIGGER IF EXISTS Game_Summaries_author_added;
+DROP TRIGGER IF EXISTS Game_Summaries_author_removed;
+DROP TRIGGER IF EXISTS Game_Summaries_artist_added;
+DROP TRIGGER IF EXISTS Game_Summaries_artist_removed;
+DROP TRIGGER IF EXISTS Game_Summaries_category_added;
+DROP TRIGGER IF EXISTS Game_Summaries_category_removed;
+DROP TRIGGER IF EXISTS Game_Summaries_publisher_added;
+DROP TRIGGER IF EXISTS Game_Summaries_publisher_removed;
\ No newline at end of file
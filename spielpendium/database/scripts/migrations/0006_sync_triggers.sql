@@ -0,0 +1,115 @@
+-- Brings back the triggers that keep the search table and the summaries in
+-- sync with Games and its relations, so every write keeps them current.
+-- There's one trigger per table and change, which updates both.
+--
+-- write_games drops them in its transaction and creates them again before
+-- it commits, so other connections always see them. It rebuilds the search
+-- table and summaries of all the games it wrote at once instead, rather
+-- than once per game and link. So their names have to start with
+-- Games_Indexes_.
+
+CREATE TRIGGER IF NOT EXISTS Games_Indexes_game_inserted
+AFTER INSERT ON Games
+BEGIN
+    INSERT INTO Games_Search (rowid, name, description, designers, categories)
+        SELECT * FROM Games_Search_Source WHERE id = new.id;
+    INSERT OR REPLACE INTO Game_Summaries
+        SELECT * FROM Game_Summaries_Source WHERE game_id = new.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS Games_Indexes_game_renamed
+AFTER UPDATE OF name, description ON Games
+WHEN old.name IS NOT new.name OR old.description IS NOT new.description
+BEGIN
+    DELETE FROM Games_Search WHERE rowid = old.id;
+    INSERT INTO Games_Search (rowid, name, description, designers, categories)
+        SELECT * FROM Games_Search_Source WHERE id = new.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS Games_Indexes_author_added
+AFTER INSERT ON Author_Game
+BEGIN
+    UPDATE Games_Search
+    SET designers = (SELECT designers FROM Games_Search_Source
+                     WHERE id = new.game_id)
+    WHERE rowid = new.game_id;
+    UPDATE Game_Summaries
+    SET authors = (SELECT authors FROM Game_Summaries_Source
+                   WHERE game_id = new.game_id)
+    WHERE game_id = new.game_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS Games_Indexes_author_removed
+AFTER DELETE ON Author_Game
+BEGIN
+    UPDATE Games_Search
+    SET designers = (SELECT designers FROM Games_Search_Source
+                     WHERE id = old.game_id)
+    WHERE rowid = old.game_id;
+    UPDATE Game_Summaries
+    SET authors = (SELECT authors FROM Game_Summaries_Source
+                   WHERE game_id = old.game_id)
+    WHERE game_id = old.game_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS Games_Indexes_category_added
+AFTER INSERT ON Games_Categories
+BEGIN
+    UPDATE Games_Search
+    SET categories = (SELECT categories FROM Games_Search_Source
+                      WHERE id = new.game_id)
+    WHERE rowid = new.game_id;
+    UPDATE Game_Summaries
+    SET categories = (SELECT categories FROM Game_Summaries_Source
+                      WHERE game_id = new.game_id)
+    WHERE game_id = new.game_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS Games_Indexes_category_removed
+AFTER DELETE ON Games_Categories
+BEGIN
+    UPDATE Games_Search
+    SET categories = (SELECT categories FROM Games_Search_Source
+                      WHERE id = old.game_id)
+    WHERE rowid = old.game_id;
+    UPDATE Game_Summaries
+    SET categories = (SELECT categories FROM Game_Summaries_Source
+                      WHERE game_id = old.game_id)
+    WHERE game_id = old.game_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS Games_Indexes_artist_added
+AFTER INSERT ON Artist_Game
+BEGIN
+    UPDATE Game_Summaries
+    SET artists = (SELECT artists FROM Game_Summaries_Source
+                   WHERE game_id = new.game_id)
+    WHERE game_id = new.game_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS Games_Indexes_artist_removed
+AFTER DELETE ON Artist_Game
+BEGIN
+    UPDATE Game_Summaries
+    SET artists = (SELECT artists FROM Game_Summaries_Source
+                   WHERE game_id = old.game_id)
+    WHERE game_id = old.game_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS Games_Indexes_publisher_added
+AFTER INSERT ON Game_Publishers
+BEGIN
+    UPDATE Game_Summaries
+    SET publishers = (SELECT publishers FROM Game_Summaries_Source
+                      WHERE game_id = new.game_id)
+    WHERE game_id = new.game_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS Games_Indexes_publisher_removed
+AFTER DELETE ON Game_Publishers
+BEGIN
+    UPDATE Game_Summaries
+    SET publishers = (SELECT publishers FROM Game_Summaries_Source
+                      WHERE game_id = old.game_id)
+    WHERE game_id = old.game_id;
+END;
\ No newline at end of file
@@ -0,0 +1,3 @@
+UPDATE Http_Cache
+SET fetched_at=?
+WHERE url=?;
\ No newline at end of file
@@ -0,0 +1,3 @@
+INSERT OR REPLACE INTO Game_Summaries
+    SELECT * FROM Game_Summaries_Source
+    WHERE game_id IN (SELECT value FROM json_each(?));
\ No newline at end of file
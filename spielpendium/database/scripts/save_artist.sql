@@ -0,0 +1 @@
+INSERT OR IGNORE INTO Artists (id, person_id) VALUES(?, ?);
\ No newline at end of file
@@ -0,0 +1,3 @@
+INSERT OR REPLACE INTO Http_Cache
+    (url, endpoint, encoding, body, etag, last_modified, fetched_at)
+    VALUES(?, ?, ?, ?, ?, ?, ?);
\ No newline at end of file
@@ -0,0 +1 @@
+INSERT OR IGNORE INTO Categories (name) VALUES(?);
\ No newline at end of file
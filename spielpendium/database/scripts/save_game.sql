@@ -0,0 +1,27 @@
+INSERT INTO Games
+    (id, timestamp, name, sub_name, version, image, description,
+     publisher_id, release_year, min_players, max_players,
+     recommended_players, min_age, min_play_time, max_play_time,
+     bgg_rating, bgg_rank, complexity, related_games, player_poll)
+    VALUES(?, strftime('%Y-%m-%dT%H:%M:%S','now'), ?, ?, ?, ?, ?, ?, ?, ?,
+           ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(id) DO UPDATE SET
+        timestamp=excluded.timestamp,
+        name=excluded.name,
+        sub_name=excluded.sub_name,
+        version=excluded.version,
+        image=excluded.image,
+        description=excluded.description,
+        publisher_id=excluded.publisher_id,
+        release_year=excluded.release_year,
+        min_players=excluded.min_players,
+        max_players=excluded.max_players,
+        recommended_players=excluded.recommended_players,
+        min_age=excluded.min_age,
+        min_play_time=excluded.min_play_time,
+        max_play_time=excluded.max_play_time,
+        bgg_rating=excluded.bgg_rating,
+        bgg_rank=excluded.bgg_rank,
+        complexity=excluded.complexity,
+        related_games=excluded.related_games,
+        player_poll=excluded.player_poll;
\ No newline at end of file
@@ -0,0 +1,2 @@
+INSERT OR IGNORE INTO Author_Game (author_id, game_id, position)
+    VALUES(?, ?, ?);
\ No newline at end of file
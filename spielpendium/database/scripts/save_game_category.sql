@@ -0,0 +1,2 @@
+INSERT OR IGNORE INTO Games_Categories (category_id, game_id, position)
+    VALUES(?, ?, ?);
\ No newline at end of file
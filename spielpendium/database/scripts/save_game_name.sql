@@ -0,0 +1,3 @@
+INSERT OR REPLACE INTO Game_Names
+    (prefix, game_id, name, year_published)
+    VALUES(?, ?, ?, ?);
\ No newline at end of file
@@ -0,0 +1,2 @@
+INSERT OR IGNORE INTO Game_Publishers (publisher_id, game_id, position)
+    VALUES(?, ?, ?);
\ No newline at end of file
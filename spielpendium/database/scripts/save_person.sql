@@ -0,0 +1 @@
+INSERT OR IGNORE INTO People (name) VALUES(?);
\ No newline at end of file
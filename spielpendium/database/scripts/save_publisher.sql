@@ -0,0 +1,2 @@
+INSERT INTO Publishers (id, name) VALUES(?, ?)
+    ON CONFLICT(id) DO UPDATE SET name=excluded.name;
\ No newline at end of file
@@ -0,0 +1,2 @@
+INSERT INTO Schema_Version (version, name, applied_at)
+    VALUES(?, ?, strftime('%Y-%m-%dT%H:%M:%S','now'));
\ No newline at end of file
@@ -0,0 +1,3 @@
+INSERT OR REPLACE INTO Searches
+    (query, date_time)
+    VALUES(?, strftime('%Y-%m-%dT%H:%M:%S','now'));
\ No newline at end of file
@@ -0,0 +1,3 @@
+INSERT OR REPLACE INTO Search_Results
+    (game_id, search_id, position, xml)
+    SELECT ?, id, ?, ? FROM Searches WHERE query=?;
\ No newline at end of file
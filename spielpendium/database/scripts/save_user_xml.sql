@@ -1,3 +1,3 @@
     INSERT OR REPLACE INTO User_Lists
-    (username, xml, last_refreshed)
-    VALUES(?, ?, strftime('%Y-%m-%dT%H:%M:%S','now'));
\ No newline at end of file
+    (username, xml, parsed, last_refreshed)
+    VALUES(?, ?, ?, strftime('%Y-%m-%dT%H:%M:%S','now'));
\ No newline at end of file
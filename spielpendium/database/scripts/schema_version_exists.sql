@@ -0,0 +1,2 @@
+SELECT COUNT(*) FROM sqlite_master
+WHERE type = 'table' AND name = 'Schema_Version';
\ No newline at end of file
@@ -0,0 +1,4 @@
+SELECT COUNT(1)
+FROM Searches
+WHERE query=?
+    AND date_time >= strftime('%Y-%m-%dT%H:%M:%S', 'now', ?);
\ No newline at end of file
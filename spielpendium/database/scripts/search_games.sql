@@ -0,0 +1,5 @@
+SELECT rowid
+FROM Games_Search
+WHERE Games_Search MATCH ?
+ORDER BY rank
+LIMIT ?;
\ No newline at end of file
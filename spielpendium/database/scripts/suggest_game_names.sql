@@ -0,0 +1,6 @@
+SELECT game_id, name, year_published
+FROM Game_Names
+WHERE prefix >= ? AND prefix < ?
+GROUP BY game_id
+ORDER BY min(prefix)
+LIMIT ?;
\ No newline at end of file
@@ -0,0 +1,64 @@
+"""Lazy attributes for packages (PEP 562).
+
+The packages of Spielpendium re-export the public names of their modules.
+Importing all of those modules up front would load PyQt5, pandas,
+xmltodict, etc. as soon as any part of a package is used, so instead each
+module is only imported when one of its names is first looked up.
+"""
+import importlib
+import sys
+import types
+
+__author__ = 'Eduardo Ruiz'
+
+__all__ = ['lazy_attributes']
+
+
+# typing isn't imported, it would take longer than the rest of the package
+def lazy_attributes(package: str, attributes: dict) -> tuple:
+    """ Makes the module __getattr__ and __dir__ of a package.
+
+    Use it in the package's __init__.py:
+
+        __getattr__, __dir__ = lazy_attributes(__name__, {'Games': 'games'})
+
+    :param package: The name of the package.
+    :param attributes: The module (relative to the package) of each name.
+    :return: The __getattr__ and __dir__ functions.
+    """
+    package_module = sys.modules[package]
+
+    class LazyPackage(types.ModuleType):
+
+        def __setattr__(self, name, value):
+            # The import system sets every submodule on its package once
+            # it's loaded. A submodule named like the object it exports
+            # (e.g. response_cache) mustn't replace that object.
+            if isinstance(value, types.ModuleType) \
+                    and value.__name__ == f'{package}.{attributes.get(name)}':
+                value = getattr(value, name, value)
+            super().__setattr__(name, value)
+
+    package_module.__class__ = LazyPackage
+
+    def __getattr__(name: str):
+        if name not in attributes:
+            raise AttributeError(f'module {package!r} has no attribute '
+                                 f'{name!r}')
+
+        module_name = attributes[name]
+        module = importlib.import_module(f'.{module_name}', package)
+
+        # All the names of the module are set at once, so later lookups
+        # don't go through __getattr__
+        for attribute, attribute_module in attributes.items():
+            if attribute_module == module_name:
+                setattr(package_module, attribute,
+                        getattr(module, attribute))
+
+        return getattr(package_module, name)
+
+    def __dir__() -> list:
+        return sorted(set(vars(package_module)) | set(attributes))
+
+    return __getattr__, __dir__
@@ -1,16 +1,74 @@
+import atexit
+import collections
+import functools
 import logging
+import logging.handlers
 import os
-import functools
+import queue
+import reprlib
+import threading
+import time
 
-from spielpendium.constants import (PROGRAM_NAME, LOG_DIR as _LOG_DIR,
-                                    LOG_FILE as _LOG_FILE)
+from spielpendium.constants import (PROGRAM_NAME, LOG_FILE as _LOG_FILE,
+                                    LOG_LEVEL, LOG_MAX_BYTES,
+                                    LOG_BACKUP_COUNT, TRACE_FILE, TRACE_FORMAT)
 
 __author__ = 'Eduardo Ruiz'
 
-__all__ = ['log', 'logger']
+__all__ = ['log', 'logger', 'span', 'count', 'metrics', 'start_tracing',
+           'stop_tracing']
 
 # Define some constants
 _LOG_FORMAT = '[%(asctime)s %(levelname)s] %(message)s'
+_TRACE_FORMATS = ('chrome', 'json')
+# Spans past this many are only counted in the histograms, so that a long
+# session can't use up the memory
+_MAX_TRACE_EVENTS = 1_000_000
+
+
+class _LazyFileHandler(logging.handlers.RotatingFileHandler):
+    """A rotating file handler that only creates the log directory and opens
+    the file when the first record is written, so importing this module
+    doesn't touch the disk."""
+
+    def __init__(self, filename):
+        super().__init__(filename, maxBytes=LOG_MAX_BYTES,
+                         backupCount=LOG_BACKUP_COUNT, delay=True)
+
+    def _open(self):
+        os.makedirs(os.path.dirname(self.baseFilename), exist_ok=True)
+        return super()._open()
+
+
+class _ArgumentRepr(reprlib.Repr):
+    """Size-bounded reprs of the arguments of a failed call.
+
+    Big objects are summarized instead, since just building the full repr of
+    e.g. a DataFrame of games takes longer than the call itself.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.maxstring = 80
+        self.maxother = 80
+
+    def repr_bytes(self, x, level):
+        if len(x) <= self.maxstring:
+            return repr(x)
+        return f'<{len(x)} bytes>'
+
+    def repr_DataFrame(self, x, level):
+        return f'<DataFrame of {x.shape[0]} rows x {x.shape[1]} columns>'
+
+    def repr_Games(self, x, level):
+        return f'<Games with {x.rowCount()} rows>'
+
+
+_arguments = _ArgumentRepr()
+
+# Records are only queued by the threads that log them. The listener's
+# thread writes them to the file, so logging never waits for the disk.
+_queue_handler = logging.handlers.QueueHandler(queue.SimpleQueue())
 
 
 def _create_logger() -> logging.Logger:
@@ -21,18 +79,40 @@ def _create_logger() -> logging.Logger:
     """
     # Set up the logger and set its level
     logger_obj = logging.getLogger(PROGRAM_NAME)
-    logger_obj.setLevel(logging.DEBUG)
+    level = logging.getLevelName(LOG_LEVEL)
+    logger_obj.setLevel(level if isinstance(level, int) else logging.INFO)
+
+    logger_obj.addHandler(_queue_handler)
+    return logger_obj
+
+
+class _ProcessQueue:
+    """A queue between processes, with the methods QueueHandler and
+    QueueListener use. Records are written to the pipe as they're put, so
+    none are lost when a process ends."""
+
+    def __init__(self):
+        # Only imported once the process forks
+        import multiprocessing
+        self._queue = multiprocessing.SimpleQueue()
+
+    def put_nowait(self, item):
+        self._queue.put(item)
+
+    def get(self, block=True):
+        return self._queue.get()
+
 
-    # Configure the path to the log file
-    if not os.path.isdir(_LOG_DIR):
-        os.mkdir(_LOG_DIR)
+# The records of forked processes (e.g. parsing workers) are sent to the
+# process that forked them, so only it writes to the log file. Otherwise each
+# process would rotate the file on its own and records would be lost.
+_forwarded = None
 
-    # If we're debugging, start with a fresh log file each time
-    if os.path.isfile(_LOG_FILE) and logger_obj.level == logging.DEBUG:
-        os.remove(_LOG_FILE)
 
+def _start_listener() -> logging.handlers.QueueListener:
+    """Starts writing the queued records to the log file."""
     # Create the logging file handler
-    fh = logging.FileHandler(_LOG_FILE)
+    fh = _LazyFileHandler(_LOG_FILE)
 
     # Create the logging formatter
     formatter = logging.Formatter(_LOG_FORMAT)
@@ -40,13 +120,325 @@ def _create_logger() -> logging.Logger:
     # Set the formatter of the handler
     fh.setFormatter(formatter)
 
-    # Add handler to logger object
-    logger_obj.addHandler(fh)
-    return logger_obj
+    listener = logging.handlers.QueueListener(_queue_handler.queue, fh)
+    listener.start()
+    return listener
+
+
+def _forward_children():
+    # Forked processes inherit the queue, and so do the ones they fork
+    global _forwarded
+    if _forwarded is None:
+        _forwarded = logging.handlers.QueueListener(_ProcessQueue(),
+                                                    *_listener.handlers)
+        _forwarded.start()
+
+
+def _forward_to_parent():
+    # A forked process doesn't have the thread of the listener, its records
+    # go to the process that writes the file
+    global _listener
+    _listener = None
+    _queue_handler.queue = _forwarded.queue
+
+    # and mustn't overwrite the trace of its parent
+    if tracer is not None:
+        tracer.filename = None
+
+
+def _stop_listener():
+    # Writes the records still in the queues. A forked process has none.
+    if _listener is None:
+        return
+    if _forwarded is not None:
+        _forwarded.stop()
+    _listener.stop()
+
+
+class _Histogram:
+    """The durations of the calls of a function, in power of 2 buckets of
+    nanoseconds."""
+
+    __slots__ = ('calls', 'total', 'self_total', 'min', 'max', 'buckets',
+                 'errors')
+
+    def __init__(self):
+        self.calls = 0
+        self.total = 0
+        self.self_total = 0
+        self.min = None
+        self.max = 0
+        self.buckets = collections.Counter()
+        self.errors = 0
+
+    def add(self, duration: int, self_time: int, error: bool):
+        self.calls += 1
+        self.total += duration
+        self.self_total += self_time
+        self.min = duration if self.min is None else min(self.min, duration)
+        self.max = max(self.max, duration)
+        self.buckets[duration.bit_length()] += 1
+        self.errors += error
+
+    def percentile(self, fraction: float) -> int:
+        """The upper bound of the bucket of a percentile, in nanoseconds."""
+        seen = 0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen >= fraction * self.calls:
+                return min(2 ** bucket, self.max)
+        return self.max
+
+    def summary(self) -> dict:
+        return {
+            'calls': self.calls,
+            'errors': self.errors,
+            'total_ms': self.total / 1e6,
+            'self_ms': self.self_total / 1e6,
+            'min_ms': (self.min or 0) / 1e6,
+            'max_ms': self.max / 1e6,
+            'p50_ms': self.percentile(0.5) / 1e6,
+            'p90_ms': self.percentile(0.9) / 1e6,
+            'p99_ms': self.percentile(0.99) / 1e6,
+            # The calls that took up to each power of 2 of nanoseconds
+            'buckets_ms': [[2 ** bucket / 1e6, self.buckets[bucket]]
+                           for bucket in sorted(self.buckets)],
+        }
+
+
+class _Tracer:
+    """ Records the spans of the decorated functions and the counters.
+
+    Every thread keeps the stack of its open spans, so the time of a span
+    can be split into the time of the spans inside it and its own.
+
+    :param filename: Where to write the trace when tracing stops, if
+           anywhere.
+    :param trace_format: 'chrome' for a Chrome trace of every span, or
+           'json' for a summary of each function.
+    """
+
+    def __init__(self, filename: str = None, trace_format: str = 'chrome'):
+        if trace_format not in _TRACE_FORMATS:
+            raise ValueError(f'Unknown trace format "{trace_format}". '
+                             f'Use one of {_TRACE_FORMATS}.')
+
+        self.filename = filename
+        self.trace_format = trace_format
+        self._start = time.perf_counter_ns()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._events = []
+        self._dropped = 0
+        self._threads = {}
+        self._histograms = collections.defaultdict(_Histogram)
+        self._counters = collections.Counter()
+
+    def begin(self, name: str) -> list:
+        """Opens a span in the current thread and returns it."""
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+            thread = threading.current_thread()
+            self._threads[thread.ident] = thread.name
+
+        # Name, start and time spent in the spans inside it
+        frame = [name, time.perf_counter_ns(), 0]
+        stack.append(frame)
+        return frame
+
+    def end(self, frame: list, error: str = None):
+        """Closes a span opened by begin."""
+        end = time.perf_counter_ns()
+        stack = self._local.stack
+        if frame in stack:
+            del stack[stack.index(frame):]
+
+        name, start, children = frame
+        duration = end - start
+        if stack:
+            stack[-1][2] += duration
+
+        with self._lock:
+            self._histograms[name].add(duration, duration - children,
+                                       error is not None)
+            if len(self._events) < _MAX_TRACE_EVENTS:
+                self._events.append((name, threading.get_ident(), start,
+                                     duration, duration - children, error))
+            else:
+                self._dropped += 1
+
+    def count(self, name: str, value: int = 1):
+        with self._lock:
+            self._counters[name] += value
+
+    def summary(self) -> dict:
+        """The counters, and the calls of each function."""
+        with self._lock:
+            return {
+                'spans': {name: histogram.summary() for name, histogram
+                          in sorted(self._histograms.items())},
+                'counters': dict(sorted(self._counters.items())),
+                'dropped_spans': self._dropped,
+            }
+
+    def chrome_trace(self) -> dict:
+        """The spans as complete events of the Chrome trace format, with
+        the counters as counter events."""
+        pid = os.getpid()
+        summary = self.summary()
+        with self._lock:
+            events = list(self._events)
+            threads = dict(self._threads)
+            end = max([start + duration for _, _, start, duration, _, _
+                       in events] or [self._start])
+
+        trace = [{'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid,
+                  'args': {'name': name}} for tid, name in threads.items()]
+        for name, tid, start, duration, self_time, error in events:
+            args = {'self_us': self_time / 1e3}
+            if error is not None:
+                args['error'] = error
+            trace.append({'name': name, 'cat': 'function', 'ph': 'X',
+                          'ts': (start - self._start) / 1e3,
+                          'dur': duration / 1e3, 'pid': pid, 'tid': tid,
+                          'args': args})
+
+        for name, value in summary['counters'].items():
+            trace.append({'name': name, 'ph': 'C', 'ts': 0, 'pid': pid,
+                          'args': {'value': 0}})
+            trace.append({'name': name, 'ph': 'C',
+                          'ts': (end - self._start) / 1e3, 'pid': pid,
+                          'args': {'value': value}})
+
+        return {'traceEvents': trace, 'displayTimeUnit': 'ms',
+                'otherData': summary}
+
+    def write(self, filename: str = None):
+        """ Writes the trace.
+
+        :param filename: The file to write, the tracer's file if None.
+        """
+        import json
+
+        filename = filename or self.filename
+        trace = (self.chrome_trace() if self.trace_format == 'chrome'
+                 else self.summary())
+        os.makedirs(os.path.dirname(os.path.abspath(filename)),
+                    exist_ok=True)
+        with open(filename, 'w') as file:
+            json.dump(trace, file)
+
+
+class _NoSpan:
+    """What span returns when tracing is off."""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+
+class _Span:
+    __slots__ = ('_tracer', '_name', '_frame')
+
+    def __init__(self, active: _Tracer, name: str):
+        self._tracer = active
+        self._name = name
+
+    def __enter__(self):
+        self._frame = self._tracer.begin(self._name)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._tracer.end(self._frame,
+                         None if exc_type is None else exc_type.__name__)
+        return False
+
+
+_no_span = _NoSpan()
+
+# None while tracing is off, which is all the decorated functions check
+tracer = None
+
+
+def start_tracing(filename: str = None, trace_format: str = 'chrome'):
+    """ Starts recording the calls of the decorated functions, the spans
+    and the counters, dropping anything recorded before.
+
+    Also started at import if SPIELPENDIUM_TRACE is set to a file name, in
+    which case the trace is written when the program exits.
+
+    :param filename: Where stop_tracing writes the trace, if anywhere.
+    :param trace_format: 'chrome' for a trace to open in chrome://tracing or
+           Perfetto, or 'json' for a summary of each function.
+    :raises ValueError: If the format is unknown.
+    """
+    global tracer
+    tracer = _Tracer(filename, trace_format)
+
+
+def stop_tracing() -> dict:
+    """ Stops tracing and writes the trace to its file, if it has one.
+
+    :return: The summary of what was recorded, as returned by metrics.
+    """
+    global tracer
+    active, tracer = tracer, None
+    if active is None:
+        return {}
+
+    if active.filename:
+        active.write()
+    return active.summary()
+
+
+def metrics() -> dict:
+    """ Returns what has been recorded since tracing started.
+
+    :return: The calls, errors and duration percentiles of each function,
+             and the value of each counter. Empty if tracing is off.
+    """
+    return {} if tracer is None else tracer.summary()
+
+
+def span(name: str):
+    """ Times a block of code as if it were a decorated function.
+
+        with log.span('import.parse'):
+            ...
+
+    :param name: The name of the span.
+    :return: A context manager, which does nothing if tracing is off.
+    """
+    active = tracer
+    return _no_span if active is None else _Span(active, name)
+
+
+def count(name: str, value: int = 1):
+    """ Adds to a counter, e.g. of cache hits or bytes downloaded.
+
+    :param name: The name of the counter.
+    :param value: How much to add.
+    """
+    active = tracer
+    if active is not None:
+        active.count(name, value)
 
 
 # Create the logger object to use throughout the program
 logger = _create_logger()
+_listener = _start_listener()
+atexit.register(_stop_listener)
+if TRACE_FILE:
+    start_tracing(TRACE_FILE, TRACE_FORMAT)
+    atexit.register(stop_tracing)
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(before=_forward_children,
+                        after_in_child=_forward_to_parent)
 
 
 def log(_logger: logging.Logger):
@@ -60,25 +452,44 @@ def log(_logger: logging.Logger):
     def decorator(func):
         # Get the full path to the function (packages as modules) for debugging
         func_name = func.__name__
+        # e.g. database.query
+        span_name = f'{func.__module__.rpartition(".")[2]}.{func.__qualname__}'
 
         @functools.wraps(func)
         def wrapper(*args, **kwargs):
-            _logger.debug(f'Entering {func_name}.')
+            # Checked once per call, the messages are only built if needed
+            debug = _logger.isEnabledFor(logging.DEBUG)
+            if debug:
+                _logger.debug('Entering %s.', func_name)
+
+            active = tracer
+            if active is not None:
+                frame = active.begin(span_name)
+            error = None
             try:
                 # Try to run the function
                 ret = func(*args, **kwargs)
             except Exception as e:
+                error = type(e).__name__
                 # Log the exception
-                err = (f'An exception of type {type(e).__name__} occurred in'
-                       f' {func_name}.\nFunction arguments:\n'
-                       f'    args={args}\n'
-                       f'    kwargs={kwargs}')
-                _logger.exception(err)
+                if _logger.isEnabledFor(logging.ERROR):
+                    _logger.exception(
+                        'An exception of type %s occurred in %s.\n'
+                        'Function arguments:\n'
+                        '    args=%s\n'
+                        '    kwargs=%s',
+                        type(e).__name__, func_name, _arguments.repr(args),
+                        _arguments.repr(kwargs)
+                    )
 
                 # Re-raise the exception
-                raise e
+                raise
             else:
-                _logger.debug(f'Exiting {func_name}.')
+                if debug:
+                    _logger.debug('Exiting %s.', func_name)
+            finally:
+                if active is not None:
+                    active.end(frame, error)
 
             return ret
 
@@ -1,2 +1,25 @@
-from .bgg_api_interface import *
-from .connection_check import *
+from spielpendium.lazy_import import lazy_attributes
+
+# The modules are only imported when one of their names is first used
+__all__ = [
+    'search_bgg', 'iter_search_results', 'get_user_game_collection',
+    'download_user_game_collection', 'get_game_info', 'get_game_xml',
+    'iter_game_info', 'get_images',
+    'get_bgg_url', 'set_bgg_url', 'ConnectionStatus',
+    'get_connection_status', 'response_cache', 'search_cache', 'Typeahead',
+    'single_flight',
+]
+
+__getattr__, __dir__ = lazy_attributes(__name__, {
+    **dict.fromkeys(['search_bgg', 'iter_search_results',
+                     'get_user_game_collection',
+                     'download_user_game_collection', 'get_game_info',
+                     'get_game_xml', 'iter_game_info', 'get_images',
+                     'get_bgg_url', 'set_bgg_url'], 'bgg_api_interface'),
+    'ConnectionStatus': 'connection_check',
+    'get_connection_status': 'connection_check',
+    'response_cache': 'response_cache',
+    'search_cache': 'search_cache',
+    'Typeahead': 'typeahead',
+    'single_flight': 'single_flight',
+})
@@ -1,28 +1,49 @@
 """The BGG API side of the Spielpendium-BGG interface."""
+import collections
+import json
+import os
+import threading
 import time
-import urllib.request
 import urllib.error
 import urllib.parse
 import multiprocessing as mp
-from typing import Dict, Optional, List, Union, Tuple
+import xml.etree.ElementTree as ElementTree
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import (Any, Callable, Dict, Optional, List, Union, Tuple,
+                    Iterator)
 
-from PyQt5 import QtGui, QtCore
 import xmltodict
 
 from spielpendium import log
-from spielpendium.constants import IMAGE_SIZE
 from spielpendium import database
 from spielpendium.database.scripts import SQLScripts
+from spielpendium.network.response_cache import (response_cache, download,
+                                                 normalize_url)
+from spielpendium.network.single_flight import single_flight
+from spielpendium.network.xml_stream import iter_xml_items, element_to_dict
+from spielpendium.network.search_cache import search_cache
+from spielpendium.thumbnails import Thumbnails
 
 __author__ = 'Eduardo Ruiz'
 
-__all__ = ['search_bgg', 'get_user_game_collection', 'get_game_info',
-           'get_images']
+__all__ = ['search_bgg', 'iter_search_results', 'get_user_game_collection',
+           'get_game_info', 'get_game_xml', 'iter_game_info', 'get_images',
+           'get_bgg_url', 'set_bgg_url']
 
-_BGG_API_URL = 'https://www.boardgamegeek.com/xmlapi/'
+# The BGG site can be swapped for a stand-in server (e.g. for benchmarks)
+_BGG_URL = os.environ.get('SPIELPENDIUM_BGG_URL',
+                          'https://www.boardgamegeek.com/')
+_BGG_API_URL = f'{_BGG_URL}xmlapi/'
 _MAX_CHECKS = 10
 _TIME_BETWEEN_CHECKS = 10
 
+# How many parsed user collections are kept in memory
+_COLLECTION_MEMO_SIZE = 8
+
+# How many images are scaled to thumbnails at the same time
+_THUMBNAIL_WORKERS = 4
+
 # noinspection SpellCheckingInspection
 COLLECTION_FILTERS = (
     'own',
@@ -53,29 +74,66 @@ COLLECTION_FILTERS = (
 )
 
 
+def get_bgg_url() -> str:
+    """ Returns the base URL of the BGG site the network layer talks to.
+
+    :return: The base URL, ending with a '/'.
+    """
+    return _BGG_URL
+
+
+def set_bgg_url(url: str):
+    """ Points the network layer at another BGG site, such as the local
+    stand-in server.
+
+    :param url: The base URL of the site. The API is expected at
+           <url>/xmlapi/.
+    """
+    global _BGG_URL, _BGG_API_URL
+
+    _BGG_URL = url if url.endswith('/') else f'{url}/'
+    _BGG_API_URL = f'{_BGG_URL}xmlapi/'
+    log.logger.info(f'BGG URL set to {_BGG_URL}.')
+
+
 @log.log(log.logger)
-def get_xml_info(url: str) -> Tuple[dict, str]:
+def get_xml_info(url: str, revalidate: bool = False) -> Tuple[dict, str]:
     """ Pulls xml info from the web and converts it to a dict.
 
+    Responses are served from the response cache when possible. Concurrent
+    calls for the same URL share a single request and its (read-only) result.
+
     :param url: The URL that will be pulled to get XML data.
+    :param revalidate: Whether to check with BGG even if the cached response
+           is still fresh.
     :raises urllib.error.HTTPError: If there's any error in retrieving data at
             the URL.
     :raises ValueError: If the retrieved data cannot be converted to a dict
     :return: The information from the XML converted into a dict.
     """
+    return single_flight.do(('xml', normalize_url(url), revalidate),
+                            _get_xml_info, url, revalidate)
+
+
+def _get_xml_info(url: str, revalidate: bool) -> Tuple[dict, str]:
+    data_bytes = _get_xml_bytes(url, revalidate)
+
+    # Convert the bytes object to an OrderedDict.
+    data = xmltodict.parse(data_bytes)
+    log.logger.debug('Data successfully converted to dict.')
+
+    return data, data_bytes.decode()
+
+
+def _get_xml_bytes(url: str, revalidate: bool) -> bytes:
     first_loop = True
 
-    data = 0
+    data_bytes = b''
     for check in range(_MAX_CHECKS):
-        with urllib.request.urlopen(url) as webpage:
-            data_bytes = webpage.read()
-        log.logger.debug(f'Information retrieved successfully from {url}.')
-
-        # Convert the bytes object to an OrderedDict.
-        data = xmltodict.parse(data_bytes)
-        log.logger.debug('Data successfully converted to dict.')
+        data_bytes = response_cache.fetch(url, revalidate)
+        log.logger.debug('Information retrieved successfully from %s.', url)
 
-        if 'message' not in data.keys():
+        if _root_tag(data_bytes) != 'message':
             log.logger.info(f'Data successfully pulled from {url}.')
             break
         else:
@@ -92,23 +150,64 @@ def get_xml_info(url: str) -> Tuple[dict, str]:
 
             time.sleep(_TIME_BETWEEN_CHECKS)
 
-    return data, data_bytes.decode()
+    return data_bytes
+
+
+def _root_tag(data_bytes: bytes) -> Optional[str]:
+    """Returns the tag of the root element without parsing the whole
+    document."""
+    parser = ElementTree.XMLPullParser(events=('start',))
+    try:
+        parser.feed(data_bytes[:1024])
+        for _, element in parser.read_events():
+            return element.tag
+    except ElementTree.ParseError:
+        pass
+    return None
 
 
 @log.log(log.logger)
-def search_bgg(search_query: str, exact_flag: bool = False) -> dict:
+def search_bgg(search_query: str, exact_flag: bool = False,
+               use_cache: bool = True) -> dict:
     """ Assembles the search URL and returns data from the BoardGameGeek API.
 
     :param search_query: The query to search for.
     :param exact_flag: A flag that tells the BGG API whether to only return
            exact matches or not.
+    :param use_cache: Whether results may come from the search cache. If
+           False, BGG is always asked.
     :return: Dictionary with the search results
     """
-    search_query = urllib.parse.quote(search_query)
-    search_url = (f'{_BGG_API_URL}search?search={search_query}'
-                  f'&exact={int(exact_flag)}')
+    if use_cache:
+        search_results = search_cache.lookup(search_query, exact_flag)
+        if search_results is not None:
+            return search_results
+
+    search_results = get_xml_info(_search_url(search_query, exact_flag),
+                                  revalidate=not use_cache)[0]
+    search_cache.store(search_query, exact_flag, search_results)
+
+    return search_results
+
+
+def iter_search_results(search_query: str,
+                        exact_flag: bool = False) -> Iterator[dict]:
+    """ Streams the results of a BGG search one result at a time.
+
+    The results are neither read from nor written to the search cache.
+
+    :param search_query: The query to search for.
+    :param exact_flag: Whether to only return exact matches or not.
+    :return: An iterator over the search results.
+    """
+    return iter_xml_items(_search_url(search_query, exact_flag),
+                          tags=('boardgame',))
+
 
-    return get_xml_info(search_url)[0]
+def _search_url(search_query: str, exact_flag: bool) -> str:
+    search_query = urllib.parse.quote(search_query)
+    return (f'{_BGG_API_URL}search?search={search_query}'
+            f'&exact={int(exact_flag)}')
 
 
 @log.log(log.logger)
@@ -128,42 +227,157 @@ def get_user_game_collection(
     if user_exists(username) and not force_update:
         info_dict = get_user_info(username)
     else:
-        username_safe = urllib.parse.quote(username)
-        collection_url = f'{_BGG_API_URL}collection/{username_safe}'
+        info_dict, xml = download_user_game_collection(username, filters,
+                                                       force_update)
 
-        if filters is not None:
-            if any([key not in COLLECTION_FILTERS for key in filters.keys()]):
-                raise KeyError('Invalid filter provided. Filters must be '
-                               'one of the following: "' +
-                               '", "'.join(list(COLLECTION_FILTERS)) + '".')
+        save_user_xml(username, xml, info_dict)
 
-            collection_url += '?' + '&'.join(
-                [f'{key}={int(value)}' for key, value in filters.items()]
-            )
+    return info_dict
 
-        info_dict, xml = get_xml_info(collection_url)
 
-        save_user_xml(username, xml)
+@log.log(log.logger)
+def download_user_game_collection(
+        username: str,
+        filters: Optional[Dict[str, Union[int, bool]]] = None,
+        force_update: bool = True
+) -> Tuple[dict, bytes]:
+    """ Downloads a user's game collection from BGG, without saving it.
 
-    return info_dict
+    :param username: The username whose collection were grabbing.
+    :param filters: Additional filters for the game collection.
+    :param force_update: Whether to ask BGG even if the response is cached.
+    :raises KeyError: If a filter is invalid.
+    :return: The collection, and its XML to save with save_user_xml.
+    """
+    username_safe = urllib.parse.quote(username)
+    collection_url = f'{_BGG_API_URL}collection/{username_safe}'
+
+    if filters is not None:
+        if any([key not in COLLECTION_FILTERS for key in filters.keys()]):
+            raise KeyError('Invalid filter provided. Filters must be '
+                           'one of the following: "' +
+                           '", "'.join(list(COLLECTION_FILTERS)) + '".')
+
+        collection_url += '?' + '&'.join(
+            [f'{key}={int(value)}' for key, value in filters.items()]
+        )
+
+    return get_xml_info(collection_url, force_update)
+
+
+class _CollectionMemo:
+    """The most recently used user collections, by database file and
+    username.
+
+    They're kept as JSON rather than as the parsed dicts, so that every
+    caller gets its own dicts to change. Loading the JSON is faster than a
+    deepcopy of the dicts would be.
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self._collections = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(username: str) -> Tuple[str, str]:
+        return database.connection().databaseName(), username
+
+    def get(self, username: str) -> Optional[bytes]:
+        key = self._key(username)
+        with self._lock:
+            info = self._collections.get(key)
+            if info is not None:
+                self._collections.move_to_end(key)
+            return info
+
+    def put(self, username: str, info: bytes):
+        key = self._key(username)
+        with self._lock:
+            self._collections[key] = info
+            self._collections.move_to_end(key)
+            while len(self._collections) > self.size:
+                self._collections.popitem(last=False)
+
+    def invalidate(self, username: str):
+        key = self._key(username)
+        with self._lock:
+            self._collections.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._collections.clear()
+
+
+_collection_memo = _CollectionMemo(_COLLECTION_MEMO_SIZE)
+
+
+def _decompress_xml(xml: Union[str, bytes]) -> bytes:
+    """Collections saved before they were compressed are kept as they were."""
+    if isinstance(xml, str):
+        return xml.encode()
+    try:
+        return zlib.decompress(xml)
+    except zlib.error:
+        return xml
 
 
 def get_user_info(username: str) -> dict:
-    command = SQLScripts.get_user_xml
+    """ Gets the collection of a user saved in the database.
 
-    xml = database.query(command, [username])[0]
+    The collection is stored already parsed, and the most recently used
+    ones are also kept in memory. Every call returns a new copy, which the
+    caller is free to change.
 
-    return xmltodict.parse(xml)
+    :param username: The user.
+    :raises KeyError: If no collection was saved for the user.
+    :return: The collection, as xmltodict would parse its XML.
+    """
+    parsed = _collection_memo.get(username)
+    if parsed is not None:
+        return json.loads(parsed)
+
+    row = database.query(SQLScripts.get_user_collection, [username])
+    if not row:
+        raise KeyError(f'No collection saved for {username}.')
+
+    parsed, xml = row
+    if parsed is not None:
+        parsed = zlib.decompress(parsed)
+    else:
+        parsed = json.dumps(xmltodict.parse(_decompress_xml(xml)),
+                            separators=(',', ':')).encode()
+
+    _collection_memo.put(username, parsed)
+    return json.loads(parsed)
 
 
 def user_exists(username):
+    if _collection_memo.get(username) is not None:
+        return True
+
     command = SQLScripts.user_exists
     return database.query(command, [username])[0] == 1
 
 
-def save_user_xml(username, xml):
-    command = SQLScripts.save_user_xml
-    database.query(command, [username, xml])
+def save_user_xml(username: str, xml: Union[str, bytes],
+                  info: dict = None):
+    """ Saves the collection of a user, compressed.
+
+    :param username: The user.
+    :param xml: The XML of the collection, as sent by BGG.
+    :param info: The XML already parsed by xmltodict, to avoid parsing it
+           again.
+    """
+    if isinstance(xml, str):
+        xml = xml.encode()
+    if info is None:
+        info = xmltodict.parse(xml)
+
+    parsed = json.dumps(info, separators=(',', ':')).encode()
+    database.query(SQLScripts.save_user_xml,
+                   [username, zlib.compress(xml), zlib.compress(parsed)])
+    _collection_memo.invalidate(username)
 
 
 def get_game_info(game_ids: Union[int, List[int]],
@@ -175,6 +389,42 @@ def get_game_info(game_ids: Union[int, List[int]],
     :return: The details of the game(s).
     """
 
+    return get_xml_info(_game_info_url(game_ids, get_stats))[0]
+
+
+def get_game_xml(game_ids: Union[int, List[int]],
+                 get_stats: bool = False) -> bytes:
+    """ Gets the details for games as the raw XML response.
+
+    :param game_ids: The BGG game id(s) to get information for.
+    :param get_stats: Whether to get detailed game stats or not.
+    :return: The XML with the details of the game(s).
+    """
+    url = _game_info_url(game_ids, get_stats)
+    return single_flight.do(('raw', normalize_url(url)), _get_xml_bytes, url,
+                            False)
+
+
+def iter_game_info(game_ids: Union[int, List[int]],
+                   get_stats: bool = False,
+                   convert: Callable[[ElementTree.Element], Any]
+                   = element_to_dict) -> Iterator[Any]:
+    """ Streams the details for games one game at a time.
+
+    Unlike get_game_info, the response is parsed as it arrives and only one
+    game is kept in memory at a time.
+
+    :param game_ids: The BGG game id(s) to get information for.
+    :param get_stats: Whether to get detailed game stats or not.
+    :param convert: The function converting each <boardgame> element. By
+           default, the details are converted to dicts.
+    :return: An iterator over the details of each game.
+    """
+    return iter_xml_items(_game_info_url(game_ids, get_stats),
+                          tags=('boardgame',), convert=convert)
+
+
+def _game_info_url(game_ids: Union[int, List[int]], get_stats: bool) -> str:
     # Convert to list
     if isinstance(game_ids, int):
         game_ids = [game_ids]
@@ -183,32 +433,63 @@ def get_game_info(game_ids: Union[int, List[int]],
     url = _BGG_API_URL + 'boardgame/' + ','.join([str(a) for a in game_ids])
     url += f'?stats=1' if get_stats else ''
 
-    return get_xml_info(url)[0]
+    return url
 
 
 @log.log(log.logger)
-def get_images(image_urls: Union[str, List[str]]) -> List[QtGui.QPixmap]:
+def get_images(image_urls: Union[str, List[str]]) -> List[Thumbnails]:
     """ Retrieves images from a list of URLs.
 
     :param image_urls: The image URLs.
-    :return: The images.
+    :return: The thumbnails of the images.
     """
     # Convert to list
     if isinstance(image_urls, str):
         image_urls = [image_urls]
 
-    # Set up pool of subprocesses to each get an image
-    pool = mp.Pool(processes=mp.cpu_count())
-
-    # Get the images
-    images_as_bytes = pool.map(get_single_image, image_urls)
-
-    # Convert the images to QImages
-    images_qt = [QtGui.QPixmap.fromImage(QtGui.QImage.fromData(im).scaled(
-        IMAGE_SIZE, IMAGE_SIZE, QtCore.Qt.KeepAspectRatio
-    )) for im in images_as_bytes]
-
-    return images_qt
+    # Use the cached images that are still fresh
+    entries = [response_cache.lookup(url) for url in image_urls]
+    images_as_bytes = [response_cache.hit(entry)
+                       if response_cache.is_fresh(entry) else None
+                       for entry in entries]
+
+    # Images already being downloaded (by another caller or earlier in this
+    # list) are waited for instead of being downloaded again.
+    calls = {ii: single_flight.begin(_image_key(image_urls[ii]))
+             for ii, image in enumerate(images_as_bytes) if image is None}
+    stale = [ii for ii, (_, is_leader) in calls.items() if is_leader]
+
+    error = None
+    try:
+        if stale:
+            # Set up pool of subprocesses to each get an image
+            with mp.Pool(processes=mp.cpu_count()) as pool:
+                downloads = pool.starmap(
+                    download,
+                    [(image_urls[ii],
+                      response_cache.request_headers(entries[ii]))
+                     for ii in stale]
+                )
+
+            for ii, response in zip(stale, downloads):
+                images_as_bytes[ii] = response_cache.resolve(image_urls[ii],
+                                                             entries[ii],
+                                                             response)
+    except BaseException as err:
+        error = err
+        raise
+    finally:
+        for ii in stale:
+            single_flight.finish(_image_key(image_urls[ii]), calls[ii][0],
+                                 images_as_bytes[ii], error)
+
+    for ii, (call, is_leader) in calls.items():
+        if not is_leader:
+            images_as_bytes[ii] = call.wait()
+
+    # Scale the images to every thumbnail size, once and for all
+    with ThreadPoolExecutor(max_workers=_THUMBNAIL_WORKERS) as executor:
+        return list(executor.map(Thumbnails.from_data, images_as_bytes))
 
 
 def get_single_image(image_url: str) -> bytes:
@@ -218,10 +499,12 @@ def get_single_image(image_url: str) -> bytes:
     :return: The image as bytes.
     """
 
-    with urllib.request.urlopen(image_url) as url:
-        image = url.read()
+    return single_flight.do(_image_key(image_url), response_cache.fetch,
+                            image_url)
+
 
-    return image
+def _image_key(image_url: str) -> Tuple[str, str]:
+    return 'image', normalize_url(image_url)
 
 
 if __name__ == '__main__':
@@ -3,13 +3,12 @@ import urllib.request
 import urllib.error
 import enum
 
-from spielpendium.network import search_bgg
+from spielpendium.network import search_bgg, get_bgg_url
 
 __author__ = 'Eduardo Ruiz'
 
 __all__ = ['ConnectionStatus', 'get_connection_status']
 
-_BGG_URL = "https://www.boardgamegeek.com/"
 _HTTP_STATUS_OK = 200
 _TEST_SEARCH_TERM = 'Catan'
 _TEST_IP_ADDRESS = '1.1.1.1'
@@ -54,7 +53,8 @@ def bgg_is_up() -> bool:
 
     try:
         # try to connect to.BGG and check the return status.
-        return urllib.request.urlopen(_BGG_URL).getcode() == _HTTP_STATUS_OK
+        return (urllib.request.urlopen(get_bgg_url()).getcode()
+                == _HTTP_STATUS_OK)
     except urllib.error.URLError:
         # if there's any error with connecting, return False
         pass
@@ -70,7 +70,7 @@ def bgg_api_is_up() -> bool:
 
     try:
         # Try a test search using the BGG API. It is works, the API is up
-        search_bgg(_TEST_SEARCH_TERM)
+        search_bgg(_TEST_SEARCH_TERM, use_cache=False)
         return True
     except urllib.error.HTTPError:
         # If it doesn't work, the API is down
@@ -0,0 +1,418 @@
+"""On-disk cache of BGG API responses.
+
+Responses are stored in the Http_Cache table of the local database, keyed by
+their normalized URL. Each endpoint has its own time to live. Once an entry is
+stale it is revalidated with a conditional request (If-None-Match /
+If-Modified-Since) so that unchanged data is not downloaded again.
+"""
+import threading
+import time
+import zlib
+import urllib.request
+import urllib.error
+import urllib.parse
+from typing import Dict, Optional, NamedTuple, Iterator
+
+from spielpendium import log
+from spielpendium import database
+from spielpendium.database.scripts import SQLScripts
+
+__author__ = 'Eduardo Ruiz'
+
+__all__ = ['response_cache', 'normalize_url', 'endpoint_of', 'download',
+           'CacheEntry', 'Download', 'ENDPOINT_TTLS']
+
+_HTTP_OK = 200
+_HTTP_NOT_MODIFIED = 304
+
+_HOUR = 60 * 60
+_DAY = 24 * _HOUR
+
+# Time to live of the cached responses for each endpoint, in seconds
+ENDPOINT_TTLS = {
+    'search': _DAY,
+    'collection': _HOUR,
+    'boardgame': 7 * _DAY,
+    'image': 30 * _DAY,
+}
+
+# Images are already compressed, so there's nothing to gain from zlib
+_UNCOMPRESSED_ENDPOINTS = ('image',)
+
+_DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+
+class CacheEntry(NamedTuple):
+    """A response stored in the cache."""
+    url: str
+    endpoint: str
+    encoding: str
+    data: bytes
+    etag: Optional[str]
+    last_modified: Optional[str]
+    fetched_at: float
+
+    @property
+    def body(self) -> bytes:
+        """The decoded body of the response."""
+        if self.encoding == 'zlib':
+            return zlib.decompress(self.data)
+        return self.data
+
+    def chunks(self, chunk_size: int) -> Iterator[bytes]:
+        """ Decodes the body of the response a piece at a time.
+
+        :param chunk_size: The maximum size of the encoded pieces.
+        :return: An iterator over the decoded body.
+        """
+        decompressor = (zlib.decompressobj() if self.encoding == 'zlib'
+                        else None)
+
+        for start in range(0, len(self.data), chunk_size):
+            chunk = self.data[start:start + chunk_size]
+            yield (decompressor.decompress(chunk) if decompressor is not None
+                   else chunk)
+
+        if decompressor is not None:
+            yield decompressor.flush()
+
+
+class Download(NamedTuple):
+    """The result of a (possibly conditional) HTTP request."""
+    status: int
+    body: bytes
+    etag: Optional[str]
+    last_modified: Optional[str]
+
+
+def normalize_url(url: str) -> str:
+    """ Normalizes a URL so that equivalent URLs share a cache entry.
+
+    The scheme and host are lower-cased, default ports and fragments are
+    dropped and the query parameters are sorted.
+
+    :param url: The URL to normalize.
+    :return: The normalized URL.
+    """
+    parts = urllib.parse.urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+
+    netloc = parts.hostname.lower() if parts.hostname else ''
+    if parts.port is not None and parts.port != _DEFAULT_PORTS.get(scheme):
+        netloc += f':{parts.port}'
+
+    query = urllib.parse.urlencode(
+        sorted(urllib.parse.parse_qsl(parts.query, keep_blank_values=True))
+    )
+
+    return urllib.parse.urlunsplit((scheme, netloc, parts.path or '/',
+                                    query, ''))
+
+
+def endpoint_of(url: str) -> str:
+    """ Finds which BGG API endpoint a URL points to.
+
+    :param url: The URL.
+    :return: One of the keys of ENDPOINT_TTLS.
+    """
+    path = urllib.parse.urlsplit(url).path.lower()
+
+    for endpoint in ('search', 'collection', 'boardgame'):
+        if f'/xmlapi/{endpoint}' in path:
+            return endpoint
+
+    return 'image'
+
+
+def download(url: str, headers: Optional[Dict[str, str]] = None) -> Download:
+    """ Downloads the data at a URL.
+
+    This function doesn't touch the database, so it can safely be run in
+    worker processes.
+
+    :param url: The URL to download.
+    :param headers: Additional request headers (e.g. conditional headers).
+    :raises urllib.error.HTTPError: If there's any error in retrieving data at
+            the URL.
+    :return: The status, body and validators of the response. A status of 304
+             means the cached copy is still valid and the body is empty.
+    """
+    request = urllib.request.Request(url, headers=headers or {})
+
+    try:
+        with urllib.request.urlopen(request) as response:
+            return Download(response.status, response.read(),
+                            response.headers.get('ETag'),
+                            response.headers.get('Last-Modified'))
+    except urllib.error.HTTPError as err:
+        if err.code == _HTTP_NOT_MODIFIED:
+            return Download(_HTTP_NOT_MODIFIED, b'',
+                            err.headers.get('ETag'),
+                            err.headers.get('Last-Modified'))
+        raise
+
+
+class _ResponseCache:
+
+    def __init__(self, ttls: Dict[str, float]):
+        self.ttls = dict(ttls)
+        self.enabled = True
+        # The counters are updated by the threads that fetch, e.g. the
+        # workers of an import
+        self._lock = threading.Lock()
+        self._stats = {}
+        self.reset_statistics()
+
+    def __str__(self):
+        stats = ', '.join([f'{k}={v}' for k, v in self.statistics().items()])
+        return f'ResponseCache({stats})'
+
+    def fetch(self, url: str, revalidate: bool = False) -> bytes:
+        """ Gets the body at a URL, from the cache if possible.
+
+        :param url: The URL to fetch.
+        :param revalidate: Whether to check with the server even if the cached
+               entry is still fresh.
+        :raises urllib.error.HTTPError: If there's any error in retrieving data
+                at the URL.
+        :return: The body of the response.
+        """
+        entry = self.lookup(url)
+
+        if entry is not None and not revalidate and self.is_fresh(entry):
+            return self.hit(entry)
+
+        return self.resolve(url, entry,
+                            download(url, self.request_headers(entry)))
+
+    def stream(self, url: str, revalidate: bool = False,
+               chunk_size: int = 64 * 1024) -> Iterator[bytes]:
+        """ Gets the body at a URL a piece at a time, from the cache if
+        possible.
+
+        The body is never held in memory as a whole. Downloaded pieces are
+        compressed as they arrive and the compressed body is stored in the
+        cache once the download completes.
+
+        :param url: The URL to fetch.
+        :param revalidate: Whether to check with the server even if the cached
+               entry is still fresh.
+        :param chunk_size: The size of the pieces read from the socket.
+        :raises urllib.error.HTTPError: If there's any error in retrieving data
+                at the URL.
+        :return: An iterator over the pieces of the body.
+        """
+        entry = self.lookup(url)
+
+        if entry is not None and not revalidate and self.is_fresh(entry):
+            self._count(hits=1)
+            log.count('response_cache.hits')
+            for chunk in entry.chunks(chunk_size):
+                self._count(bytes_saved=len(chunk))
+                log.count('response_cache.bytes_saved', len(chunk))
+                yield chunk
+            return
+
+        request = urllib.request.Request(url,
+                                         headers=self.request_headers(entry))
+        try:
+            response = urllib.request.urlopen(request)
+        except urllib.error.HTTPError as err:
+            if err.code != _HTTP_NOT_MODIFIED or entry is None:
+                raise
+            self._count(revalidated=1)
+            log.count('response_cache.revalidated')
+            self._refresh(entry.url)
+            for chunk in entry.chunks(chunk_size):
+                self._count(bytes_saved=len(chunk))
+                log.count('response_cache.bytes_saved', len(chunk))
+                yield chunk
+            return
+
+        self._count(misses=1)
+        log.count('response_cache.misses')
+        compressor = zlib.compressobj()
+        compressed = []
+        with response:
+            while True:
+                chunk = response.read(chunk_size)
+                if not chunk:
+                    break
+                self._count(bytes_downloaded=len(chunk))
+                log.count('network.bytes_downloaded', len(chunk))
+                compressed.append(compressor.compress(chunk))
+                yield chunk
+
+        # Only complete responses are stored. BGG answers with a 202 while it
+        # is still generating the data.
+        if response.status == _HTTP_OK:
+            compressed.append(compressor.flush())
+            self._store_encoded(url, 'zlib', b''.join(compressed),
+                                response.headers.get('ETag'),
+                                response.headers.get('Last-Modified'))
+
+    def lookup(self, url: str) -> Optional[CacheEntry]:
+        """ Looks for a cached response for a URL.
+
+        Database errors are logged and treated as a cache miss, so the cache
+        can never stop data from being pulled from the web.
+
+        :param url: The URL.
+        :return: The cached entry, or None if there isn't one.
+        """
+        if not self.enabled:
+            return None
+
+        key = normalize_url(url)
+        try:
+            row = database.query(SQLScripts.get_cached_response, [key])
+        except IOError as err:
+            log.logger.warning(f'Response cache lookup failed. {err}')
+            return None
+
+        if not row:
+            return None
+
+        endpoint, encoding, data, etag, last_modified, fetched_at = row[:6]
+
+        return CacheEntry(key, endpoint, encoding, data, etag, last_modified,
+                          float(fetched_at))
+
+    def is_fresh(self, entry: Optional[CacheEntry]) -> bool:
+        """ Checks whether a cached entry is younger than its endpoint's TTL.
+
+        :param entry: The cached entry.
+        :return: True if the entry can be used without revalidation.
+        """
+        if entry is None:
+            return False
+
+        return time.time() - entry.fetched_at < self.ttls.get(entry.endpoint,
+                                                              0)
+
+    @staticmethod
+    def request_headers(entry: Optional[CacheEntry]) -> Dict[str, str]:
+        """ Builds the conditional request headers for a cached entry.
+
+        :param entry: The cached entry, or None.
+        :return: The headers to send with the request.
+        """
+        headers = {}
+        if entry is not None:
+            if entry.etag:
+                headers['If-None-Match'] = entry.etag
+            if entry.last_modified:
+                headers['If-Modified-Since'] = entry.last_modified
+
+        return headers
+
+    def hit(self, entry: CacheEntry) -> bytes:
+        """ Records a fresh cache hit and returns its body.
+
+        :param entry: The cached entry.
+        :return: The cached body.
+        """
+        body = entry.body
+        self._count(hits=1, bytes_saved=len(body))
+        log.count('response_cache.hits')
+        log.count('response_cache.bytes_saved', len(body))
+        return body
+
+    def resolve(self, url: str, entry: Optional[CacheEntry],
+                response: Download) -> bytes:
+        """ Combines a download with the cached entry it was made for.
+
+        :param url: The URL that was downloaded.
+        :param entry: The cached entry used for the conditional request.
+        :param response: The result of the download.
+        :return: The body of the response.
+        """
+        if response.status == _HTTP_NOT_MODIFIED and entry is not None:
+            body = entry.body
+            self._count(revalidated=1, bytes_saved=len(body))
+            log.count('response_cache.revalidated')
+            log.count('response_cache.bytes_saved', len(body))
+            self._refresh(entry.url)
+            return body
+
+        self._count(misses=1, bytes_downloaded=len(response.body))
+        log.count('response_cache.misses')
+        log.count('network.bytes_downloaded', len(response.body))
+
+        # Only complete responses are stored. BGG answers with a 202 while it
+        # is still generating the data.
+        if response.status == _HTTP_OK:
+            self.store(url, response)
+
+        return response.body
+
+    def store(self, url: str, response: Download):
+        """ Saves a response in the cache.
+
+        :param url: The URL of the response.
+        :param response: The downloaded response.
+        """
+        if endpoint_of(url) in _UNCOMPRESSED_ENDPOINTS:
+            encoding, data = 'identity', response.body
+        else:
+            encoding, data = 'zlib', zlib.compress(response.body)
+
+        self._store_encoded(url, encoding, data, response.etag,
+                            response.last_modified)
+
+    def _store_encoded(self, url: str, encoding: str, data: bytes,
+                       etag: Optional[str], last_modified: Optional[str]):
+        if not self.enabled:
+            return
+
+        # Written in the background, failures are logged by the writer
+        database.queue_query(SQLScripts.save_cached_response,
+                             [normalize_url(url), endpoint_of(url), encoding,
+                              data, etag, last_modified, time.time()])
+        self._count(stores=1)
+
+    @staticmethod
+    def _refresh(key: str):
+        database.queue_query(SQLScripts.refresh_cached_response,
+                             [time.time(), key])
+
+    def clear(self):
+        """Deletes every cached response."""
+        database.query(SQLScripts.clear_cached_responses)
+
+    def statistics(self) -> Dict[str, float]:
+        """ Returns the hit/miss statistics of the cache.
+
+        :return: The statistics, including the overall hit rate.
+        """
+        with self._lock:
+            stats = dict(self._stats)
+        requests = stats['hits'] + stats['revalidated'] + stats['misses']
+        stats['hit_rate'] = ((stats['hits'] + stats['revalidated']) / requests
+                             if requests else 0.0)
+        return stats
+
+    def reset_statistics(self):
+        """Sets all the statistics counters back to zero."""
+        with self._lock:
+            self._stats = {
+                'hits': 0,
+                'revalidated': 0,
+                'misses': 0,
+                'stores': 0,
+                'bytes_downloaded': 0,
+                'bytes_saved': 0,
+            }
+
+    def _count(self, **amounts: int):
+        with self._lock:
+            for name, amount in amounts.items():
+                self._stats[name] += amount
+
+
+response_cache = _ResponseCache(ENDPOINT_TTLS)
+
+if __name__ == '__main__':
+    print(normalize_url('HTTPS://www.BoardGameGeek.com:443/xmlapi/'
+                        'search?search=Catan&exact=0'))
+    print(response_cache)
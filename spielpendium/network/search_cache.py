@@ -0,0 +1,240 @@
+"""Local cache of BGG search results.
+
+Search results are kept in the Searches and Search_Results tables for a
+limited time. A search that extends a cached search (e.g. "cata" after
+"cat") is answered by filtering the cached results, since every game whose
+name contains "cata" also contains "cat".
+
+Every game name seen in a search is also added to the Game_Names prefix
+index, which provides instant typeahead suggestions without asking BGG.
+"""
+from typing import Dict, List, Optional, NamedTuple, Union
+
+import xmltodict
+
+from spielpendium import log
+from spielpendium import database
+from spielpendium.database.scripts import SQLScripts
+
+__author__ = 'Eduardo Ruiz'
+
+__all__ = ['search_cache', 'Suggestion', 'SEARCH_TTL', 'fold_name',
+           'result_items']
+
+# How long the results of a search can be reused, in seconds
+SEARCH_TTL = 24 * 60 * 60
+
+_RESULT_TAG = 'boardgame'
+_MAX_SUGGESTIONS = 10
+
+# The largest code point, used as the upper bound of prefix range scans
+_MAX_CHAR = '\U0010ffff'
+
+
+class Suggestion(NamedTuple):
+    """A game name suggested while the user is typing."""
+    game_id: int
+    name: str
+    year_published: Optional[int]
+
+
+def fold_name(name: str) -> str:
+    """ Folds a name or query so comparisons ignore case and spacing.
+
+    :param name: The name or query.
+    :return: The folded text.
+    """
+    return ' '.join(name.casefold().split())
+
+
+def _search_key(search_query: str, exact_flag: bool) -> str:
+    return f'{int(exact_flag)}:{fold_name(search_query)}'
+
+
+def _result_names(item: Dict) -> List[str]:
+    names = item.get('name', [])
+    if not isinstance(names, list):
+        names = [names]
+
+    return [name['#text'] if isinstance(name, dict) else name
+            for name in names if name]
+
+
+def _as_search_results(items: List[Dict]) -> Dict:
+    """Puts result items back in the structure search_bgg returns."""
+    if not items:
+        return {'boardgames': {}}
+    if len(items) == 1:
+        return {'boardgames': {_RESULT_TAG: items[0]}}
+    return {'boardgames': {_RESULT_TAG: items}}
+
+
+def result_items(search_results: Dict) -> List[Dict]:
+    """ Extracts the list of result items from search results.
+
+    :param search_results: The search results, as returned by search_bgg.
+    :return: The result items.
+    """
+    items = (search_results.get('boardgames') or {}).get(_RESULT_TAG, [])
+    return items if isinstance(items, list) else [items]
+
+
+class _SearchCache:
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self.enabled = True
+        self._stats = {}
+        self.reset_statistics()
+
+    def _age_limit(self) -> str:
+        return f'-{int(self.ttl)} seconds'
+
+    def lookup(self, search_query: str,
+               exact_flag: bool = False) -> Optional[Dict]:
+        """ Looks for search results that can be answered locally.
+
+        :param search_query: The query to search for.
+        :param exact_flag: Whether only exact matches are wanted.
+        :return: The search results in the structure search_bgg returns, or
+                 None if BGG has to be asked.
+        """
+        if not self.enabled:
+            return None
+
+        key = _search_key(search_query, exact_flag)
+        try:
+            if database.query(SQLScripts.search_exists,
+                              [key, self._age_limit()])[0]:
+                self._stats['hits'] += 1
+                log.count('search_cache.hits')
+                return _as_search_results(self._cached_items(key))
+
+            if exact_flag:
+                self._stats['misses'] += 1
+                log.count('search_cache.misses')
+                return None
+
+            # A cached search whose query is a prefix of this one contains
+            # every result of this one.
+            prefix_key = database.query(SQLScripts.find_search_prefix,
+                                        [key, self._age_limit()])
+            if not prefix_key:
+                self._stats['misses'] += 1
+                log.count('search_cache.misses')
+                return None
+
+            prefix_items = self._cached_items(prefix_key[0])
+        except IOError as err:
+            log.logger.warning(f'Search cache lookup failed. {err}')
+            return None
+
+        folded_query = fold_name(search_query)
+        items = [item for item in prefix_items
+                 if any([folded_query in fold_name(name)
+                         for name in _result_names(item)])]
+
+        self._stats['derived'] += 1
+        log.count('search_cache.derived')
+        return _as_search_results(items)
+
+    @staticmethod
+    def _cached_items(key: str) -> List[Dict]:
+        return [xmltodict.parse(fragment)[_RESULT_TAG] for fragment, in
+                database.iter_rows(SQLScripts.get_search_results, [key])]
+
+    def store(self, search_query: str, exact_flag: bool,
+              search_results: Union[Dict, List[Dict]]):
+        """ Saves search results and adds their names to the prefix index.
+
+        :param search_query: The query that was searched for.
+        :param exact_flag: Whether only exact matches were wanted.
+        :param search_results: The results, either as returned by search_bgg
+               or as a list of result items.
+        """
+        if not self.enabled:
+            return
+
+        if isinstance(search_results, dict):
+            items = result_items(search_results)
+        else:
+            items = search_results
+
+        # Written in the background, the results are only needed by later
+        # searches
+        database.queue_write(self._write_results,
+                             _search_key(search_query, exact_flag), items)
+
+    def _write_results(self, key: str, items: List[Dict]):
+        rows = [(int(item['@objectid']), position,
+                 xmltodict.unparse({_RESULT_TAG: item}, full_document=False),
+                 key)
+                for position, item in enumerate(items)]
+
+        with database.transaction():
+            database.query(SQLScripts.save_search, [key])
+            database.query(SQLScripts.delete_search_results)
+            database.execute_many(SQLScripts.save_search_result, rows)
+            self.index_names(items)
+
+    @staticmethod
+    def index_names(items: List[Dict]):
+        """ Adds the names of games to the typeahead prefix index.
+
+        Every word of a name starts an entry, so "Settlers of Catan" can be
+        found by typing "set", "of" or "cat".
+
+        :param items: Result items with an '@objectid' and name(s).
+        """
+        rows = []
+        for item in items:
+            year = item.get('yearpublished')
+            year = int(year) if year else None
+
+            for name in _result_names(item):
+                words = fold_name(name).split(' ')
+                rows.extend((' '.join(words[ii:]), int(item['@objectid']),
+                             name, year)
+                            for ii in range(len(words)))
+
+        database.execute_many(SQLScripts.save_game_name, rows)
+
+    def suggest(self, prefix: str,
+                limit: int = _MAX_SUGGESTIONS) -> List[Suggestion]:
+        """ Suggests names of previously seen games for typed text.
+
+        :param prefix: The text typed so far.
+        :param limit: The maximum number of suggestions.
+        :return: The suggested games.
+        """
+        prefix = fold_name(prefix)
+        if not prefix:
+            return []
+
+        try:
+            values = database.query(SQLScripts.suggest_game_names,
+                                    [prefix, prefix + _MAX_CHAR, limit])
+        except IOError as err:
+            log.logger.warning(f'Unable to read suggestions. {err}')
+            return []
+
+        return [Suggestion(*values[ii:ii + 3])
+                for ii in range(0, len(values), 3)]
+
+    def statistics(self) -> Dict[str, float]:
+        """ Returns the hit/miss statistics of the cache.
+
+        :return: The statistics, including the overall hit rate.
+        """
+        stats = dict(self._stats)
+        lookups = stats['hits'] + stats['derived'] + stats['misses']
+        stats['hit_rate'] = ((stats['hits'] + stats['derived']) / lookups
+                             if lookups else 0.0)
+        return stats
+
+    def reset_statistics(self):
+        """Sets all the statistics counters back to zero."""
+        self._stats = {'hits': 0, 'derived': 0, 'misses': 0}
+
+
+search_cache = _SearchCache(SEARCH_TTL)
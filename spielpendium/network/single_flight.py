@@ -0,0 +1,119 @@
+"""Coalescing of concurrent identical requests.
+
+When several callers ask for the same thing at the same time, only the first
+one (the leader) does the work. The others wait for the leader and share its
+result, or its exception.
+"""
+import threading
+from typing import Any, Callable, Dict, Hashable, Tuple
+
+__author__ = 'Eduardo Ruiz'
+
+__all__ = ['single_flight', 'Call']
+
+
+class Call:
+    """A request in flight that several callers can wait on."""
+
+    def __init__(self):
+        self._done = threading.Event()
+        self.result: Any = None
+        self.error: BaseException = None
+
+    def wait(self) -> Any:
+        """ Waits for the leader to finish and returns its result.
+
+        :raises BaseException: The exception raised by the leader, if any.
+        :return: The leader's result.
+        """
+        self._done.wait()
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+class _SingleFlight:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, Call] = {}
+        self._stats = {}
+        self.reset_statistics()
+
+    def begin(self, key: Hashable) -> Tuple[Call, bool]:
+        """ Joins the request in flight for a key, or starts a new one.
+
+        A caller that gets is_leader=True must call finish() for the key.
+
+        :param key: The key identifying the request.
+        :return: The call, and whether the caller is its leader.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                self._stats['coalesced'] += 1
+                return call, False
+
+            call = Call()
+            self._calls[key] = call
+            self._stats['leaders'] += 1
+            return call, True
+
+    def finish(self, key: Hashable, call: Call, result: Any = None,
+               error: BaseException = None):
+        """ Publishes the result of a request to everyone waiting on it.
+
+        :param key: The key identifying the request.
+        :param call: The call returned by begin().
+        :param result: The result of the request.
+        :param error: The exception raised by the request, if any.
+        """
+        call.result = result
+        call.error = error
+
+        with self._lock:
+            if self._calls.get(key) is call:
+                del self._calls[key]
+
+        # noinspection PyProtectedMember
+        call._done.set()
+
+    def do(self, key: Hashable, func: Callable, *args, **kwargs) -> Any:
+        """ Runs a function unless an identical request is already in flight.
+
+        :param key: The key identifying the request.
+        :param func: The function doing the request.
+        :param args: The positional arguments of the function.
+        :param kwargs: The keyword arguments of the function.
+        :return: The result of the function, possibly shared with other
+                 callers.
+        """
+        call, is_leader = self.begin(key)
+        if not is_leader:
+            return call.wait()
+
+        try:
+            result = func(*args, **kwargs)
+        except BaseException as err:
+            self.finish(key, call, error=err)
+            raise
+
+        self.finish(key, call, result)
+        return result
+
+    def statistics(self) -> Dict[str, int]:
+        """ Returns how many requests were made and how many were saved.
+
+        :return: The statistics.
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats['in_flight'] = len(self._calls)
+        return stats
+
+    def reset_statistics(self):
+        """Sets all the statistics counters back to zero."""
+        self._stats = {'leaders': 0, 'coalesced': 0}
+
+
+single_flight = _SingleFlight()
@@ -0,0 +1,382 @@
+"""A local stand-in for the BGG XML API.
+
+The server replays the fixtures in the fixtures folder so the network layer
+can be tested and benchmarked without an internet connection:
+
+* ``/xmlapi/search`` serves a recorded search if there is one for the query,
+  otherwise it searches the names of the recorded games.
+* ``/xmlapi/collection/<username>`` answers with a 202 "request accepted"
+  message a configurable number of times before serving the collection, like
+  BGG does while it generates the data.
+* ``/xmlapi/boardgame/<ids>`` assembles the recorded games, dropping the
+  statistics unless ``stats=1`` is asked for.
+* ``/images/<name>`` serves the recorded images.
+
+Latency, bandwidth and random errors can be injected to make benchmarks
+reproduce real conditions deterministically. Every response carries an ETag
+and conditional requests are answered with 304.
+"""
+import hashlib
+import http.server
+import random
+import re
+import threading
+import time
+import urllib.parse
+import urllib.request
+from pathlib import Path
+from typing import Dict, Optional, Iterable, Tuple
+
+from spielpendium import log
+
+__author__ = 'Eduardo Ruiz'
+
+__all__ = ['StandInServer', 'FIXTURES_DIR', 'record_fixtures']
+
+FIXTURES_DIR = Path(__file__).parent.absolute() / 'fixtures'
+
+# Placeholder in the fixtures replaced with the URL of the running server
+_BASE_URL_TOKEN = '@BASE_URL@'
+
+_TERMS_OF_USE = 'https://boardgamegeek.com/xmlapi/termsofuse'
+_XML_HEADER = '<?xml version="1.0" encoding="utf-8"?>\n'
+_QUEUED_MESSAGE = ('<message>\n\tYour request for this collection has been '
+                   'accepted and will be processed.  Please try again later '
+                   'for access.\n</message>')
+_STATISTICS_RE = re.compile(r'\s*<statistics.*?</statistics>', re.DOTALL)
+_NAME_RE = re.compile(r'<name[^>]*>(.*?)</name>')
+_YEAR_RE = re.compile(r'<yearpublished>(.*?)</yearpublished>')
+
+_CHUNK_SIZE = 16 * 1024
+
+
+class StandInServer:
+    """A local HTTP server that imitates the BGG XML API."""
+
+    def __init__(self, fixtures_dir: Path = FIXTURES_DIR,
+                 host: str = '127.0.0.1', port: int = 0,
+                 latency: float = 0.0, bandwidth: Optional[float] = None,
+                 error_rate: float = 0.0, error_status: int = 503,
+                 queued_responses: int = 1, seed: int = 0):
+        """Initialize the StandInServer object.
+
+        :param fixtures_dir: The folder with the recorded responses.
+        :param host: The address to listen on.
+        :param port: The port to listen on. 0 picks a free port.
+        :param latency: Seconds to wait before answering each request.
+        :param bandwidth: Maximum bytes per second sent for each response,
+               or None for no limit.
+        :param error_rate: The fraction of requests answered with an error.
+        :param error_status: The HTTP status of the injected errors.
+        :param queued_responses: How many times a collection is answered with
+               a 202 message before it is served.
+        :param seed: The seed of the random error injection.
+        """
+        self.fixtures_dir = Path(fixtures_dir)
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.queued_responses = queued_responses
+
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._collection_requests: Dict[str, int] = {}
+        self._stats = {}
+        self.reset_statistics()
+
+        self._server = http.server.ThreadingHTTPServer((host, port),
+                                                       _make_handler(self))
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    @property
+    def url(self) -> str:
+        """The base URL of the server, to be passed to set_bgg_url."""
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}/'
+
+    def start(self):
+        """Starts serving requests in a background thread."""
+        self._thread = threading.Thread(target=self._server.serve_forever,
+                                        daemon=True)
+        self._thread.start()
+        log.logger.info(f'Stand-in BGG server running at {self.url}.')
+
+    def stop(self):
+        """Stops the server and releases its port."""
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def statistics(self) -> Dict[str, int]:
+        """ Returns the number of requests and bytes served.
+
+        :return: The statistics.
+        """
+        with self._lock:
+            return dict(self._stats)
+
+    def reset_statistics(self):
+        """Sets all the statistics counters back to zero and requeues the
+        collections."""
+        with self._lock:
+            self._stats = {'requests': 0, 'not_modified': 0, 'queued': 0,
+                           'errors': 0, 'bytes_sent': 0}
+            self._collection_requests.clear()
+
+    ###########################################################################
+    # Request handling
+    ###########################################################################
+
+    def _count(self, key: str, amount: int = 1):
+        with self._lock:
+            self._stats[key] += amount
+
+    def _inject_error(self) -> bool:
+        with self._lock:
+            return self._random.random() < self.error_rate
+
+    def _read_fixture(self, *parts: str) -> Optional[bytes]:
+        path = self.fixtures_dir.joinpath(*parts)
+        if not path.is_file():
+            return None
+
+        data = path.read_bytes()
+        if path.suffix == '.xml':
+            data = data.replace(_BASE_URL_TOKEN.encode(), self.url.encode())
+        return data
+
+    def respond(self, path: str, query: Dict[str, str]) \
+            -> Tuple[int, str, bytes]:
+        """ Builds the response for a request.
+
+        :param path: The path of the request URL.
+        :param query: The query parameters of the request URL.
+        :return: The status, content type and body of the response.
+        """
+        parts = [urllib.parse.unquote(x) for x in path.strip('/').split('/')]
+
+        if any([part in ('.', '..') for part in parts]):
+            return 404, 'text/plain', b'Not found'
+
+        if parts == ['']:
+            return 200, 'text/html', b'<html><body>Stand-in</body></html>'
+
+        if parts[0] == 'images' and len(parts) == 2:
+            return self._found(self._read_fixture('images', parts[1]),
+                               'image/png')
+
+        if parts[0] != 'xmlapi' or len(parts) < 2:
+            return 404, 'text/plain', b'Not found'
+
+        endpoint = parts[1]
+        if endpoint == 'search':
+            return self._found(self._search(query.get('search', ''),
+                                             query.get('exact') == '1'))
+        if endpoint == 'collection' and len(parts) == 3:
+            return self._collection(parts[2].lower())
+        if endpoint == 'boardgame' and len(parts) == 3:
+            return self._found(self._boardgames(parts[2].split(','),
+                                                query.get('stats') == '1'))
+
+        return 404, 'text/plain', b'Not found'
+
+    @staticmethod
+    def _found(body: Optional[bytes], content_type: str = 'text/xml') \
+            -> Tuple[int, str, bytes]:
+        if body is None:
+            return 404, 'text/plain', b'Not found'
+        return 200, content_type, body
+
+    def _search(self, search_query: str, exact: bool) -> bytes:
+        recorded = self._read_fixture('search',
+                                      f'{search_query.casefold()}.xml')
+        if recorded is not None and not exact:
+            return recorded
+
+        results = []
+        folded_query = search_query.casefold()
+        for path in sorted(self.fixtures_dir.glob('boardgame/*.xml')):
+            game = path.read_text(encoding='utf-8')
+            names = _NAME_RE.findall(game)
+            matches = [name for name in names
+                       if (name.casefold() == folded_query if exact
+                           else folded_query in name.casefold())]
+            if not matches:
+                continue
+
+            year = _YEAR_RE.search(game)
+            results.append(
+                f'  <boardgame objectid="{path.stem}">\n'
+                f'    <name primary="true">{matches[0]}</name>\n'
+                f'    <yearpublished>{year.group(1) if year else ""}'
+                f'</yearpublished>\n'
+                f'  </boardgame>'
+            )
+
+        return (f'{_XML_HEADER}<boardgames termsofuse="{_TERMS_OF_USE}">\n'
+                + '\n'.join(results) + '\n</boardgames>\n').encode()
+
+    def _collection(self, username: str) -> Tuple[int, str, bytes]:
+        body = self._read_fixture('collection', f'{username}.xml')
+        if body is None:
+            return (200, 'text/xml',
+                    b'<errors><error><message>Invalid username specified'
+                    b'</message></error></errors>')
+
+        with self._lock:
+            num_requests = self._collection_requests.get(username, 0)
+            self._collection_requests[username] = num_requests + 1
+
+        if num_requests < self.queued_responses:
+            self._count('queued')
+            return 202, 'text/xml', _QUEUED_MESSAGE.encode()
+
+        return 200, 'text/xml', body
+
+    def _boardgames(self, game_ids: Iterable[str], stats: bool) \
+            -> Optional[bytes]:
+        games = []
+        for game_id in game_ids:
+            game = self._read_fixture('boardgame', f'{game_id.strip()}.xml')
+            if game is None:
+                game = (f'<boardgame objectid="{game_id}">\n'
+                        f'  <error message="Item not found"/>\n'
+                        f'</boardgame>\n').encode()
+            elif not stats:
+                game = _STATISTICS_RE.sub('', game.decode('utf-8')).encode()
+            games.append(game.decode('utf-8').rstrip())
+
+        return (f'{_XML_HEADER}<boardgames termsofuse="{_TERMS_OF_USE}">\n'
+                + '\n'.join(games) + '\n</boardgames>\n').encode('utf-8')
+
+
+def _make_handler(server: StandInServer):
+
+    class _Handler(http.server.BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            server._count('requests')
+            if server.latency:
+                time.sleep(server.latency)
+
+            if server._inject_error():
+                server._count('errors')
+                self._send(server.error_status, 'text/plain',
+                           b'Rate limit exceeded.')
+                return
+
+            url = urllib.parse.urlsplit(self.path)
+            query = dict(urllib.parse.parse_qsl(url.query))
+            status, content_type, body = server.respond(url.path, query)
+
+            etag = f'"{hashlib.sha1(body).hexdigest()}"'
+            if status == 200 and self.headers.get('If-None-Match') == etag:
+                server._count('not_modified')
+                self._send(304, content_type, b'', etag)
+                return
+
+            self._send(status, content_type, body,
+                       etag if status == 200 else None)
+
+        def _send(self, status: int, content_type: str, body: bytes,
+                  etag: Optional[str] = None):
+            self.send_response(status)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            if etag is not None:
+                self.send_header('ETag', etag)
+            self.end_headers()
+
+            # Throttle the body to the configured bandwidth
+            for start in range(0, len(body), _CHUNK_SIZE):
+                chunk = body[start:start + _CHUNK_SIZE]
+                self.wfile.write(chunk)
+                if server.bandwidth:
+                    time.sleep(len(chunk) / server.bandwidth)
+
+            server._count('bytes_sent', len(body))
+
+        def log_message(self, format_str, *args):
+            log.logger.debug('Stand-in server: ' + format_str % args)
+
+    return _Handler
+
+
+def record_fixtures(game_ids: Iterable[int] = (),
+                    usernames: Iterable[str] = (),
+                    searches: Iterable[str] = (),
+                    bgg_url: str = 'https://www.boardgamegeek.com/',
+                    fixtures_dir: Path = FIXTURES_DIR):
+    """ Records responses from the live BGG API as fixtures.
+
+    Image URLs in the recorded games and collections are pointed at the
+    stand-in server and the images themselves are recorded too.
+
+    :param game_ids: The games to record (with statistics).
+    :param usernames: The users whose collections will be recorded.
+    :param searches: The search queries to record.
+    :param bgg_url: The base URL of the live site.
+    :param fixtures_dir: The folder the fixtures are written to.
+    """
+    fixtures_dir = Path(fixtures_dir)
+    for folder in ('boardgame', 'collection', 'search', 'images'):
+        (fixtures_dir / folder).mkdir(parents=True, exist_ok=True)
+
+    def fetch(url: str) -> str:
+        for _ in range(10):
+            with urllib.request.urlopen(url) as response:
+                if response.status != 202:
+                    return response.read().decode('utf-8')
+            time.sleep(10)
+        raise IOError(f'BGG never generated the data at {url}.')
+
+    def localize_images(xml: str) -> str:
+        for image_url in set(re.findall(r'<image>\s*(.*?)\s*</image>', xml)):
+            name = image_url.rsplit('/', 1)[-1]
+            with urllib.request.urlopen(image_url) as response:
+                (fixtures_dir / 'images' / name).write_bytes(response.read())
+            xml = xml.replace(image_url, f'{_BASE_URL_TOKEN}images/{name}')
+        return xml
+
+    for game_id in game_ids:
+        xml = fetch(f'{bgg_url}xmlapi/boardgame/{game_id}?stats=1')
+        game = re.search(r'<boardgame .*</boardgame>', xml, re.DOTALL)
+        (fixtures_dir / 'boardgame' / f'{game_id}.xml').write_text(
+            localize_images(game.group(0)) + '\n', encoding='utf-8'
+        )
+
+    for username in usernames:
+        xml = fetch(f'{bgg_url}xmlapi/collection/'
+                    f'{urllib.parse.quote(username)}')
+        (fixtures_dir / 'collection' / f'{username.lower()}.xml').write_text(
+            localize_images(xml), encoding='utf-8'
+        )
+
+    for search_query in searches:
+        xml = fetch(f'{bgg_url}xmlapi/search?'
+                    f'search={urllib.parse.quote(search_query)}')
+        (fixtures_dir / 'search' / f'{search_query.casefold()}.xml') \
+            .write_text(xml, encoding='utf-8')
+
+
+if __name__ == '__main__':
+    with StandInServer(port=8713) as stand_in:
+        print(f'Serving the BGG stand-in at {stand_in.url}. '
+              f'Press Ctrl+C to stop.')
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
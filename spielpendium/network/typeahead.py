@@ -0,0 +1,113 @@
+"""Keystroke-driven game search.
+
+Suggestions for the typed text come straight from the local prefix index.
+BGG is only searched when the search cache can't answer the text, and a
+search that is made obsolete by newer keystrokes is cancelled.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Callable, List, Optional, Tuple
+
+from spielpendium import log
+from spielpendium.network.bgg_api_interface import iter_search_results
+from spielpendium.network.search_cache import search_cache, Suggestion
+
+__author__ = 'Eduardo Ruiz'
+
+__all__ = ['Typeahead']
+
+# Shorter texts match too many games to be worth sending to BGG
+_MIN_REMOTE_LENGTH = 3
+
+
+class Typeahead:
+    """Gives game suggestions for text as it is being typed."""
+
+    def __init__(self,
+                 callback: Callable[[str, List[Suggestion]], None],
+                 min_remote_length: int = _MIN_REMOTE_LENGTH,
+                 max_suggestions: int = 10):
+        """Initialize the Typeahead object.
+
+        :param callback: Called with the text and the updated suggestions
+               once a BGG search completes. It is called from a worker
+               thread.
+        :param min_remote_length: The minimum text length sent to BGG.
+        :param max_suggestions: The maximum number of suggestions.
+        """
+        self._callback = callback
+        self.min_remote_length = min_remote_length
+        self.max_suggestions = max_suggestions
+
+        self._executor = ThreadPoolExecutor(max_workers=2)
+        self._pending: Optional[Tuple[Future, threading.Event]] = None
+        # Guards the counters, which the worker threads update too
+        self._lock = threading.Lock()
+        self.remote_searches = 0
+        self.cancelled_searches = 0
+
+    def update(self, text: str) -> List[Suggestion]:
+        """ Handles new text in the search box.
+
+        :param text: The text typed so far.
+        :return: The suggestions available locally.
+        """
+        self.cancel()
+
+        if len(text.strip()) >= self.min_remote_length \
+                and search_cache.lookup(text) is None:
+            cancelled = threading.Event()
+            future = self._executor.submit(self._search, text, cancelled)
+            self._pending = (future, cancelled)
+
+        return search_cache.suggest(text, self.max_suggestions)
+
+    def cancel(self):
+        """Cancels the BGG search that is in flight, if there is one."""
+        if self._pending is None:
+            return
+
+        future, cancelled = self._pending
+        self._pending = None
+
+        if not future.done():
+            cancelled.set()
+            future.cancel()
+            with self._lock:
+                self.cancelled_searches += 1
+
+    def wait(self, timeout: Optional[float] = None):
+        """ Waits for the BGG search in flight to finish.
+
+        :param timeout: The maximum number of seconds to wait.
+        """
+        if self._pending is not None:
+            self._pending[0].exception(timeout)
+
+    def close(self):
+        """Cancels any search in flight and stops the worker threads."""
+        self.cancel()
+        self._executor.shutdown(wait=True)
+
+    def _search(self, text: str, cancelled: threading.Event):
+        with self._lock:
+            self.remote_searches += 1
+
+        items = []
+        try:
+            for item in iter_search_results(text):
+                # Stop reading as soon as the user has typed something else.
+                # Partial results are never cached.
+                if cancelled.is_set():
+                    log.logger.debug('Search for "%s" was cancelled.', text)
+                    return
+                items.append(item)
+        except OSError as err:
+            log.logger.error(f'Search for "{text}" failed. {err}')
+            return
+
+        search_cache.store(text, False, items)
+
+        if not cancelled.is_set():
+            self._callback(text, search_cache.suggest(text,
+                                                      self.max_suggestions))
@@ -0,0 +1,172 @@
+"""Incremental parsing of BGG API responses.
+
+Instead of building the whole document in memory, the response is fed to an
+XML pull parser as it arrives from the socket (or from the response cache).
+Every <item>/<boardgame> child of the root element is converted to the same
+dict structure xmltodict would have produced and is then freed, so memory use
+stays flat regardless of the size of the response.
+"""
+import time
+import xml.etree.ElementTree as ElementTree
+from typing import (Any, Callable, Dict, Iterable, Iterator, Optional,
+                    Tuple, Union)
+
+from spielpendium import log
+from spielpendium.network.response_cache import response_cache
+
+__author__ = 'Eduardo Ruiz'
+
+__all__ = ['iter_xml_items', 'parse_xml_items', 'iter_xml_elements',
+           'element_to_dict', 'STREAM_TAGS']
+
+STREAM_TAGS = ('item', 'boardgame')
+
+_QUEUED_TAG = 'message'
+_MAX_CHECKS = 10
+_TIME_BETWEEN_CHECKS = 10
+
+
+def element_to_dict(element: ElementTree.Element) -> Union[Dict, str, None]:
+    """ Converts an element to the structure xmltodict produces for it.
+
+    Attributes become '@' keys, repeated children become lists and text
+    becomes either the value itself or a '#text' key.
+
+    :param element: The XML element.
+    :return: The converted element.
+    """
+    result = {f'@{key}': value for key, value in element.attrib.items()}
+
+    text = [element.text] if element.text else []
+    for child in element:
+        value = element_to_dict(child)
+        if child.tag in result:
+            if isinstance(result[child.tag], list):
+                result[child.tag].append(value)
+            else:
+                result[child.tag] = [result[child.tag], value]
+        else:
+            result[child.tag] = value
+
+        if child.tail:
+            text.append(child.tail)
+
+    text = ''.join(text).strip()
+    if not result:
+        return text or None
+    if text:
+        result['#text'] = text
+
+    return result
+
+
+def iter_xml_elements(chunks: Iterable[bytes],
+                      tags: Tuple[str, ...] = STREAM_TAGS) \
+        -> Iterator[Tuple[str, Optional[ElementTree.Element]]]:
+    """ Parses pieces of an XML document and yields the children of its root
+    as elements.
+
+    Each element is freed as soon as the next one is requested, so it has to
+    be used (or converted) before moving on.
+
+    :param chunks: The pieces of the XML document.
+    :param tags: The tags of the root's children that will be yielded.
+    :return: An iterator of (root tag, element) pairs. If the root element
+             has no matching children, a single (root tag, None) pair is
+             yielded once the document is complete.
+    """
+    parser = ElementTree.XMLPullParser(events=('start', 'end'))
+    root: Optional[ElementTree.Element] = None
+    depth = 0
+    num_items = 0
+
+    for chunk in chunks:
+        parser.feed(chunk)
+        for event, element in parser.read_events():
+            if event == 'start':
+                if root is None:
+                    root = element
+                depth += 1
+                continue
+
+            depth -= 1
+            if depth == 1 and element.tag in tags:
+                num_items += 1
+                yield root.tag, element
+
+                # Free the subtree that was just handed out
+                root.clear()
+
+    parser.close()
+
+    if root is not None and num_items == 0:
+        yield root.tag, None
+
+
+def parse_xml_items(chunks: Iterable[bytes],
+                    tags: Tuple[str, ...] = STREAM_TAGS,
+                    convert: Callable[[ElementTree.Element], Any]
+                    = element_to_dict) -> Iterator[Tuple[str, Any]]:
+    """ Parses pieces of an XML document and yields the children of its root.
+
+    :param chunks: The pieces of the XML document.
+    :param tags: The tags of the root's children that will be yielded.
+    :param convert: The function converting each child element. By default,
+           the children are converted to dicts.
+    :return: An iterator of (root tag, item) pairs. If the root element has
+             no matching children, a single (root tag, None) pair is yielded
+             once the document is complete.
+    """
+    for root_tag, element in iter_xml_elements(chunks, tags):
+        yield root_tag, None if element is None else convert(element)
+
+
+def iter_xml_items(url: str, tags: Tuple[str, ...] = STREAM_TAGS,
+                   revalidate: bool = False,
+                   chunk_size: int = 64 * 1024,
+                   convert: Callable[[ElementTree.Element], Any]
+                   = element_to_dict) -> Iterator[Any]:
+    """ Pulls XML info from the web and yields its items one at a time.
+
+    This is the streaming counterpart of get_xml_info. If the API answers
+    that the data is still being generated, the request is repeated until
+    it's ready.
+
+    :param url: The URL that will be pulled to get XML data.
+    :param tags: The tags of the root's children that will be yielded.
+    :param revalidate: Whether to check with BGG even if the cached response
+           is still fresh.
+    :param chunk_size: The size of the pieces read from the socket.
+    :param convert: The function converting each item. By default, the
+           items are converted to dicts.
+    :raises urllib.error.HTTPError: If there's any error in retrieving data at
+            the URL.
+    :return: An iterator over the converted items.
+    """
+    for check in range(_MAX_CHECKS):
+        queued = False
+        chunks = response_cache.stream(url, revalidate, chunk_size)
+
+        try:
+            for root_tag, item in parse_xml_items(chunks, tags, convert):
+                if root_tag == _QUEUED_TAG:
+                    queued = True
+                    break
+                if item is not None:
+                    yield item
+        finally:
+            # Release the connection even if the caller stops early
+            chunks.close()
+
+        if not queued:
+            log.logger.info(f'Data successfully streamed from {url}.')
+            return
+
+        if check + 1 >= _MAX_CHECKS:
+            log.logger.error(f'API did not generate data at {url} after '
+                             f'checking {_MAX_CHECKS} times. '
+                             f'Try again later.')
+            return
+
+        log.logger.info(f'Waiting for API to generate data at {url}.')
+        time.sleep(_TIME_BETWEEN_CHECKS)
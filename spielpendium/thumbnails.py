@@ -0,0 +1,287 @@
+"""Images of games at several sizes.
+
+A Thumbnails object holds the image of a game scaled down to each of the
+THUMBNAIL_SIZES, plus the original as it was downloaded. The scaling is done
+once, when the image arrives, so views only ever pick the level that fits the
+size they draw at. Each level is encoded (as PNG) or decoded only when it's
+first needed, and the pixmaps handed to views are kept.
+
+QImages can be made and scaled in any thread, so Thumbnails can be built by
+worker threads. QPixmaps can only be made in the GUI thread, by pixmap().
+"""
+import struct
+from typing import Dict, List, Optional, Tuple, Union
+
+from PyQt5 import QtCore, QtGui
+
+from spielpendium import log
+from spielpendium.constants import (IMAGE_SIZE, KEEP_ORIGINAL_IMAGES,
+                                    THUMBNAIL_SIZES)
+
+__author__ = 'Eduardo Ruiz'
+
+__all__ = ['Thumbnails']
+
+# Header of the serialized form: magic, format version and number of levels,
+# then the size and length of each level. The original has size 0.
+_MAGIC = b'SPTN'
+_HEADER = struct.Struct('<4sBB')
+_LEVEL = struct.Struct('<HI')
+_FORMAT_VERSION = 1
+_ORIGINAL = 0
+
+
+def _encode(image: QtGui.QImage) -> bytes:
+    buffer = QtCore.QBuffer()
+    buffer.open(QtCore.QBuffer.ReadWrite)
+    image.save(buffer, 'PNG')
+    data = bytes(buffer.data())
+    buffer.close()
+    log.count('images.encoded')
+    return data
+
+
+class Thumbnails:
+    """ An image at several sizes.
+
+    Every level is the image scaled to fit a square of that size, keeping
+    its aspect ratio. Levels that wouldn't be smaller than the original are
+    left out, the original is used for them instead.
+
+    :param levels: The encoded (bytes) or decoded (QImage) image of each
+           level, by size. The original has size 0.
+    """
+
+    def __init__(self, levels: Dict[int, Union[bytes, QtGui.QImage]] = None):
+        self._encoded: Dict[int, bytes] = {}
+        self._images: Dict[int, QtGui.QImage] = {}
+        self._pixmaps: Dict[Tuple[int, int, float], QtGui.QPixmap] = {}
+
+        for size, level in (levels or {}).items():
+            if isinstance(level, QtGui.QImage):
+                self._images[size] = level
+            else:
+                self._encoded[size] = level
+
+    @classmethod
+    def from_data(cls, data: Optional[bytes],
+                  sizes: Tuple[int, ...] = THUMBNAIL_SIZES,
+                  keep_original: bool = KEEP_ORIGINAL_IMAGES) -> 'Thumbnails':
+        """ Makes the thumbnails of an encoded image, e.g. a download.
+
+        :param data: The image file, in any format Qt can read.
+        :param sizes: The sizes of the levels.
+        :param keep_original: Whether to keep the original as well, instead
+               of just the levels.
+        :return: The thumbnails. Null if the data isn't a valid image.
+        """
+        image = QtGui.QImage.fromData(data or b'')
+        if image.isNull():
+            return cls()
+        log.count('images.decoded')
+
+        levels, needs_original = cls._scaled(image, sizes)
+        if keep_original or needs_original:
+            # Kept as it was downloaded, rather than encoded again
+            levels[_ORIGINAL] = bytes(data)
+
+        return cls(levels)
+
+    @classmethod
+    def from_image(cls, image: Union[QtGui.QImage, QtGui.QPixmap, None],
+                   sizes: Tuple[int, ...] = THUMBNAIL_SIZES) -> 'Thumbnails':
+        """ Makes the thumbnails of an image, which is kept as the original.
+
+        :param image: The image.
+        :param sizes: The sizes of the levels.
+        :return: The thumbnails.
+        """
+        if isinstance(image, QtGui.QPixmap):
+            image = image.toImage()
+        if image is None or image.isNull():
+            return cls()
+
+        levels, _ = cls._scaled(image, sizes)
+        levels[_ORIGINAL] = image
+        return cls(levels)
+
+    @staticmethod
+    def _scaled(image: QtGui.QImage, sizes: Tuple[int, ...]) \
+            -> Tuple[Dict[int, QtGui.QImage], bool]:
+        """Returns the levels smaller than the image, and whether the original
+        is needed for the larger sizes."""
+        levels = {}
+        largest = max(image.width(), image.height())
+        for size in sorted(sizes):
+            if size >= largest:
+                return levels, True
+            levels[size] = image.scaled(size, size,
+                                        QtCore.Qt.KeepAspectRatio,
+                                        QtCore.Qt.SmoothTransformation)
+
+        return levels, False
+
+    @classmethod
+    def of(cls, image: Union['Thumbnails', QtGui.QImage, QtGui.QPixmap,
+                             None]) -> 'Thumbnails':
+        """ Returns the thumbnails of whatever is in the Image column of a
+        row.
+
+        :param image: Thumbnails, which are returned as they are, or an image.
+        :return: The thumbnails.
+        """
+        if isinstance(image, Thumbnails):
+            return image
+        if isinstance(image, (QtGui.QImage, QtGui.QPixmap)):
+            return cls.from_image(image)
+        return cls()
+
+    @classmethod
+    def from_bytes(cls, data: Optional[bytes]) -> 'Thumbnails':
+        """ Reads thumbnails made by to_bytes.
+
+        Anything else is taken to be a single image file, e.g. from a
+        database written before there were thumbnails.
+
+        :param data: The serialized thumbnails.
+        :return: The thumbnails.
+        """
+        if not data:
+            return cls()
+        if not data.startswith(_MAGIC):
+            return cls.from_data(data)
+
+        _, _, count = _HEADER.unpack_from(data)
+        offset = _HEADER.size + count * _LEVEL.size
+        levels = {}
+        for ii in range(count):
+            size, length = _LEVEL.unpack_from(
+                data, _HEADER.size + ii * _LEVEL.size
+            )
+            levels[size] = data[offset:offset + length]
+            offset += length
+
+        return cls(levels)
+
+    def to_bytes(self) -> bytes:
+        """ Serializes the thumbnails, e.g. for the database.
+
+        :return: The thumbnails, with each level as a PNG file and the
+                 original as it was downloaded.
+        """
+        levels = self.encoded()
+        header = _HEADER.pack(_MAGIC, _FORMAT_VERSION, len(levels))
+        sizes = b''.join(_LEVEL.pack(size, len(data))
+                         for size, data in levels.items())
+        return header + sizes + b''.join(levels.values())
+
+    def encoded(self) -> Dict[int, bytes]:
+        """ Returns every level as an image file.
+
+        :return: The files by size, smallest first, with the original (size
+                 0) last.
+        """
+        for size, image in self._images.items():
+            if size not in self._encoded:
+                self._encoded[size] = _encode(image)
+
+        return {size: self._encoded[size]
+                for size in self._sort(self._encoded)}
+
+    @property
+    def sizes(self) -> List[int]:
+        """The sizes of the levels, smallest first, without the original."""
+        return [size for size in self._sort({**self._encoded, **self._images})
+                if size != _ORIGINAL]
+
+    @staticmethod
+    def _sort(levels) -> List[int]:
+        # The original is the largest
+        return sorted(levels, key=lambda size: (size == _ORIGINAL, size))
+
+    def _level_for(self, size: int) -> Optional[int]:
+        levels = self._sort({**self._encoded, **self._images})
+        for level in levels:
+            if level == _ORIGINAL or level >= size:
+                return level
+
+        # Without an original, the largest level is as good as it gets
+        return levels[-1] if levels else None
+
+    def image(self, size: int = IMAGE_SIZE) -> QtGui.QImage:
+        """ Returns the smallest level that is at least size.
+
+        :param size: The size the image is drawn at, in device pixels.
+        :return: The image, without any scaling. Null if there's no image.
+        """
+        level = self._level_for(size)
+        if level is None:
+            return QtGui.QImage()
+        return self._level(level)
+
+    def pixmap(self, size: int = IMAGE_SIZE,
+               device_pixel_ratio: float = 1.0) -> QtGui.QPixmap:
+        """ Returns a pixmap to draw the image at a size.
+
+        The pixmap of each level is made once and then reused. Its device
+        pixel ratio is set so that it's drawn at about size logical pixels
+        without being scaled. Only call this from the GUI thread.
+
+        :param size: The size the image is drawn at, in logical pixels.
+        :param device_pixel_ratio: The device pixel ratio of the screen.
+        :return: The pixmap.
+        """
+        device_size = round(size * device_pixel_ratio)
+        key = (self._level_for(device_size), size, device_pixel_ratio)
+        if key not in self._pixmaps:
+            pixmap = QtGui.QPixmap.fromImage(self.image(device_size))
+            if not pixmap.isNull():
+                # Images smaller than size are drawn at their own size
+                pixmap.setDevicePixelRatio(max(
+                    max(pixmap.width(), pixmap.height()) / size,
+                    device_pixel_ratio
+                ))
+            self._pixmaps[key] = pixmap
+
+        return self._pixmaps[key]
+
+    def is_null(self) -> bool:
+        """Whether there's no image at all."""
+        return not self._encoded and not self._images
+
+    def _level(self, size: int) -> QtGui.QImage:
+        if size not in self._images:
+            self._images[size] = QtGui.QImage.fromData(self._encoded[size])
+            log.count('images.decoded')
+        return self._images[size]
+
+    def _level_equal(self, other: 'Thumbnails', size: int) -> bool:
+        if size in self._encoded and size in other._encoded:
+            return self._encoded[size] == other._encoded[size]
+        return self._level(size) == other._level(size)
+
+    def __eq__(self, other) -> bool:
+        """ Whether two thumbnails hold the same image at the same sizes.
+
+        The levels are made from the original, so when both were downloaded
+        only the original files are compared. Otherwise each level is, as
+        files if both have them encoded or else pixel by pixel. Nothing is
+        ever encoded to compare.
+        """
+        if not isinstance(other, Thumbnails):
+            return NotImplemented
+
+        levels = set(self._encoded) | set(self._images)
+        if levels != set(other._encoded) | set(other._images):
+            return False
+
+        if _ORIGINAL in self._encoded and _ORIGINAL in other._encoded:
+            return self._encoded[_ORIGINAL] == other._encoded[_ORIGINAL]
+        return all(self._level_equal(other, size) for size in levels)
+
+    # Equal thumbnails can have their levels in different forms, so there's
+    # no cheap hash that agrees with __eq__
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        return f'Thumbnails(sizes={self.sizes})'
@@ -0,0 +1,13 @@
+"""Keeps what the tests write out of the repository."""
+import atexit
+import os
+import shutil
+import tempfile
+
+__author__ = 'Eduardo Ruiz'
+
+# Set before any test imports spielpendium.log. Registered before the log's
+# own exit handler, so it runs after the last record is written.
+_log_dir = tempfile.mkdtemp(prefix='spielpendium-log-')
+os.environ.setdefault('SPIELPENDIUM_LOG_DIR', _log_dir)
+atexit.register(shutil.rmtree, _log_dir, True)
@@ -0,0 +1,50 @@
+"""Test helper that points the BGG API at a local stand-in server."""
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+from PyQt5 import QtGui
+
+from spielpendium.network import bgg_api_interface
+from spielpendium.network.stand_in_server import StandInServer, FIXTURES_DIR
+
+__author__ = 'Eduardo Ruiz'
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+
+class StandInServerMixin:
+    """Mixin for TestCases that talk to a StandInServer instead of BGG.
+
+    Every test gets a server of its own. Tests that change the recorded
+    responses set copy_fixtures, and edit the copy in self.fixtures_dir.
+    """
+    # Keyword arguments of the StandInServer
+    server_options = {'queued_responses': 0}
+    copy_fixtures = False
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.app = QtGui.QGuiApplication.instance() or QtGui.QGuiApplication([])
+
+    def setUp(self):
+        super().setUp()
+        self.fixtures_dir = FIXTURES_DIR
+        if self.copy_fixtures:
+            self.fixtures_dir = Path(tempfile.mkdtemp())
+            shutil.copytree(FIXTURES_DIR, self.fixtures_dir,
+                            dirs_exist_ok=True)
+
+        self.server = StandInServer(self.fixtures_dir, **self.server_options)
+        self.server.start()
+        self.original_url = bgg_api_interface.get_bgg_url()
+        bgg_api_interface.set_bgg_url(self.server.url)
+
+    def tearDown(self):
+        bgg_api_interface.set_bgg_url(self.original_url)
+        self.server.stop()
+        if self.copy_fixtures:
+            shutil.rmtree(self.fixtures_dir)
+        super().tearDown()
@@ -0,0 +1,33 @@
+"""Test helper that points the database layer at a throwaway file."""
+import tempfile
+from pathlib import Path
+from unittest import mock
+
+from spielpendium import database
+
+__author__ = 'Eduardo Ruiz'
+
+
+class TemporaryDatabaseMixin:
+    """Mixin for TestCases that need a freshly created database."""
+
+    def setUp(self):
+        super().setUp()
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        db_dir = Path(self.tmp_dir.name)
+        self.db_patches = [
+            mock.patch('spielpendium.database.database.DB_DIR', db_dir),
+            mock.patch('spielpendium.database.database.DB_FILE',
+                       db_dir / 'test.sqlite'),
+        ]
+        for patch in self.db_patches:
+            patch.start()
+        database.create()
+
+    def tearDown(self):
+        database.flush_writes()
+        database.close_all()
+        for patch in self.db_patches:
+            patch.stop()
+        self.tmp_dir.cleanup()
+        super().tearDown()
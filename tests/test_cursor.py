@@ -0,0 +1,82 @@
+import unittest
+
+from spielpendium import database
+from temporary_database import TemporaryDatabaseMixin
+
+__author__ = 'Eduardo Ruiz'
+
+_NUM_ROWS = 1000
+
+
+class TestCursor(TemporaryDatabaseMixin, unittest.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        database.query('CREATE TABLE Bulk (id INTEGER PRIMARY KEY, '
+                       'name TEXT NOT NULL, data BLOB)')
+        database.execute_many(
+            'INSERT INTO Bulk (id, name, data) VALUES (?, ?, ?)',
+            [(ii, f'game {ii}', bytes([ii % 256]) * 1000)
+             for ii in range(_NUM_ROWS)]
+        )
+
+    def test_row_shape(self):
+        # Two columns from one parameter, and three from none
+        self.assertEqual(
+            list(database.iter_rows('SELECT id, name FROM Bulk WHERE id < ?',
+                                    [2])),
+            [(0, 'game 0'), (1, 'game 1')]
+        )
+        self.assertEqual(database.query('SELECT id, name FROM Bulk '
+                                        'WHERE id = ?', [1]), [1, 'game 1'])
+
+        with database.cursor('SELECT * FROM Bulk') as rows:
+            self.assertEqual(rows.columns, ('id', 'name', 'data'))
+            self.assertEqual(len(rows.fetchone()), 3)
+
+    def test_named(self):
+        rows = list(database.iter_rows(
+            'SELECT name, length(data) FROM Bulk WHERE id IN (5, 6)',
+            named=True
+        ))
+        self.assertEqual([row.name for row in rows], ['game 5', 'game 6'])
+        # Names that aren't identifiers are replaced
+        self.assertEqual(rows[0]._1, 1000)
+
+        row, = database.iter_rows('SELECT COUNT(*) AS games FROM Bulk',
+                                  named=True)
+        self.assertEqual(row.games, _NUM_ROWS)
+
+    def test_streamed(self):
+        with database.cursor('SELECT id, data FROM Bulk ORDER BY id') as rows:
+            first = rows.fetchmany(10)
+            self.assertEqual([row[0] for row in first], list(range(10)))
+            self.assertEqual(first[3][1], bytes([3]) * 1000)
+            # Nothing past what was asked for has been read
+            self.assertEqual(rows.rows_read, 10)
+
+            self.assertEqual(len(rows.fetchall()), _NUM_ROWS - 10)
+            self.assertIsNone(rows.fetchone())
+
+    def test_batches(self):
+        sizes = [len(batch) for batch in
+                 database.iter_batches('SELECT id FROM Bulk', batch_size=300)]
+        self.assertEqual(sizes, [300, 300, 300, 100])
+        self.assertEqual(
+            list(database.iter_batches('SELECT id FROM Bulk WHERE id < 0')),
+            []
+        )
+
+    def test_statements_without_rows(self):
+        cursor = database.cursor('DELETE FROM Bulk WHERE id = ?', [1])
+        self.assertEqual(cursor.fetchall(), [])
+        self.assertEqual(database.query('SELECT COUNT(*) FROM Bulk'),
+                         [_NUM_ROWS - 1])
+
+    def test_errors(self):
+        with self.assertRaises(IOError):
+            database.cursor('SELECT nothing FROM Nowhere')
+
+
+if __name__ == '__main__':
+    unittest.main()
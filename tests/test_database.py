@@ -0,0 +1,444 @@
+import gc
+import os
+import threading
+import time
+import unittest
+from unittest import mock
+
+from PyQt5 import QtCore, QtGui
+
+from spielpendium import database
+from spielpendium.data.games_db import read_games, search_games
+from spielpendium.database.scripts import Migration, SQLScripts
+from spielpendium.network.bgg_api_interface import (get_user_info,
+                                                    save_user_xml)
+from temporary_database import TemporaryDatabaseMixin
+
+__author__ = 'Eduardo Ruiz'
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+_NUM_QUERIES = 20
+
+
+class TestConnections(TemporaryDatabaseMixin, unittest.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        database.reset_statistics()
+
+    def test_connection_reused(self):
+        for _ in range(_NUM_QUERIES):
+            database.query('SELECT 1')
+
+        stats = database.statistics()
+        self.assertEqual(stats['opens'], 0)
+        self.assertEqual(stats['queries'], _NUM_QUERIES)
+        self.assertEqual(stats['open_connections'], 1)
+
+    def test_disconnect(self):
+        first = database.connection().connectionName()
+        database.disconnect()
+
+        self.assertEqual(database.statistics()['open_connections'], 0)
+        self.assertEqual(database.query('SELECT 1'), [1])
+        self.assertNotEqual(database.connection().connectionName(), first)
+
+    def test_one_connection_per_thread(self):
+        names = []
+        barrier = threading.Barrier(3)
+
+        def worker():
+            database.query('SELECT 1')
+            names.append(database.connection().connectionName())
+            barrier.wait()
+
+        threads = [threading.Thread(target=worker) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(set(names)), 3)
+        self.assertEqual(database.statistics()['opens'], 3)
+
+        # Connections are dropped once their threads are gone
+        gc.collect()
+        self.assertEqual(database.statistics()['open_connections'], 1)
+
+    def test_close_all_leaves_other_threads_to_close_theirs(self):
+        names = []
+        opened, closed = threading.Event(), threading.Event()
+
+        def worker():
+            database.query('SELECT 1')
+            names.append(database.connection().connectionName())
+            opened.set()
+            closed.wait(5)
+            database.query('SELECT 1')
+            names.append(database.connection().connectionName())
+
+        thread = threading.Thread(target=worker)
+        thread.start()
+        opened.wait(5)
+
+        database.close_all()
+        # Only the worker itself can close its connection
+        self.assertEqual(database.statistics()['open_connections'], 1)
+
+        closed.set()
+        thread.join()
+        self.assertNotEqual(names[0], names[1])
+        gc.collect()
+        self.assertEqual(database.statistics()['open_connections'], 0)
+
+    def test_reopened_when_file_changes(self):
+        database.query('SELECT 1')
+        old_file = database.database.DB_FILE
+
+        with mock.patch('spielpendium.database.database.DB_FILE',
+                        old_file.with_name('other.sqlite')):
+            database.query('SELECT 1')
+            self.assertEqual(database.connection().databaseName(),
+                             str(old_file.with_name('other.sqlite')))
+
+        # Back to the original file
+        database.query('SELECT 1')
+        self.assertEqual(database.statistics()['opens'], 2)
+
+
+
+class TestBulkWrites(TemporaryDatabaseMixin, unittest.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        database.query('CREATE TABLE Bulk (id INTEGER PRIMARY KEY, '
+                       'name TEXT NOT NULL, data BLOB)')
+
+    def _count(self) -> int:
+        return database.query('SELECT COUNT(*) FROM Bulk')[0]
+
+    def test_execute_many(self):
+        rows = [(ii, f'game {ii}', bytes([ii % 256])) for ii in range(1000)]
+
+        self.assertEqual(database.execute_many(
+            'INSERT INTO Bulk (id, name, data) VALUES (?, ?, ?)', rows
+        ), 1000)
+        self.assertEqual(self._count(), 1000)
+        self.assertEqual(database.query('SELECT name, data FROM Bulk '
+                                        'WHERE id = 258'),
+                         ['game 258', bytes([2])])
+
+    def test_upsert(self):
+        command = ('INSERT INTO Bulk (id, name) VALUES (?, ?) '
+                   'ON CONFLICT(id) DO UPDATE SET name = excluded.name')
+        database.execute_many(command, [(1, 'old'), (2, 'old')])
+        database.execute_many(command, [(2, 'new'), (3, 'new')])
+
+        self.assertEqual(database.query('SELECT name FROM Bulk ORDER BY id'),
+                         ['old', 'new', 'new'])
+
+    def test_rollback(self):
+        with self.assertRaises(IOError):
+            database.bulk_write([
+                ('INSERT INTO Bulk (id, name) VALUES (?, ?)',
+                 [(1, 'a'), (2, 'b')]),
+                ('INSERT INTO Bulk (id, name) VALUES (?, ?)',
+                 [(3, 'c'), (4, None)]),
+            ])
+
+        self.assertEqual(self._count(), 0)
+
+        # The connection is still usable afterwards
+        database.execute_many('INSERT INTO Bulk (id, name) VALUES (?, ?)',
+                              [(1, 'a')])
+        self.assertEqual(self._count(), 1)
+
+    def test_transaction_block(self):
+        with self.assertRaises(ValueError):
+            with database.transaction():
+                database.query('INSERT INTO Bulk (id, name) VALUES (1, "a")')
+                raise ValueError('Nope')
+
+        self.assertEqual(self._count(), 0)
+
+    def test_speed(self):
+        rows = [(ii, f'game {ii}', None) for ii in range(10_000)]
+
+        start = time.perf_counter()
+        database.execute_many(
+            'INSERT INTO Bulk (id, name, data) VALUES (?, ?, ?)', rows
+        )
+        self.assertLess(time.perf_counter() - start, 1)
+
+
+class TestStatementCache(TemporaryDatabaseMixin, unittest.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        # Starts without the statements prepared by create()
+        database.disconnect()
+        database.reset_statistics()
+
+    def test_reused(self):
+        for ii in range(_NUM_QUERIES):
+            self.assertFalse(database.query(SQLScripts.user_exists,
+                                            [f'user {ii}'])[0])
+
+        database.query(SQLScripts.save_user_xml,
+                       ['user 3', b'<items/>', None])
+        self.assertTrue(database.query(SQLScripts.user_exists, ['user 3'])[0])
+        self.assertEqual(database.query(SQLScripts.get_user_xml, ['user 3']),
+                         [b'<items/>'])
+
+        stats = database.statistics()
+        self.assertEqual(stats['statement_misses'], 3)
+        self.assertEqual(stats['statement_hits'], _NUM_QUERIES)
+
+    def test_bounded(self):
+        with mock.patch.object(database.database._connections,
+                               'statement_cache_size', 2):
+            for ii in range(5):
+                database.query(f'SELECT {ii}')
+            database.query('SELECT 4')
+
+        stats = database.statistics()
+        self.assertEqual(stats['cached_statements'], 2)
+        self.assertEqual(stats['statement_evictions'], 3)
+        self.assertEqual(stats['statement_hits'], 1)
+
+    def test_usable_after_failure(self):
+        database.query('CREATE TABLE Bulk (id INTEGER PRIMARY KEY, '
+                       'name TEXT NOT NULL)')
+        command = 'INSERT INTO Bulk (id, name) VALUES (?, ?)'
+
+        with self.assertRaises(IOError):
+            database.query(command, [1, None])
+        database.query(command, [1, 'a'])
+
+        self.assertEqual(database.query('SELECT name FROM Bulk'), ['a'])
+
+    def test_dropped_with_connection(self):
+        database.query('SELECT 1')
+        database.disconnect()
+        self.assertEqual(database.statistics()['cached_statements'], 0)
+
+        self.assertEqual(database.query('SELECT 1'), [1])
+
+
+class TestSettings(TemporaryDatabaseMixin, unittest.TestCase):
+
+    def test_pragmas_applied(self):
+        settings = database.settings()
+        self.assertEqual(settings['journal_mode'], 'wal')
+        self.assertEqual(settings['synchronous'], 1)  # NORMAL
+        self.assertEqual(settings['temp_store'], 2)  # MEMORY
+        self.assertEqual(settings['cache_size'], -20_000)
+
+    def test_custom_pragmas(self):
+        with mock.patch.dict('spielpendium.database.database.DB_PRAGMAS',
+                             {'synchronous': 'FULL'}):
+            database.disconnect()
+            self.assertEqual(database.settings()['synchronous'], 2)
+
+
+class TestMigrations(TemporaryDatabaseMixin, unittest.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        database.query('INSERT INTO Searches (query, date_time) '
+                       "VALUES ('Catan', '2021-01-01')")
+
+    def _searches(self):
+        return database.query('SELECT query FROM Searches')
+
+    def test_new_database(self):
+        self.assertEqual(database.schema_version(),
+                         len(SQLScripts.migrations))
+
+    def test_up_to_date(self):
+        database.reset_statistics()
+        self.assertEqual(database.create(), [])
+        # Only the version was read
+        self.assertLessEqual(database.statistics()['queries'], 2)
+        self.assertEqual(self._searches(), ['Catan'])
+
+    def test_data_migrated_in_place(self):
+        migration = Migration(len(SQLScripts.migrations) + 1, 'lower_case', (
+            'ALTER TABLE Searches ADD COLUMN lower_query TEXT',
+            'UPDATE Searches SET lower_query = lower(query)',
+        ))
+        migrations = SQLScripts.migrations + (migration,)
+
+        self.assertEqual(database.migrate(migrations), [migration.version])
+        self.assertEqual(database.query('SELECT query, lower_query '
+                                        'FROM Searches'), ['Catan', 'catan'])
+        self.assertEqual(database.schema_version(), migration.version)
+        self.assertEqual(database.migrate(migrations), [])
+
+    def test_failed_migration(self):
+        version = database.schema_version()
+        migration = Migration(version + 1, 'broken', (
+            "DELETE FROM Searches",
+            'INSERT INTO Nowhere VALUES (1)',
+        ))
+
+        with self.assertRaises(IOError):
+            database.migrate(SQLScripts.migrations + (migration,))
+
+        self.assertEqual(database.schema_version(), version)
+        self.assertEqual(self._searches(), ['Catan'])
+
+
+class TestUnversionedDatabase(TemporaryDatabaseMixin, unittest.TestCase):
+    """A database made before there were versions, with its data."""
+
+    _XML = ('<items totalitems="1"><item objectid="13">'
+            '<name>Catan</name></item></items>')
+
+    @classmethod
+    def setUpClass(cls):
+        cls.app = QtGui.QGuiApplication.instance() or QtGui.QGuiApplication([])
+
+    def setUp(self):
+        super().setUp()
+        # Starts over with the tables as they were then
+        database.close_all()
+        database.database.DB_FILE.unlink()
+        database.migrate(SQLScripts.migrations[:1])
+        database.query('DROP TABLE Schema_Version')
+
+        image = QtGui.QImage(8, 8, QtGui.QImage.Format_RGB32)
+        image.fill(QtGui.QColor('red'))
+        buffer = QtCore.QBuffer()
+        buffer.open(QtCore.QIODevice.WriteOnly)
+        image.save(buffer, 'PNG')
+
+        database.query_batch((
+            "INSERT INTO Publishers VALUES (1, 'Kosmos')",
+            "INSERT INTO People VALUES (1, 'Klaus Teuber')",
+            'INSERT INTO Authors VALUES (1, 1)',
+            "INSERT INTO Categories VALUES (1, 'Negotiation')",
+            'INSERT INTO Author_Game VALUES (1, 13)',
+            'INSERT INTO Games_Categories VALUES (1, 13)',
+            "INSERT INTO User_Lists VALUES "
+            f"(1, 'someone', '{self._XML}', '2021-01-01')",
+        ))
+        database.query('INSERT INTO Games VALUES (13, ?, ?, NULL, 1, ?, ?, '
+                       '1, 1995, 3, 4, NULL, 10, 60, 120, 7.1, 400, 2.3)',
+                       ['2021-01-01', 'Catan', bytes(buffer.data()),
+                        'Trade and build on the island.'])
+
+    def test_migrated(self):
+        self.assertEqual(database.create(), [
+            migration.version for migration in SQLScripts.migrations
+        ])
+        self.assertEqual(database.create(), [])
+
+        game = read_games([13]).iloc[0]
+        self.assertEqual(game['Name'], 'Catan')
+        self.assertEqual(game['Publisher']['#text'], 'Kosmos')
+        self.assertEqual(game['Author'], 'Klaus Teuber')
+        self.assertEqual(game['Category'], 'Negotiation')
+        self.assertEqual(game['Version'], 1)
+        self.assertEqual(game['Image'].image().size(), QtCore.QSize(8, 8))
+        self.assertEqual(search_games('teuber island'), [13])
+
+        info = get_user_info('someone')
+        self.assertEqual(info['items']['item']['name'], 'Catan')
+        save_user_xml('someone', self._XML.replace('Catan', 'Catan 2'))
+        self.assertEqual(
+            get_user_info('someone')['items']['item']['name'], 'Catan 2'
+        )
+
+    def test_duplicate_publisher_names(self):
+        database.create()
+        database.query("INSERT INTO Publishers VALUES (2, 'Kosmos')")
+        self.assertEqual(database.query('SELECT COUNT(*) FROM Publishers'),
+                         [2])
+
+
+class TestBackgroundWriter(TemporaryDatabaseMixin, unittest.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        database.query('CREATE TABLE Bulk (id INTEGER PRIMARY KEY, '
+                       'name TEXT NOT NULL)')
+        database.reset_statistics()
+        self.release = threading.Event()
+
+    def tearDown(self):
+        self.release.set()
+        super().tearDown()
+
+    def _count(self) -> int:
+        return database.query('SELECT COUNT(*) FROM Bulk')[0]
+
+    def _block_writer(self):
+        """Keeps the writer busy until self.release is set."""
+        started = threading.Event()
+
+        def wait():
+            started.set()
+            self.release.wait(5)
+
+        database.queue_write(wait)
+        started.wait(5)
+
+    def test_writes_batched(self):
+        self._block_writer()
+        futures = [database.queue_query('INSERT INTO Bulk (id, name) '
+                                        'VALUES (?, ?)', [ii, f'game {ii}'])
+                   for ii in range(100)]
+        self.release.set()
+
+        self.assertTrue(database.flush_writes(5))
+        self.assertTrue(all(future.result() for future in futures))
+        self.assertEqual(self._count(), 100)
+
+        stats = database.statistics()
+        self.assertEqual(stats['queued_writes'], 102)
+        self.assertLessEqual(stats['write_batches'], 3)
+        self.assertEqual(stats['pending_writes'], 0)
+
+    def test_failure_only_fails_its_write(self):
+        self._block_writer()
+        command = 'INSERT INTO Bulk (id, name) VALUES (?, ?)'
+        good = database.queue_query(command, [1, 'a'])
+        bad = database.queue_query(command, [2, None])
+        rows = database.queue_execute_many(command, [(3, 'c'), (4, 'd')])
+        self.release.set()
+
+        self.assertTrue(good.result(5))
+        self.assertEqual(rows.result(5), 2)
+        with self.assertRaises(IOError):
+            bad.result(5)
+        self.assertEqual(self._count(), 3)
+
+    def test_runs_on_writer_thread(self):
+        future = database.queue_write(lambda: threading.current_thread().name)
+        self.assertEqual(future.result(5), 'spielpendium-db-writer')
+
+    def test_readers_not_blocked(self):
+        inserted = threading.Event()
+
+        def slow_write():
+            database.query('INSERT INTO Bulk (id, name) VALUES (1, "a")')
+            inserted.set()
+            self.release.wait(5)
+
+        database.queue_write(slow_write)
+        self.assertTrue(inserted.wait(5))
+
+        # The write isn't committed yet, but reading doesn't wait for it
+        start = time.perf_counter()
+        self.assertEqual(self._count(), 0)
+        self.assertLess(time.perf_counter() - start, 0.5)
+
+        self.release.set()
+        database.flush_writes(5)
+        self.assertEqual(self._count(), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
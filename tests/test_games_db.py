@@ -0,0 +1,308 @@
+import json
+import os
+import time
+import unittest
+
+from PyQt5 import QtGui
+
+from spielpendium import database
+from spielpendium.data import Games
+from spielpendium.data.games_db import (find_games_by_category,
+                                        find_games_by_name,
+                                        find_games_by_players, read_games,
+                                        search_games, write_games)
+from spielpendium.data.player_poll import PlayerPoll
+from spielpendium.data.row_extractor import rows_from_xml
+from spielpendium.database.scripts import SQLScripts
+from spielpendium.network.stand_in_server import FIXTURES_DIR
+from temporary_database import TemporaryDatabaseMixin
+
+__author__ = 'Eduardo Ruiz'
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+# Numbers are stored as such, so their text may be normalized (2.40 -> 2.4)
+_FLOAT_COLUMNS = ('BGG Rating', 'Complexity')
+
+
+def _indexes_version() -> int:
+    return next(migration.version for migration in SQLScripts.migrations
+                if migration.name == 'indexes_and_search')
+
+
+class _FixtureGamesMixin(TemporaryDatabaseMixin):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.app = QtGui.QGuiApplication.instance() or QtGui.QGuiApplication([])
+
+    def setUp(self):
+        super().setUp()
+        xml = b''.join(path.read_bytes() for path in
+                       sorted((FIXTURES_DIR / 'boardgame').glob('*.xml')))
+
+        self.rows = []
+        for row, _ in rows_from_xml([b'<boardgames>' + xml
+                                     + b'</boardgames>']):
+            image = QtGui.QPixmap(4, 4)
+            image.fill()
+            row['Image'] = image
+            self.rows.append(row)
+        self.rows.sort(key=lambda row: int(row['BGG Id']))
+
+    def _frame(self):
+        games = Games()
+        games.append(self.rows)
+        return games._games
+
+
+class TestGamesDatabase(_FixtureGamesMixin, unittest.TestCase):
+
+    def _assert_rows_equal(self, expected, actual):
+        self.assertEqual(len(expected), len(actual))
+        for expected_row, actual_row in zip(expected, actual):
+            for column, value in expected_row.items():
+                if column == 'Image':
+                    self.assertFalse(actual_row[column].is_null())
+                elif column in _FLOAT_COLUMNS:
+                    self.assertEqual(float(actual_row[column]), float(value))
+                else:
+                    self.assertEqual(actual_row[column], value, column)
+
+    def test_round_trip(self):
+        games = Games()
+        games.append(self.rows)
+        self.assertTrue(games.write_db())
+
+        loaded = Games()
+        self.assertTrue(loaded.read_db())
+        self.assertEqual(list(loaded._games.columns), Games.HEADER)
+        self._assert_rows_equal(self.rows,
+                                loaded._games.to_dict(orient='records'))
+
+    def test_read_some(self):
+        write_games(self._frame())
+
+        read = read_games([self.rows[1]['BGG Id'], 999999])
+        self._assert_rows_equal(self.rows[1:2], read.to_dict(orient='records'))
+
+    def test_update_replaces_relations(self):
+        write_games(self._frame())
+
+        self.rows[0]['Author'] = 'Someone Else, Matt Leacock'
+        self.rows[0]['Category'] = 'Dice'
+        self.rows[0]['BGG Rank'] = '1'
+        write_games(self._frame())
+
+        read = read_games().to_dict(orient='records')
+        self._assert_rows_equal(self.rows, read)
+        self.assertEqual(
+            database.query('SELECT COUNT(*) FROM Games')[0], len(self.rows)
+        )
+
+    def test_publishers_by_name(self):
+        self.rows[0]['Publisher'] = 'Publisher Games'
+        self.rows[1]['Publisher'] = [self.rows[1]['Publisher'], 'Made Up']
+        games = Games()
+        games.append(self.rows)
+        self.assertTrue(games.write_db())
+
+        self._assert_rows_equal(self.rows,
+                                read_games().to_dict(orient='records'))
+
+    def test_failed_write_leaves_database_untouched(self):
+        write_games(self._frame())
+        games = self._frame()
+        games.loc[0, 'Name'] = None
+
+        with self.assertRaises(IOError):
+            write_games(games)
+
+        self._assert_rows_equal(self.rows,
+                                read_games().to_dict(orient='records'))
+
+    def test_speed(self):
+        template = self.rows[0]
+        rows = [dict(template, **{'BGG Id': str(game_id),
+                                  'Author': f'Author {game_id % 500}',
+                                  'Player Poll': PlayerPoll()})
+                for game_id in range(1, 10_001)]
+        games = Games()
+        games.append(rows)
+
+        start = time.perf_counter()
+        self.assertEqual(write_games(games._games), 10_000)
+        self.assertEqual(len(read_games()), 10_000)
+        self.assertLess(time.perf_counter() - start, 5)
+
+        # Rewriting replaces the relations, the search index and the
+        # summaries of every game
+        start = time.perf_counter()
+        self.assertEqual(write_games(games._games), 10_000)
+        self.assertLess(time.perf_counter() - start, 5)
+        self.assertEqual(len(search_games('author 499')), 20)
+
+
+class TestLookups(_FixtureGamesMixin, unittest.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        write_games(self._frame())
+
+    def test_search(self):
+        self.assertEqual(search_games('pandemic'), [30549])
+        # Designers and categories are searched too, accents are ignored
+        self.assertEqual(search_games('jurgen'), [822])
+        self.assertEqual(search_games('Territory'), [822])
+        # Every word has to match, the last ones may be prefixes
+        self.assertEqual(search_games('players build'), [822, 13])
+        self.assertEqual(search_games('disease spec'), [30549])
+        self.assertEqual(search_games('"unbalanced quote'), [])
+        self.assertEqual(search_games(' '), [])
+
+    def test_search_follows_updates(self):
+        self.rows[0]['Author'] = 'Somebody New'
+        self.rows[0]['Category'] = 'Trains'
+        write_games(self._frame())
+
+        self.assertEqual(search_games('teuber'), [])
+        self.assertEqual(search_games('somebody trains'), [13])
+
+        self._row(822)['Category'] = ''
+        write_games(self._frame())
+        self.assertEqual(search_games('territory'), [])
+        # The triggers are back once it's written
+        self.assertEqual(len(database.query(SQLScripts.get_index_triggers)),
+                         2 * 10)
+
+        # Writes that don't go through write_games are followed too
+        database.query('INSERT OR IGNORE INTO Categories (name) VALUES (?)',
+                       ['Territory Building'])
+        database.query('INSERT INTO Games_Categories (category_id, game_id) '
+                       'SELECT id, 822 FROM Categories '
+                       "WHERE name = 'Territory Building'")
+        self.assertEqual(search_games('territory'), [822])
+        database.query("UPDATE Games SET name = 'Carcassonne 2' "
+                       'WHERE id = 822')
+        self.assertEqual(search_games('carcassonne 2'), [822])
+
+        database.query('DELETE FROM Games WHERE id = 13')
+        self.assertEqual(search_games('somebody'), [])
+
+    def _row(self, game_id: int) -> dict:
+        return next(row for row in self.rows
+                    if int(row['BGG Id']) == game_id)
+
+    def _unindex(self, table: str):
+        """Takes the database back to before there were indexes."""
+        database.query(f'DROP TABLE {table}')
+        database.query('DELETE FROM Schema_Version WHERE version >= ?',
+                       [_indexes_version()])
+
+    def test_search_index_rebuilt(self):
+        self._unindex('Games_Search')
+        self.assertTrue(database.create())
+        self.assertEqual(search_games('catan'), [13])
+
+    def test_summaries_follow_changes(self):
+        def summary(game_id):
+            return json.loads(database.query(
+                'SELECT categories FROM Game_Summaries WHERE game_id = ?',
+                [game_id]
+            )[0])
+
+        self.assertEqual([name for _, name in summary(30549)],
+                         ['Medical'])
+
+        self._row(30549)['Category'] = ''
+        write_games(self._frame())
+        self.assertEqual(summary(30549), [])
+        self.assertEqual(read_games([30549])['Category'][0], '')
+
+        # Writes that don't go through write_games are followed too
+        database.query('INSERT INTO Games_Categories (category_id, game_id) '
+                       'SELECT category_id, 13 FROM Games_Categories '
+                       'WHERE game_id = 822')
+        for category in summary(822):
+            self.assertIn(category, summary(13))
+
+        database.query('DELETE FROM Games WHERE id = 30549')
+        self.assertEqual(database.query(
+            'SELECT COUNT(*) FROM Game_Summaries WHERE game_id = 30549'
+        ), [0])
+
+    def test_summaries_rebuilt(self):
+        self._unindex('Game_Summaries')
+        self.assertTrue(database.create())
+        self._assert_relations_read()
+
+    def _assert_relations_read(self):
+        read = read_games().to_dict(orient='records')
+        self.assertEqual([row['Author'] for row in read],
+                         [row['Author'] for row in self.rows])
+        self.assertEqual([row['Publisher'] for row in read],
+                         [row['Publisher'] for row in self.rows])
+
+    def test_find(self):
+        self.assertEqual(find_games_by_name('catan'), [13])
+        self.assertEqual(find_games_by_category('Medical'), [30549])
+        self.assertEqual(find_games_by_players(5), [822])
+        self.assertEqual(find_games_by_players(2), [822, 30549])
+
+
+class TestQueryPlans(TemporaryDatabaseMixin, unittest.TestCase):
+    """The common lookups have to use indexes instead of reading whole
+    tables."""
+
+    def _plan(self, command, params):
+        # Rows of (id, parent, unused, detail)
+        return database.query(f'EXPLAIN QUERY PLAN {command}', params)[3::4]
+
+    def _assert_no_scan(self, command, params, *tables):
+        plan = self._plan(command, params)
+        for table in tables:
+            scans = [step for step in plan
+                     if step.startswith(f'SCAN {table}')
+                     and 'USING' not in step]
+            self.assertEqual(scans, [], plan)
+
+    def test_games_by_id(self):
+        self._assert_no_scan(SQLScripts.get_games, ['[1, 2]'], 'Games')
+
+    def test_all_games(self):
+        # One pass over the games, each summary found by its key
+        plan = self._plan(SQLScripts.get_all_games, [])
+        self.assertIn('SCAN g', plan)
+        self.assertTrue(any(step.startswith('SEARCH s USING INTEGER PRIMARY')
+                            for step in plan), plan)
+        self.assertFalse(any('TEMP B-TREE' in step for step in plan), plan)
+
+    def test_relations_by_game(self):
+        plan = self._plan(SQLScripts.refresh_game_summaries, ['[1, 2]'])
+        for index in ('Author_Game_game_id', 'Artist_Game_game_id',
+                      'Games_Categories_game_id', 'Game_Publishers_game_id'):
+            self.assertTrue(any(index in step for step in plan), plan)
+
+        for command in SQLScripts.clear_game_relations:
+            self._assert_no_scan(command, [1], 'Author_Game', 'Artist_Game',
+                                 'Games_Categories', 'Game_Publishers')
+
+    def test_games_by_name(self):
+        plan = self._plan(SQLScripts.find_games_by_name, ['Catan'])
+        self.assertTrue(any('Games_name' in step for step in plan), plan)
+
+    def test_games_by_players(self):
+        plan = self._plan(SQLScripts.find_games_by_players, [3, 3])
+        self.assertTrue(any('Games_players' in step for step in plan), plan)
+
+    def test_games_by_category(self):
+        self._assert_no_scan(SQLScripts.find_games_by_category, ['Medical'],
+                             'c', 'gc', 'Categories', 'Games_Categories')
+
+    def test_search(self):
+        plan = self._plan(SQLScripts.search_games, ['catan', 10])
+        self.assertTrue(any('VIRTUAL TABLE' in step for step in plan), plan)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+import unittest
+
+from spielpendium.data import (Games, import_user_data, iter_import_user_data)
+from spielpendium.thumbnails import Thumbnails
+from stand_in_bgg import StandInServerMixin
+from temporary_database import TemporaryDatabaseMixin
+
+__author__ = 'Eduardo Ruiz'
+
+_USERNAME = 'phoenix713'
+
+
+class TestImportPipeline(StandInServerMixin, TemporaryDatabaseMixin,
+                         unittest.TestCase):
+
+    def test_batches_match_import_user_data(self):
+        progress = []
+        batches = list(iter_import_user_data(_USERNAME, batch_size=2,
+                                             progress=progress.append))
+
+        self.assertEqual([len(batch) for batch in batches], [2, 1])
+
+        rows = [row for batch in batches for row in batch]
+        expected = import_user_data(_USERNAME)
+        self.assertEqual(len(rows), len(expected))
+
+        for row, expected_row in zip(rows, expected):
+            self.assertIsInstance(row['Image'], Thumbnails)
+            self.assertEqual(row['Image'], expected_row['Image'])
+            self.assertEqual({key: value for key, value in row.items()
+                              if key != 'Image'},
+                             {key: value for key, value in expected_row.items()
+                              if key != 'Image'})
+
+        final = {}
+        for report in progress:
+            final[report.stage] = report
+        self.assertEqual(final['rows'].done, 3)
+        self.assertEqual(final['images'].done, 3)
+        self.assertEqual(final['images'].total, 3)
+        self.assertEqual(final['images'].eta, 0)
+
+    def test_games_fills_progressively(self):
+        games = Games()
+        counts = []
+        games.rowsInserted.connect(lambda *_: counts.append(games.rowCount()))
+
+        self.assertEqual(games.import_progressively(_USERNAME), 3)
+        self.assertEqual(counts, [3])
+        self.assertEqual(list(games['BGG Id'].astype(str)),
+                         ['13', '822', '30549'])
+
+    def test_errors_reach_the_caller(self):
+        self.server.error_rate = 1.0
+        with self.assertRaises(Exception):
+            list(iter_import_user_data(_USERNAME))
+
+    def test_stopping_early(self):
+        batches = iter_import_user_data(_USERNAME, batch_size=1)
+        self.assertEqual(len(next(batches)), 1)
+        batches.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,35 @@
+import unittest
+
+from benchmarks.bench_startup import PACKAGES, import_time
+
+__author__ = 'Eduardo Ruiz'
+
+# Generous, so that a slow machine doesn't fail the test. Importing the
+# packages eagerly took 100 to 550 ms.
+_BUDGET = 0.08
+
+
+class TestImportTime(unittest.TestCase):
+
+    def test_packages(self):
+        for package in PACKAGES:
+            with self.subTest(package):
+                elapsed, heavy = min(import_time(package) for _ in range(3))
+                self.assertEqual(heavy, [])
+                self.assertLess(elapsed, _BUDGET)
+
+    def test_names_still_exported(self):
+        from spielpendium import data, database, network
+
+        self.assertIn('Games', dir(data))
+        self.assertTrue(callable(network.search_bgg))
+        self.assertEqual(type(network.response_cache).__name__,
+                         '_ResponseCache')
+        self.assertTrue(callable(database.cursor))
+
+        with self.assertRaises(AttributeError):
+            network.nothing
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,207 @@
+import json
+import logging
+import logging.handlers
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+import pandas as pd
+
+from spielpendium import log
+
+__author__ = 'Eduardo Ruiz'
+
+
+class _Records(logging.Handler):
+
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+@log.log(log.logger)
+def _fail(*args, **kwargs):
+    raise ValueError('Failed on purpose.')
+
+
+@log.log(log.logger)
+def _succeed(value):
+    return value
+
+
+@log.log(log.logger)
+def _outer():
+    time.sleep(0.01)
+    _inner()
+    log.count('test.rows', 3)
+
+
+@log.log(log.logger)
+def _inner():
+    time.sleep(0.02)
+
+
+class TestLogDecorator(unittest.TestCase):
+
+    def setUp(self):
+        self.handler = _Records()
+        log.logger.addHandler(self.handler)
+        self.level = log.logger.level
+
+    def tearDown(self):
+        log.logger.removeHandler(self.handler)
+        log.logger.setLevel(self.level)
+
+    def test_calls_not_logged_above_debug(self):
+        log.logger.setLevel(logging.INFO)
+        self.assertEqual(_succeed(1), 1)
+        self.assertEqual(self.handler.records, [])
+
+    def test_calls_logged_at_debug(self):
+        log.logger.setLevel(logging.DEBUG)
+        _succeed(1)
+        self.assertEqual([record.getMessage()
+                          for record in self.handler.records],
+                         ['Entering _succeed.', 'Exiting _succeed.'])
+
+    def test_bounded_arguments(self):
+        games = pd.DataFrame({'Name': ['Catan'] * 10_000})
+        with self.assertRaises(ValueError):
+            _fail(games, 'x' * 10_000, image=b'\0' * 10_000)
+
+        message = self.handler.records[-1].getMessage()
+        self.assertIn('<DataFrame of 10000 rows x 1 columns>', message)
+        self.assertIn('<10000 bytes>', message)
+        self.assertLess(len(message), 500)
+
+    def test_written_off_thread(self):
+        handlers = log.logger.handlers
+        self.assertIsInstance(handlers[0], logging.handlers.QueueHandler)
+        self.assertTrue(log._listener._thread.is_alive())
+
+    @unittest.skipUnless(hasattr(os, 'fork'), 'Needs fork')
+    def test_forked_records_written_by_parent(self):
+        log.logger.setLevel(logging.INFO)
+        pid = os.fork()
+        if pid == 0:
+            # The child never writes to the file itself
+            log.logger.info(f'Logged by {os.getpid()}.')
+            os._exit(0 if log._listener is None else 1)
+
+        _, status = os.waitpid(pid, 0)
+        self.assertEqual(os.waitstatus_to_exitcode(status), 0)
+
+        message = f'Logged by {pid}.'
+        file_handler = log._listener.handlers[0]
+        deadline = time.monotonic() + 5
+        while time.monotonic() < deadline:
+            file_handler.flush()
+            if (os.path.exists(file_handler.baseFilename) and
+                    message in open(file_handler.baseFilename).read()):
+                break
+            time.sleep(0.01)
+        else:
+            self.fail('The record of the child was not written.')
+
+
+class TestTracing(unittest.TestCase):
+
+    def tearDown(self):
+        log.stop_tracing()
+
+    def test_off_by_default(self):
+        self.assertIsNone(log.tracer)
+        _outer()
+        with log.span('test.block'):
+            log.count('test.rows')
+        self.assertEqual(log.metrics(), {})
+        self.assertEqual(log.stop_tracing(), {})
+
+    def test_nested_spans(self):
+        log.start_tracing()
+        _outer()
+        spans = log.metrics()['spans']
+
+        outer, inner = spans['test_log._outer'], spans['test_log._inner']
+        self.assertEqual(outer['calls'], 1)
+        self.assertGreaterEqual(inner['total_ms'], 20)
+        self.assertGreaterEqual(outer['total_ms'], 30)
+        # The time of the inner call isn't part of the outer one's own
+        self.assertLess(outer['self_ms'], outer['total_ms'] - 19)
+        self.assertEqual(inner['self_ms'], inner['total_ms'])
+
+    def test_counters_and_errors(self):
+        log.start_tracing()
+        _outer()
+        with log.span('test.block'):
+            _outer()
+        with self.assertRaises(ValueError):
+            _fail()
+
+        summary = log.stop_tracing()
+        self.assertEqual(summary['counters'], {'test.rows': 6})
+        self.assertEqual(summary['spans']['test.block']['calls'], 1)
+        self.assertEqual(summary['spans']['test_log._outer']['calls'], 2)
+        self.assertEqual(summary['spans']['test_log._fail']['errors'], 1)
+        self.assertIsNone(log.tracer)
+
+    def test_histogram(self):
+        log.start_tracing()
+        for _ in range(10):
+            _succeed(1)
+        spans = log.metrics()['spans']['test_log._succeed']
+
+        self.assertEqual(sum(count for _, count in spans['buckets_ms']), 10)
+        self.assertLessEqual(spans['min_ms'], spans['p50_ms'])
+        self.assertLessEqual(spans['p50_ms'], spans['p99_ms'])
+        self.assertLessEqual(spans['p99_ms'], spans['max_ms'])
+
+    def test_chrome_trace(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            filename = os.path.join(tmp_dir, 'trace.json')
+            log.start_tracing(filename)
+            worker = threading.Thread(target=_outer, name='worker')
+            worker.start()
+            worker.join()
+            log.stop_tracing()
+
+            with open(filename) as file:
+                trace = json.load(file)
+
+        events = trace['traceEvents']
+        spans = {event['name']: event for event in events
+                 if event['ph'] == 'X'}
+        outer, inner = spans['test_log._outer'], spans['test_log._inner']
+        self.assertEqual(outer['tid'], inner['tid'])
+        self.assertLessEqual(outer['ts'], inner['ts'])
+        self.assertLessEqual(inner['ts'] + inner['dur'],
+                             outer['ts'] + outer['dur'])
+
+        self.assertIn({'name': 'thread_name', 'ph': 'M',
+                       'pid': os.getpid(), 'tid': outer['tid'],
+                       'args': {'name': 'worker'}}, events)
+        self.assertEqual([event['args']['value'] for event in events
+                          if event['ph'] == 'C'], [0, 3])
+
+    def test_json_summary(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            filename = os.path.join(tmp_dir, 'metrics.json')
+            log.start_tracing(filename, 'json')
+            _outer()
+            summary = log.stop_tracing()
+
+            with open(filename) as file:
+                self.assertEqual(json.load(file), summary)
+
+    def test_unknown_format(self):
+        with self.assertRaises(ValueError):
+            log.start_tracing(trace_format='csv')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,40 @@
+import unittest
+
+from spielpendium.data import import_users_data
+from stand_in_bgg import StandInServerMixin
+from temporary_database import TemporaryDatabaseMixin
+
+__author__ = 'Eduardo Ruiz'
+
+_USERNAMES = ['phoenix713', 'catanfan', 'cooplover']
+
+
+class TestMultiUserImport(StandInServerMixin, TemporaryDatabaseMixin,
+                          unittest.TestCase):
+
+    def test_import(self):
+        result = import_users_data(_USERNAMES + ['catanfan'])
+
+        self.assertEqual(list(result.users), _USERNAMES)
+        self.assertEqual(
+            {username: [row['BGG Id'] for row in rows]
+             for username, rows in result.users.items()},
+            {'phoenix713': ['13', '822', '30549'],
+             'catanfan': ['13', '822'],
+             'cooplover': ['30549', '13']}
+        )
+        self.assertEqual([row['BGG Id'] for row in result.merged],
+                         ['13', '822', '30549'])
+        self.assertEqual(result.owners['13'], _USERNAMES)
+        self.assertEqual((result.requested, result.duplicates), (7, 4))
+
+        # Shared games are the same row for every user
+        self.assertIs(result.users['catanfan'][0],
+                      result.users['cooplover'][1])
+
+        # 3 collections, one details request and one request per image
+        self.assertEqual(self.server.statistics()['requests'], 7)
+
+
+if __name__ == '__main__':
+    unittest.main()
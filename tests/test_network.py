@@ -1,11 +1,19 @@
 import unittest
+from unittest import mock
+
 from spielpendium.network import search_bgg, get_connection_status, \
     ConnectionStatus
+from spielpendium.network import bgg_api_interface
+from stand_in_bgg import StandInServerMixin
+from temporary_database import TemporaryDatabaseMixin
 
 __author__ = 'Eduardo Ruiz'
 
 
-class TestNetwork(unittest.TestCase):
+class TestNetwork(StandInServerMixin, TemporaryDatabaseMixin,
+                  unittest.TestCase):
+    # Collections are answered with a 202 first, as BGG does
+    server_options = {}
 
     def __init__(self, *args, **kwargs):
         super(TestNetwork, self).__init__(*args, **kwargs)
@@ -14,11 +22,43 @@ class TestNetwork(unittest.TestCase):
     def test_search(self):
         info = search_bgg(self.search_term)
         self.assertTrue(isinstance(info, dict))
+        self.assertEqual(len(info['boardgames']['boardgame']), 4)
 
     def test_connection_status(self):
         status = get_connection_status()
         self.assertTrue(isinstance(status, ConnectionStatus))
 
+    def test_queued_collection(self):
+        with mock.patch.object(bgg_api_interface, '_TIME_BETWEEN_CHECKS', 0):
+            collection = bgg_api_interface.get_user_game_collection(
+                'phoenix713'
+            )
+
+        self.assertEqual(collection['items']['@totalitems'], '3')
+        self.assertEqual(self.server.statistics()['queued'], 1)
+
+    def test_game_info(self):
+        game = bgg_api_interface.get_game_info(13, get_stats=True)
+        game = game['boardgames']['boardgame']
+        self.assertEqual(game['statistics']['ratings']['averageweight'],
+                         '2.29')
+
+        game = bgg_api_interface.get_game_info(13)['boardgames']['boardgame']
+        self.assertNotIn('statistics', game)
+
+    def test_images(self):
+        game = bgg_api_interface.get_game_info(822)['boardgames']['boardgame']
+        images = bgg_api_interface.get_images([game['image']] * 2)
+
+        self.assertEqual(len(images), 2)
+        self.assertFalse(images[0].is_null())
+        self.assertEqual(images[0], images[1])
+
+    def test_error_injection(self):
+        self.server.error_rate = 1.0
+        with self.assertRaises(OSError):
+            bgg_api_interface.get_game_info(30549)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,75 @@
+import re
+import unittest
+from unittest import mock
+
+from spielpendium.data import import_user_data, parallel_parse
+from spielpendium.data.row_extractor import rows_from_xml
+from spielpendium.network.stand_in_server import FIXTURES_DIR
+from stand_in_bgg import StandInServerMixin
+from temporary_database import TemporaryDatabaseMixin
+
+__author__ = 'Eduardo Ruiz'
+
+_NUM_GAMES = 60
+
+
+def _response(num_games: int) -> bytes:
+    fixtures = [path.read_text(encoding='utf-8') for path
+                in sorted((FIXTURES_DIR / 'boardgame').glob('*.xml'))]
+    games = [re.sub(r'objectid="\d+"', f'objectid="{ii}"',
+                    fixtures[ii % len(fixtures)], count=1)
+             for ii in range(num_games)]
+
+    return ('<?xml version="1.0" encoding="utf-8"?>'
+            f'<boardgames termsofuse="x">{"".join(games)}</boardgames>'
+            ).encode()
+
+
+class TestParallelParse(unittest.TestCase):
+
+    def tearDown(self):
+        parallel_parse.shutdown_executor()
+
+    def test_split(self):
+        xml = _response(_NUM_GAMES)
+        chunks = parallel_parse.split_boardgames(xml, 7)
+
+        self.assertEqual(len(chunks), 7)
+        rows = [row for chunk in chunks for row in rows_from_xml([chunk])]
+        self.assertEqual(rows, rows_from_xml([xml]))
+
+    @mock.patch.object(parallel_parse, '_MIN_GAMES_PER_CHUNK', 10)
+    def test_parallel_rows_in_order(self):
+        xml = _response(_NUM_GAMES)
+
+        rows = parallel_parse.parse_game_rows(xml)
+        self.assertEqual(rows, rows_from_xml([xml]))
+        self.assertEqual([row['BGG Id'] for row, _ in rows],
+                         [str(ii) for ii in range(_NUM_GAMES)])
+
+        # The processes are only started once
+        executor = parallel_parse._get_executor()
+        parallel_parse.parse_game_rows(xml)
+        self.assertIs(parallel_parse._get_executor(), executor)
+
+
+class TestParallelImport(StandInServerMixin, TemporaryDatabaseMixin,
+                         unittest.TestCase):
+
+    def tearDown(self):
+        parallel_parse.shutdown_executor()
+        super().tearDown()
+
+    @mock.patch.object(parallel_parse, '_MIN_GAMES_PER_CHUNK', 1)
+    def test_import(self):
+        expected = import_user_data('phoenix713')
+        rows = import_user_data('phoenix713', parallel=True)
+
+        self.assertEqual(len(rows), len(expected))
+        for row, expected_row in zip(rows, expected):
+            self.assertEqual(row.pop('Image'), expected_row.pop('Image'))
+            self.assertEqual(row, expected_row)
+
+
+if __name__ == '__main__':
+    unittest.main()
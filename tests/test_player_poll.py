@@ -0,0 +1,138 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+from PyQt5 import QtGui
+
+from spielpendium.data import Games
+from spielpendium.data.player_poll import PlayerPoll, PlayerPollIndex
+from spielpendium.data.row_extractor import rows_from_xml
+from spielpendium.network.stand_in_server import FIXTURES_DIR
+
+__author__ = 'Eduardo Ruiz'
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+
+def _poll(*entries) -> PlayerPoll:
+    return PlayerPoll.from_list([list(entry) for entry in entries])
+
+
+class TestPlayerPoll(unittest.TestCase):
+
+    def test_extracted_from_fixture(self):
+        xml = (FIXTURES_DIR / 'boardgame' / '13.xml').read_bytes()
+        row, _ = rows_from_xml([b'<boardgames>' + xml + b'</boardgames>'])[0]
+
+        poll = row['Player Poll']
+        self.assertEqual(poll.to_list(), [['1', 0, 2, 310],
+                                          ['2', 3, 28, 290],
+                                          ['3', 110, 260, 40],
+                                          ['4', 330, 120, 5],
+                                          ['4+', 2, 15, 260]])
+        self.assertEqual(poll.best_players(), row['Recommended Players'])
+
+    def test_round_trips(self):
+        poll = _poll(('2', 1, 2, 3), ('3+', 4, 5, 6))
+
+        self.assertEqual(PlayerPoll.from_bytes(poll.to_bytes()), poll)
+        self.assertEqual(PlayerPoll.from_list(poll.to_list()), poll)
+        self.assertEqual(len(poll.to_bytes()), 2 * 14)
+
+
+class TestPlayerPollIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.index = PlayerPollIndex(
+            ['a', 'b', 'c', 'd'],
+            [_poll(('1', 0, 1, 9), ('2', 9, 1, 0), ('2+', 0, 1, 9)),
+             _poll(('2', 1, 9, 0), ('3', 1, 1, 9), ('4', 9, 1, 1),
+                   ('4+', 9, 1, 1)),
+             _poll(('3', 5, 5, 5)),
+             None]
+        )
+
+    def test_best_at(self):
+        self.assertEqual(self.index.ids(self.index.best_at(2)), ['a'])
+        self.assertEqual(self.index.ids(self.index.best_at(4)), ['b'])
+        # More players than any poll lists fall back to the "N+" entries
+        self.assertEqual(self.index.ids(self.index.best_at(7)), ['b'])
+        self.assertEqual(self.index.ids(self.index.best_at(0)), [])
+
+    def test_recommended_at(self):
+        self.assertEqual(self.index.ids(self.index.recommended_at(2)),
+                         ['a', 'b'])
+        self.assertEqual(self.index.ids(self.index.recommended_at(3)),
+                         ['c'])
+
+    def test_ranges(self):
+        self.assertEqual(self.index.ids(self.index.best_in(1, 3)), ['a'])
+        self.assertEqual(self.index.ids(self.index.best_in(3, 9)), ['b'])
+        self.assertEqual(
+            self.index.ids(self.index.recommended_in(2, 3, every=True)), []
+        )
+        self.assertEqual(
+            self.index.ids(self.index.recommended_in(4, 6, every=True)),
+            ['b']
+        )
+
+    def test_masks_are_vectors(self):
+        mask = self.index.best_in(1, 9)
+        self.assertIsInstance(mask, np.ndarray)
+        self.assertEqual(mask.shape, (4,))
+
+
+class TestGamesPlayerPoll(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.app = QtGui.QGuiApplication.instance() or QtGui.QGuiApplication([])
+
+    def setUp(self):
+        xml = b''.join(path.read_bytes() for path in
+                       sorted((FIXTURES_DIR / 'boardgame').glob('*.xml')))
+
+        self.rows = []
+        for row, _ in rows_from_xml([b'<boardgames>' + xml
+                                     + b'</boardgames>']):
+            image = QtGui.QPixmap(4, 4)
+            image.fill()
+            row['Image'] = image
+            self.rows.append(row)
+
+    def test_poll_index_follows_games(self):
+        games = Games()
+        games.append(self.rows[:1])
+        self.assertEqual(len(games.poll_index()), 1)
+
+        games.append(self.rows[1:])
+        index = games.poll_index()
+        self.assertEqual(len(index), 3)
+        self.assertIs(games.poll_index(), index)
+
+        games.remove_games([self.rows[0]['BGG Id']])
+        self.assertEqual(len(games.poll_index()), 2)
+
+    def test_poll_column_hidden(self):
+        games = Games()
+        games.append(self.rows)
+        self.assertEqual(games.columnCount(), len(Games.HEADER) - 2)
+
+    def test_save_and_load(self):
+        games = Games()
+        games.append(self.rows)
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            filename = os.path.join(tmp_dir, 'polls.splz')
+            self.assertTrue(games.save(filename))
+
+            loaded = Games()
+            self.assertTrue(loaded.load(filename))
+
+        self.assertEqual(list(loaded['Player Poll']),
+                         [row['Player Poll'] for row in self.rows])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,138 @@
+import http.server
+import sys
+import threading
+import time
+import unittest
+from unittest import mock
+
+from spielpendium import database
+from spielpendium.network.response_cache import (response_cache,
+                                                 normalize_url, endpoint_of)
+from temporary_database import TemporaryDatabaseMixin
+
+__author__ = 'Eduardo Ruiz'
+
+_BODY = b'<boardgames><boardgame objectid="1"/></boardgames>'
+_ETAG = '"v1"'
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    requests = []
+
+    def do_GET(self):
+        self.requests.append(self.headers.get('If-None-Match'))
+        if self.headers.get('If-None-Match') == _ETAG:
+            self.send_response(304)
+            self.end_headers()
+            return
+
+        self.send_response(200)
+        self.send_header('ETag', _ETAG)
+        self.send_header('Content-Length', str(len(_BODY)))
+        self.end_headers()
+        self.wfile.write(_BODY)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestResponseCache(TemporaryDatabaseMixin, unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = http.server.HTTPServer(('127.0.0.1', 0), _Handler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.url = (f'http://127.0.0.1:{cls.server.server_port}'
+                   f'/xmlapi/boardgame/1')
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        super().setUp()
+        _Handler.requests.clear()
+        response_cache.reset_statistics()
+
+    def test_normalize_url(self):
+        self.assertEqual(
+            normalize_url('HTTPS://BoardGameGeek.com:443/xmlapi/search'
+                          '?search=Catan&exact=0#top'),
+            'https://boardgamegeek.com/xmlapi/search?exact=0&search=Catan'
+        )
+        self.assertEqual(endpoint_of(self.url), 'boardgame')
+        self.assertEqual(endpoint_of('https://cf.geekdo-images.com/a.jpg'),
+                         'image')
+
+    def test_fresh_hit(self):
+        self.assertEqual(response_cache.fetch(self.url), _BODY)
+        database.flush_writes()
+        self.assertEqual(response_cache.fetch(self.url), _BODY)
+
+        self.assertEqual(len(_Handler.requests), 1)
+        stats = response_cache.statistics()
+        self.assertEqual(stats['hits'], 1)
+        self.assertEqual(stats['misses'], 1)
+        self.assertEqual(stats['hit_rate'], 0.5)
+
+    def test_conditional_request(self):
+        response_cache.fetch(self.url)
+        database.flush_writes()
+
+        # Make the cached entry stale
+        with mock.patch.object(time, 'time',
+                               return_value=time.time() + 365 * 86400):
+            self.assertEqual(response_cache.fetch(self.url), _BODY)
+
+        self.assertEqual(_Handler.requests, [None, _ETAG])
+        self.assertEqual(response_cache.statistics()['revalidated'], 1)
+
+    def test_stream(self):
+        streamed = b''.join(response_cache.stream(self.url, chunk_size=8))
+        database.flush_writes()
+        cached = b''.join(response_cache.stream(self.url, chunk_size=8))
+
+        self.assertEqual(streamed, _BODY)
+        self.assertEqual(cached, _BODY)
+        self.assertEqual(len(_Handler.requests), 1)
+        self.assertEqual(response_cache.statistics()['hits'], 1)
+
+    def test_hits_counted_across_threads(self):
+        response_cache.fetch(self.url)
+        database.flush_writes()
+        entry = response_cache.lookup(self.url)
+
+        def hit():
+            for _ in range(2_000):
+                response_cache.hit(entry)
+
+        threads = [threading.Thread(target=hit) for _ in range(8)]
+        # Switching threads often makes lost updates likely
+        interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        try:
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            sys.setswitchinterval(interval)
+
+        stats = response_cache.statistics()
+        self.assertEqual(stats['hits'], 16_000)
+        self.assertEqual(stats['bytes_saved'], 16_000 * len(_BODY))
+
+    def test_disabled(self):
+        response_cache.enabled = False
+        try:
+            response_cache.fetch(self.url)
+            response_cache.fetch(self.url)
+        finally:
+            response_cache.enabled = True
+
+        self.assertEqual(len(_Handler.requests), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
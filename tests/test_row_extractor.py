@@ -0,0 +1,93 @@
+import unittest
+
+import xmltodict
+
+from spielpendium.data.games_interface import game_to_row
+from spielpendium.data.row_extractor import rows_from_xml
+from spielpendium.network.stand_in_server import FIXTURES_DIR
+
+__author__ = 'Eduardo Ruiz'
+
+_MINIMAL_GAME = '''
+<boardgame objectid="1">
+  <yearpublished>2000</yearpublished>
+  <minplayers>1</minplayers>
+  <maxplayers>1</maxplayers>
+  <minplaytime>5</minplaytime>
+  <maxplaytime>5</maxplaytime>
+  <age>8</age>
+  {names}
+  <description />
+  <image>img.png</image>
+  <boardgamepublisher objectid="7">Self</boardgamepublisher>
+  <boardgameversion objectid="8">Only edition</boardgameversion>
+  <boardgamecategory objectid="9">Puzzle</boardgamecategory>
+  <poll name="suggested_numplayers">
+    <results numplayers="1">
+      <result value="Best" numvotes="4" />
+    </results>
+  </poll>
+  <poll name="suggested_playerage">
+    <results>
+      <result value="8" numvotes="2" />
+    </results>
+  </poll>
+  <statistics page="1">
+    <ratings>
+      <average>6.5</average>
+      <averageweight>1.2</averageweight>
+      <ranks>
+        <rank type="family" name="puzzle" value="12" />
+      </ranks>
+    </ratings>
+  </statistics>
+</boardgame>
+'''
+
+
+def _document(*games: str) -> bytes:
+    return f'<boardgames>{"".join(games)}</boardgames>'.encode()
+
+
+class TestRowExtractor(unittest.TestCase):
+
+    def assert_same_rows(self, xml: bytes):
+        expected = xmltodict.parse(xml)['boardgames']['boardgame']
+        if isinstance(expected, dict):
+            expected = [expected]
+
+        rows = rows_from_xml([xml])
+        self.assertEqual(len(rows), len(expected))
+
+        for (row, image_url), game in zip(rows, expected):
+            self.assertEqual(row, game_to_row(game, None))
+            self.assertEqual(image_url, game['image'])
+
+    def test_fixtures(self):
+        games = [path.read_text(encoding='utf-8') for path
+                 in sorted((FIXTURES_DIR / 'boardgame').glob('*.xml'))]
+        self.assertTrue(games)
+
+        self.assert_same_rows(_document(*games))
+
+    def test_minimal_game(self):
+        for names in ('<name primary="true">Solo</name>',
+                      '<name sortindex="1">Solo</name>'
+                      '<name sortindex="1">Alone</name>',
+                      '<name>Solo</name>'):
+            with self.subTest(names=names):
+                self.assert_same_rows(
+                    _document(_MINIMAL_GAME.format(names=names))
+                )
+
+    def test_split_chunks(self):
+        xml = _document(*[_MINIMAL_GAME.format(
+            names=f'<name primary="true">Game {ii}</name>'
+        ) for ii in range(3)])
+
+        chunks = [xml[start:start + 10] for start in range(0, len(xml), 10)]
+        self.assertEqual(rows_from_xml(chunks), rows_from_xml([xml]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,8 +1,11 @@
+import os
+import tempfile
 import unittest
 
 from PyQt5 import QtCore, QtGui
 
 from spielpendium.data import Games
+from spielpendium.data.player_poll import PlayerPoll
 from spielpendium.constants import IMAGE_SIZE
 
 __author__ = 'Eduardo Ruiz'
@@ -12,8 +15,9 @@ class TestSaveLoad(unittest.TestCase):
     
     def __init__(self, *args, **kwargs):
         super(TestSaveLoad, self).__init__(*args, **kwargs)
-        test_im = (QtGui.QImage('../images/image.jpg')
-                   .scaled(IMAGE_SIZE, IMAGE_SIZE, QtCore.Qt.KeepAspectRatio))
+        test_im = QtGui.QImage(IMAGE_SIZE, IMAGE_SIZE,
+                               QtGui.QImage.Format_RGB32)
+        test_im.fill(QtGui.QColor('darkred'))
 
         self.data = [{
             'BGG Id': 1,
@@ -42,6 +46,13 @@ class TestSaveLoad(unittest.TestCase):
             'name': 'User'
         }
 
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.tmp_dir.name, 'test.splz')
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
     def test_save(self):
         games = Games()
         games.append(self.data)
@@ -49,7 +60,7 @@ class TestSaveLoad(unittest.TestCase):
         for key, value in self.metadata.items():
             games.setData(key, value, QtCore.Qt.UserRole)
 
-        self.assertTrue(games.save('test.splz'))
+        self.assertTrue(games.save(self.filename))
 
     def test_save_load(self):
         games1 = Games()
@@ -57,11 +68,24 @@ class TestSaveLoad(unittest.TestCase):
         for key, value in self.metadata.items():
             games1.setData(key, value, QtCore.Qt.UserRole)
 
-        games1.save('test.splz')
+        games1.save(self.filename)
+
+        games2 = Games()
+        games2.load(self.filename)
+
+        self.assertEqual(games1, games2)
+
+    def test_round_trip_without_poll(self):
+        games1 = Games()
+        games1.append(self.data)
+        self.assertEqual(games1._games['Player Poll'].iloc[0], PlayerPoll())
 
+        games1.save(self.filename)
         games2 = Games()
-        games2.load('test.splz')
+        games2.load(self.filename)
 
+        self.assertEqual(games2._games['Player Poll'].iloc[0],
+                         games1._games['Player Poll'].iloc[0])
         self.assertEqual(games1, games2)
 
 
@@ -0,0 +1,61 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from spielpendium.database.scripts import SQLScripts, split_statements
+from spielpendium.database.scripts._script_reader import _read_migrations
+
+__author__ = 'Eduardo Ruiz'
+
+
+class TestSplitStatements(unittest.TestCase):
+
+    def test_simple(self):
+        self.assertEqual(split_statements('SELECT 1;\nSELECT 2;\n'),
+                         ['SELECT 1', '\nSELECT 2'])
+        self.assertEqual(split_statements('SELECT 1'), ['SELECT 1'])
+        self.assertEqual(split_statements('\n'), [])
+
+    def test_semicolons_in_strings_and_comments(self):
+        self.assertEqual(
+            split_statements("SELECT 'a;b', \"c;d\";\n-- e;f\nSELECT 2;"),
+            ["SELECT 'a;b', \"c;d\"", '\n-- e;f\nSELECT 2']
+        )
+
+    def test_trigger_bodies(self):
+        trigger = ('CREATE TRIGGER t AFTER INSERT ON a\n'
+                   'BEGIN\n'
+                   '    DELETE FROM b WHERE id = new.id;\n'
+                   '    INSERT INTO b VALUES (CASE WHEN 1 THEN 2 END);\n'
+                   'END')
+        self.assertEqual(split_statements(f'SELECT 1;\n{trigger};\n'),
+                         ['SELECT 1', f'\n{trigger}'])
+
+    def test_scripts_with_triggers(self):
+        triggers = [command for migration in SQLScripts.migrations
+                    for command in migration.commands
+                    if 'CREATE TRIGGER' in command]
+        self.assertTrue(triggers)
+        for command in triggers:
+            self.assertTrue(command.rstrip().endswith('END'))
+
+
+class TestMigrations(unittest.TestCase):
+
+    def test_order(self):
+        versions = [migration.version for migration in SQLScripts.migrations]
+        self.assertEqual(versions, list(range(1, len(versions) + 1)))
+        self.assertEqual(SQLScripts.migrations[0].name, 'initial_schema')
+        self.assertIsInstance(SQLScripts.migrations[-1].commands, tuple)
+
+    def test_gap(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            for name in ('0001_first.sql', '0003_third.sql'):
+                (Path(tmp_dir) / name).write_text('SELECT 1;')
+
+            with self.assertRaises(ValueError):
+                _read_migrations(tmp_dir)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+import threading
+import time
+import unittest
+from unittest import mock
+
+from spielpendium import database
+from spielpendium.network import search_cache, typeahead
+from temporary_database import TemporaryDatabaseMixin
+
+__author__ = 'Eduardo Ruiz'
+
+
+def _item(game_id, name, year):
+    return {'@objectid': str(game_id),
+            'name': {'@primary': 'true', '#text': name},
+            'yearpublished': str(year)}
+
+
+_RESULTS = {'boardgames': {'boardgame': [
+    _item(13, 'CATAN', 1995),
+    _item(27710, 'Catan Dice Game', 2007),
+    _item(39856, 'Dixit', 2008),
+    _item(3955, 'Catacombs', 2010),
+]}}
+
+
+class TestSearchCache(TemporaryDatabaseMixin, unittest.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        search_cache.reset_statistics()
+
+    def test_lookup(self):
+        self.assertIsNone(search_cache.lookup('cat'))
+
+        search_cache.store('cat', False, _RESULTS)
+        database.flush_writes()
+        self.assertEqual(search_cache.lookup('Cat'), _RESULTS)
+
+        # "cata" extends the cached "cat" search
+        derived = search_cache.lookup('cata')
+        self.assertEqual(
+            [item['@objectid'] for item in derived['boardgames']['boardgame']],
+            ['13', '27710', '3955']
+        )
+
+        stats = search_cache.statistics()
+        self.assertEqual((stats['hits'], stats['derived'], stats['misses']),
+                         (1, 1, 1))
+
+    def test_expired(self):
+        search_cache.store('cat', False, _RESULTS)
+        database.flush_writes()
+        with mock.patch.object(search_cache, 'ttl', -1):
+            self.assertIsNone(search_cache.lookup('cat'))
+
+    def test_written_in_batches(self):
+        database.reset_statistics()
+        search_cache.store('cat', False, _RESULTS)
+        database.flush_writes()
+
+        # The search, the clean up, the results and the names
+        self.assertEqual(database.statistics()['queries'], 4)
+
+    def test_suggest(self):
+        search_cache.store('cat', False, _RESULTS)
+        database.flush_writes()
+
+        start = time.perf_counter()
+        suggestions = search_cache.suggest('Cat')
+        elapsed = time.perf_counter() - start
+
+        self.assertEqual([s.name for s in suggestions],
+                         ['Catacombs', 'CATAN', 'Catan Dice Game'])
+        self.assertEqual(search_cache.suggest('dice')[0].game_id, 27710)
+        self.assertLess(elapsed, 0.01)
+
+    def test_typeahead_cancels_obsolete_searches(self):
+        release = threading.Event()
+        results = []
+
+        def slow_search(text):
+            release.wait(5)
+            yield from _RESULTS['boardgames']['boardgame']
+
+        with mock.patch.object(typeahead, 'iter_search_results',
+                               side_effect=slow_search):
+            searcher = typeahead.Typeahead(
+                lambda text, suggestions: results.append(text)
+            )
+            searcher.update('cat')
+            searcher.update('cata')
+            release.set()
+            searcher.wait(5)
+            searcher.close()
+
+        database.flush_writes()
+        self.assertEqual(searcher.cancelled_searches, 1)
+        self.assertEqual(results, ['cata'])
+        self.assertIsNone(search_cache.lookup('cat'))
+        self.assertIsNotNone(search_cache.lookup('cata'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+from spielpendium.network import bgg_api_interface
+from spielpendium.network.single_flight import single_flight
+
+__author__ = 'Eduardo Ruiz'
+
+_NUM_CALLERS = 5
+
+
+class TestSingleFlight(unittest.TestCase):
+
+    def setUp(self):
+        single_flight.reset_statistics()
+
+    def _run_concurrently(self, func):
+        with ThreadPoolExecutor(max_workers=_NUM_CALLERS) as executor:
+            futures = [executor.submit(func) for _ in range(_NUM_CALLERS)]
+        return futures
+
+    def test_concurrent_calls_share_result(self):
+        calls = []
+        started = threading.Event()
+
+        def slow():
+            calls.append(1)
+            started.set()
+            time.sleep(0.2)
+            return object()
+
+        def caller():
+            return single_flight.do('key', slow)
+
+        futures = self._run_concurrently(caller)
+        results = {id(future.result()) for future in futures}
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(len(results), 1)
+        self.assertEqual(single_flight.statistics(),
+                         {'leaders': 1, 'coalesced': _NUM_CALLERS - 1,
+                          'in_flight': 0})
+
+    def test_errors_are_shared(self):
+        def failing():
+            time.sleep(0.2)
+            raise ValueError('Nope')
+
+        futures = self._run_concurrently(
+            lambda: single_flight.do('key', failing)
+        )
+
+        for future in futures:
+            self.assertIsInstance(future.exception(), ValueError)
+
+    def test_get_xml_info_coalesced(self):
+        def slow_fetch(url, revalidate):
+            time.sleep(0.2)
+            return b'<boardgames><boardgame objectid="1"/></boardgames>'
+
+        with mock.patch.object(bgg_api_interface.response_cache, 'fetch',
+                               side_effect=slow_fetch) as fetch:
+            futures = self._run_concurrently(
+                lambda: bgg_api_interface.get_game_info(1)
+            )
+
+        self.assertEqual(fetch.call_count, 1)
+        for future in futures:
+            self.assertEqual(
+                future.result()['boardgames']['boardgame']['@objectid'], '1'
+            )
+
+
+if __name__ == '__main__':
+    unittest.main()
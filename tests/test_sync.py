@@ -0,0 +1,89 @@
+import re
+import unittest
+from unittest import mock
+
+from spielpendium.data import Games
+from spielpendium.data.games_interface import sync_user_data
+from spielpendium.network import bgg_api_interface
+from spielpendium.network.stand_in_server import FIXTURES_DIR
+from stand_in_bgg import StandInServerMixin
+from temporary_database import TemporaryDatabaseMixin
+
+__author__ = 'Eduardo Ruiz'
+
+_USERNAME = 'phoenix713'
+
+
+class TestSync(StandInServerMixin, TemporaryDatabaseMixin, unittest.TestCase):
+    copy_fixtures = True
+
+    def _edit_collection(self, remove_id: str, modify: tuple = None):
+        path = self.fixtures_dir / 'collection' / f'{_USERNAME}.xml'
+        xml = (FIXTURES_DIR / 'collection' / f'{_USERNAME}.xml').read_text(
+            encoding='utf-8'
+        )
+        xml = re.sub(rf'\s*<item [^>]*objectid="{remove_id}".*?</item>', '',
+                     xml, flags=re.DOTALL)
+        if modify is not None:
+            xml = xml.replace(*modify)
+        path.write_text(xml, encoding='utf-8')
+
+    def test_sync(self):
+        games = Games()
+
+        self._edit_collection('30549')
+        result = games.sync(_USERNAME)
+        self.assertEqual(result.added, ['13', '822'])
+        self.assertEqual(games.rowCount(), 2)
+
+        # Nothing changed, so only the collection should be downloaded
+        self.server.reset_statistics()
+        result = games.sync(_USERNAME)
+        self.assertEqual((result.added, result.removed, result.updated),
+                         ([], [], []))
+        self.assertEqual(self.server.statistics()['requests'], 1)
+
+        # Add a game, modify one and drop another
+        self._edit_collection('822', ('2020-12-25 10:15:01',
+                                      '2021-02-01 08:00:00'))
+
+        with mock.patch('spielpendium.data.games_interface.iter_game_info',
+                        wraps=bgg_api_interface.iter_game_info) as info:
+            result = games.sync(_USERNAME)
+
+        self.assertEqual(result.added, ['30549'])
+        self.assertEqual(result.removed, ['822'])
+        self.assertEqual(result.updated, ['13'])
+        info.assert_called_once_with(['30549', '13'], get_stats=True,
+                                     convert=mock.ANY)
+
+        self.assertEqual(games.rowCount(), 2)
+        self.assertEqual(list(games['BGG Id'].astype(str)), ['13', '30549'])
+
+    def test_failed_sync_is_retried(self):
+        self.assertEqual(sync_user_data(_USERNAME).added,
+                         ['13', '822', '30549'])
+
+        self._edit_collection('30549', ('2021-01-02 18:40:22',
+                                        '2021-02-01 08:00:00'))
+        with mock.patch('spielpendium.data.games_interface.get_game_rows',
+                        side_effect=OSError('Connection lost.')):
+            with self.assertRaises(OSError):
+                sync_user_data(_USERNAME)
+
+        # The collection from the failed sync wasn't saved
+        result = sync_user_data(_USERNAME)
+        self.assertEqual((result.removed, result.updated),
+                         (['30549'], ['822']))
+
+    def test_removed_in_collection_order(self):
+        sync_user_data(_USERNAME)
+        self._edit_collection('30549')
+
+        result = sync_user_data(_USERNAME,
+                                known_ids=['9', '30549', '822', '13', '10'])
+        self.assertEqual(result.removed, ['30549', '9', '10'])
+
+
+if __name__ == '__main__':
+    unittest.main()
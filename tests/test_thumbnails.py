@@ -0,0 +1,171 @@
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from PyQt5 import QtCore, QtGui
+
+from spielpendium.constants import THUMBNAIL_SIZES
+from spielpendium.data import Games
+from spielpendium.data.file_io import load_splz, save_splz
+from spielpendium.data.player_poll import PlayerPoll
+from spielpendium.network.stand_in_server import FIXTURES_DIR
+from spielpendium.thumbnails import Thumbnails
+
+__author__ = 'Eduardo Ruiz'
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+
+def _png(width: int, height: int) -> bytes:
+    image = QtGui.QImage(width, height, QtGui.QImage.Format_RGB32)
+    image.fill(QtGui.QColor('teal'))
+    buffer = QtCore.QBuffer()
+    buffer.open(QtCore.QBuffer.ReadWrite)
+    image.save(buffer, 'PNG')
+    return bytes(buffer.data())
+
+
+class TestThumbnails(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.app = QtGui.QGuiApplication.instance() or QtGui.QGuiApplication([])
+        cls.data = (FIXTURES_DIR / 'images' / 'pandemic.png').read_bytes()
+
+    def test_levels(self):
+        thumbnails = Thumbnails.from_data(self.data)
+        self.assertEqual(thumbnails.sizes, list(THUMBNAIL_SIZES))
+
+        for size in THUMBNAIL_SIZES:
+            image = thumbnails.image(size)
+            self.assertEqual(max(image.width(), image.height()), size)
+
+        # The original is kept as it was downloaded
+        self.assertEqual(thumbnails.encoded()[0], self.data)
+
+    def test_no_upscaling(self):
+        thumbnails = Thumbnails.from_data(_png(100, 50), keep_original=False)
+        self.assertEqual(thumbnails.sizes, [64])
+        self.assertEqual(thumbnails.image(256).size(), QtCore.QSize(100, 50))
+
+    def test_invalid(self):
+        self.assertTrue(Thumbnails.from_data(b'not an image').is_null())
+        self.assertTrue(Thumbnails.from_data(None).image().isNull())
+
+    def test_bytes_round_trip(self):
+        thumbnails = Thumbnails.from_data(self.data)
+        loaded = Thumbnails.from_bytes(thumbnails.to_bytes())
+
+        self.assertEqual(loaded, thumbnails)
+        self.assertEqual(loaded.image(128), thumbnails.image(128))
+
+    def test_equality_without_encoding(self):
+        with mock.patch('spielpendium.thumbnails._encode',
+                        side_effect=AssertionError('Encoded to compare.')):
+            self.assertEqual(Thumbnails.from_data(self.data),
+                             Thumbnails.from_data(self.data))
+            self.assertNotEqual(Thumbnails.from_data(self.data),
+                                Thumbnails.from_data(_png(300, 300)))
+
+            image = QtGui.QImage.fromData(self.data)
+            self.assertEqual(Thumbnails.from_image(image),
+                             Thumbnails.from_image(image.copy()))
+            self.assertNotEqual(Thumbnails.from_image(image),
+                                Thumbnails.from_image(image.mirrored()))
+
+    def test_unhashable(self):
+        with self.assertRaises(TypeError):
+            hash(Thumbnails.from_data(self.data))
+
+    def test_plain_image_bytes(self):
+        self.assertEqual(Thumbnails.from_bytes(self.data),
+                         Thumbnails.from_data(self.data))
+
+    def test_pixmap(self):
+        thumbnails = Thumbnails.from_data(self.data)
+
+        pixmap = thumbnails.pixmap(64, 2.0)
+        self.assertEqual(max(pixmap.width(), pixmap.height()), 128)
+        self.assertEqual(pixmap.devicePixelRatio(), 2.0)
+        self.assertIs(thumbnails.pixmap(64, 2.0), pixmap)
+
+        pixmap = thumbnails.pixmap(100)
+        self.assertEqual(max(pixmap.width(), pixmap.height()), 128)
+        self.assertAlmostEqual(pixmap.devicePixelRatio(), 1.28)
+
+
+class TestGamesThumbnails(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.app = QtGui.QGuiApplication.instance() or QtGui.QGuiApplication([])
+        cls.thumbnails = Thumbnails.from_data(
+            (FIXTURES_DIR / 'images' / 'catan.png').read_bytes()
+        )
+
+    def setUp(self):
+        self.games = Games()
+        self.games.append([{'BGG Id': '13', 'Image': self.thumbnails,
+                            'Name': 'Catan', 'Player Poll': PlayerPoll()}])
+        self.index = self.games.index(0, Games._IMAGE_COL
+                                      - Games._NUM_HIDDEN_COLS)
+
+    def test_decoration(self):
+        pixmap = self.games.data(self.index, QtCore.Qt.DecorationRole)
+        self.assertIs(self.games.data(self.index, QtCore.Qt.DecorationRole),
+                      pixmap)
+
+        changed = []
+        self.games.dataChanged.connect(lambda *args: changed.append(args))
+        self.games.set_icon_size(128, 2.0)
+        self.assertEqual(len(changed), 1)
+
+        pixmap = self.games.data(self.index, QtCore.Qt.DecorationRole)
+        self.assertEqual(max(pixmap.width(), pixmap.height()), 256)
+        self.assertEqual(pixmap.devicePixelRatio(), 2.0)
+
+    def test_plain_images_converted_when_added(self):
+        image = QtGui.QImage.fromData(self.thumbnails.encoded()[0])
+        pixmap = QtGui.QPixmap.fromImage(image)
+        games = Games()
+        games.append([{'BGG Id': game_id, 'Image': pixmap,
+                       'Name': 'Catan', 'Player Poll': PlayerPoll()}
+                      for game_id in ('13', '14')])
+        self.assertIsInstance(games._games['Image'].iloc[0], Thumbnails)
+        # The same image is only converted once
+        self.assertIs(games._games['Image'].iloc[1],
+                      games._games['Image'].iloc[0])
+
+        games.update_games([{'BGG Id': '13', 'Image': image}])
+        thumbnails = games._games['Image'].iloc[0]
+        self.assertIsInstance(thumbnails, Thumbnails)
+
+        # Drawing doesn't change the model
+        games.data(self.index, QtCore.Qt.DecorationRole)
+        self.assertIs(games._games['Image'].iloc[0], thumbnails)
+
+    def test_splz(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            filename = str(Path(tmp_dir) / 'thumbnails.splz')
+            self.assertTrue(save_splz(self.games._games, {}, filename))
+            data, _ = load_splz(filename)
+
+        self.assertEqual(data['Image'].iloc[0], self.thumbnails)
+
+    def test_splz_without_image(self):
+        self.games.append([{'BGG Id': '14', 'Image': QtGui.QImage(),
+                            'Name': 'No Image', 'Player Poll': PlayerPoll()}])
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            filename = str(Path(tmp_dir) / 'thumbnails.splz')
+            self.assertTrue(save_splz(self.games._games, {}, filename))
+            data, _ = load_splz(filename)
+
+        self.assertEqual(data['Image'].iloc[0], self.thumbnails)
+        self.assertTrue(data['Image'].iloc[1].is_null())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,111 @@
+import time
+import unittest
+import zlib
+
+import xmltodict
+
+from spielpendium import database
+from spielpendium.database.scripts import SQLScripts
+from spielpendium.network import bgg_api_interface
+from spielpendium.network.stand_in_server import FIXTURES_DIR
+from temporary_database import TemporaryDatabaseMixin
+
+__author__ = 'Eduardo Ruiz'
+
+_NUM_ITEMS = 3000
+
+
+def _large_collection() -> str:
+    items = ''.join(
+        f'<item objecttype="thing" objectid="{ii}" subtype="boardgame" '
+        f'collid="{ii + 1000}"><name sortindex="1">Game {ii}</name>'
+        f'<yearpublished>{1990 + ii % 30}</yearpublished>'
+        f'<image>https://example.com/{ii}.png</image>'
+        f'<status own="1" prevowned="0" fortrade="0" want="0" '
+        f'wanttoplay="0" wanttobuy="0" wishlist="0" preordered="0" '
+        f'lastmodified="2021-01-05 20:00:00" />'
+        f'<numplays>{ii % 7}</numplays></item>'
+        for ii in range(_NUM_ITEMS)
+    )
+    return f'<items totalitems="{_NUM_ITEMS}">{items}</items>'
+
+
+class TestUserCollections(TemporaryDatabaseMixin, unittest.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        bgg_api_interface._collection_memo.clear()
+        self.xml = (FIXTURES_DIR / 'collection' / 'catanfan.xml').read_text()
+
+    def test_round_trip(self):
+        self.assertFalse(bgg_api_interface.user_exists('catanfan'))
+        bgg_api_interface.save_user_xml('catanfan', self.xml)
+
+        bgg_api_interface._collection_memo.clear()
+        self.assertTrue(bgg_api_interface.user_exists('catanfan'))
+        self.assertEqual(bgg_api_interface.get_user_info('catanfan'),
+                         xmltodict.parse(self.xml))
+
+    def test_stored_compressed(self):
+        bgg_api_interface.save_user_xml('catanfan', self.xml)
+
+        xml, = database.query(SQLScripts.get_user_xml, ['catanfan'])
+        self.assertEqual(zlib.decompress(xml).decode(), self.xml)
+        self.assertLess(len(xml), len(self.xml.encode()))
+
+    def test_older_rows_without_parsed_form(self):
+        database.query(SQLScripts.save_user_xml,
+                       ['catanfan', zlib.compress(self.xml.encode()), None])
+
+        self.assertEqual(bgg_api_interface.get_user_info('catanfan'),
+                         xmltodict.parse(self.xml))
+
+    def test_memo(self):
+        bgg_api_interface.save_user_xml('catanfan', self.xml)
+        first = bgg_api_interface.get_user_info('catanfan')
+
+        database.reset_statistics()
+        self.assertEqual(bgg_api_interface.get_user_info('catanfan'), first)
+        self.assertTrue(bgg_api_interface.user_exists('catanfan'))
+        self.assertEqual(database.statistics()['queries'], 0)
+
+        # Changing a result doesn't change what later callers get
+        first['items']['item'].clear()
+        self.assertTrue(
+            bgg_api_interface.get_user_info('catanfan')['items']['item']
+        )
+
+        # Saving the collection again drops the remembered one
+        bgg_api_interface.save_user_xml(
+            'catanfan', self.xml.replace('CATAN', 'Catan')
+        )
+        second = bgg_api_interface.get_user_info('catanfan')
+        self.assertIsNot(second, first)
+        self.assertEqual(second['items']['item'][0]['name']['#text'],
+                         'Catan')
+
+    def test_unknown_user(self):
+        with self.assertRaises(KeyError):
+            bgg_api_interface.get_user_info('nobody')
+
+    def test_large_collection_speed(self):
+        xml = _large_collection()
+        bgg_api_interface.save_user_xml('collector', xml)
+        bgg_api_interface._collection_memo.clear()
+
+        start = time.perf_counter()
+        info = bgg_api_interface.get_user_info('collector')
+        stored = time.perf_counter() - start
+
+        start = time.perf_counter()
+        bgg_api_interface.get_user_info('collector')
+        remembered = time.perf_counter() - start
+
+        self.assertEqual(len(info['items']['item']), _NUM_ITEMS)
+        self.assertLess(stored, 0.1)
+        # Each caller gets a copy, so remembering mostly saves the query
+        self.assertLess(remembered, 0.1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+import unittest
+from unittest import mock
+
+import xmltodict
+
+from spielpendium.network import xml_stream
+
+__author__ = 'Eduardo Ruiz'
+
+_XML = b'''<?xml version="1.0" encoding="utf-8"?>
+<boardgames termsofuse="https://boardgamegeek.com/xmlapi/termsofuse">
+  <boardgame objectid="13">
+    <yearpublished>1995</yearpublished>
+    <name primary="true" sortindex="1">CATAN</name>
+    <name sortindex="1">Die Siedler von Catan</name>
+    <description>Trade &amp; build.&lt;br/&gt;</description>
+    <boardgamedesigner objectid="11">Klaus Teuber</boardgamedesigner>
+    <boardgamecategory objectid="1021">Economic</boardgamecategory>
+    <boardgamecategory objectid="1026">Negotiation</boardgamecategory>
+    <poll title="User Suggested Number of Players" totalvotes="2"
+          name="suggested_numplayers">
+      <results numplayers="3">
+        <result value="Best" numvotes="1" />
+        <result value="Recommended" numvotes="0" />
+      </results>
+    </poll>
+    <empty />
+  </boardgame>
+  <boardgame objectid="822">
+    <name primary="true" sortindex="1">Carcassonne</name>
+  </boardgame>
+</boardgames>
+'''
+
+
+def _chunks(data: bytes, size: int):
+    for start in range(0, len(data), size):
+        yield data[start:start + size]
+
+
+class TestXMLStream(unittest.TestCase):
+
+    def test_same_as_xmltodict(self):
+        expected = xmltodict.parse(_XML)['boardgames']['boardgame']
+
+        # Tiny chunks make sure elements split across reads are handled
+        for size in (7, 64, len(_XML)):
+            items = [item for _, item
+                     in xml_stream.parse_xml_items(_chunks(_XML, size))]
+            self.assertEqual(items, expected)
+
+    def test_queued_response_is_retried(self):
+        queued = b'<message>Your request has been accepted.</message>'
+        responses = [_chunks(queued, 16), _chunks(_XML, 16)]
+
+        with mock.patch.object(xml_stream.response_cache, 'stream',
+                               side_effect=lambda *args: responses.pop(0)), \
+                mock.patch.object(xml_stream.time, 'sleep') as sleep:
+            items = list(xml_stream.iter_xml_items('http://localhost/'))
+
+        sleep.assert_called_once()
+        self.assertEqual([item['@objectid'] for item in items],
+                         ['13', '822'])
+
+
+if __name__ == '__main__':
+    unittest.main()